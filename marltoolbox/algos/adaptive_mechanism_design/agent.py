@@ -12,7 +12,12 @@ logging.basicConfig(filename='Agents.log', level=logging.DEBUG)
 from enum import Enum, auto
 
 
-def convert_from_rllib_env_format(data, player_ids, state: bool = False, n_states: int = None, coin_game=False):
+def convert_from_rllib_env_format(data, player_ids, state: bool = False, n_states: int = None, coin_game=False,
+                                  batched=False):
+    """
+    :param batched: the data comes from a vectorized environment. The states are then returned with a leading batch
+        dimension and the rewards with the shape [n_players, batch_size].
+    """
     # for Done
     if "__all__" in data.keys():
         return data["__all__"]
@@ -20,10 +25,14 @@ def convert_from_rllib_env_format(data, player_ids, state: bool = False, n_state
     if state:
         obs = np.array(data[player_ids[0]])
         if not coin_game:
+            if batched:
+                return np.eye(n_states)[obs]
             obs_one_hot = np.zeros((n_states))
             obs_one_hot[obs] = 1
             return obs_one_hot
         else:
+            if batched:
+                return np.reshape(obs, (obs.shape[0], -1))
             obs = np.reshape(obs, (-1,))
             return obs
 
@@ -37,7 +46,12 @@ def convert_to_rllib_env_format(data, player_ids, coin_game=False):
     formated_data = {}
     for data_element, player_id in zip(data, player_ids):
         if not coin_game:
-            if data_element == 1:
+            if isinstance(data_element, np.ndarray):
+                # batch of actions
+                if not np.isin(data_element, (0, 1)).all():
+                    raise ValueError()
+                formated_data[player_id] = 1 - data_element
+            elif data_element == 1:
                 formated_data[player_id] = 0
             elif data_element == 0:
                 formated_data[player_id] = 1
@@ -48,6 +62,13 @@ def convert_to_rllib_env_format(data, player_ids, coin_game=False):
     return formated_data
 
 
+def create_optimizer(learning_rate, use_adam_optimizer=True, momentum=0.9):
+    if use_adam_optimizer:
+        return tf.train.AdamOptimizer(learning_rate)
+    else:
+        return tf.train.MomentumOptimizer(learning_rate, momentum=momentum)
+
+
 def var_shape(x):
     out = x.get_shape().as_list()
     return out
@@ -68,8 +89,11 @@ class Critic_Variant(Enum):
 
 
 class Agent(object):
-    def __init__(self, env, learning_rate=0.001, gamma=0.95, agent_idx=0):
-        self.sess = tf.Session()
+    def __init__(self, env, learning_rate=0.001, gamma=0.95, agent_idx=0, sess=None):
+        # When a session is provided, it is shared with the other agents (and the planner) and the caller is
+        # in charge of initializing the variables once the whole graph is built
+        self.sess = tf.Session() if sess is None else sess
+        self.shared_sess = sess is not None
         self.env = env
         self.n_actions = env.NUM_ACTIONS
         self.n_features = env.n_features
@@ -80,11 +104,28 @@ class Agent(object):
 
     def choose_action(self, s):
         action_probs = self.calc_action_probs(s)
+        return self.sample_action(action_probs)
+
+    def sample_action(self, action_probs):
         action = np.random.choice(range(action_probs.shape[1]),
                                   p=action_probs.ravel())  # select action w.r.t the actions prob
         self.log.append(action_probs[0, 1])
         return action
 
+    def choose_actions(self, s):
+        """
+        Choose one action for each state in the batch s (with shape [batch_size, n_features])
+        """
+        action_probs = self.calc_action_probs(s, add_dim=False)
+        return self.sample_actions(action_probs)
+
+    def sample_actions(self, action_probs):
+        cumulative_probs = np.cumsum(action_probs, axis=1)
+        rand = np.random.random_sample((action_probs.shape[0], 1)) * cumulative_probs[:, -1:]
+        actions = (rand >= cumulative_probs).sum(axis=1)
+        self.log.append(np.mean(action_probs[:, 1]))
+        return actions
+
     def learn_at_episode_end(self):
         pass
 
@@ -102,15 +143,16 @@ class Actor_Critic_Agent(Agent):
     def __init__(self, env, learning_rate=0.001, n_units_actor=20,
                  n_units_critic=20, gamma=0.95, agent_idx=0, mean_theta=0.0,
                  critic_variant=Critic_Variant.INDEPENDENT, weight_decay=0.0, std_theta=0.1,
-                 entropy_coeff=0.001, use_adam_optimizer=True, momentum=0.9, *args):
-        super().__init__(env, learning_rate, gamma, agent_idx)
+                 entropy_coeff=0.001, use_adam_optimizer=True, momentum=0.9, sess=None, *args):
+        super().__init__(env, learning_rate, gamma, agent_idx, sess)
         self.actor = Actor(env, n_units_actor, learning_rate, agent_idx, weight_decay=weight_decay,
                            std_theta=std_theta, entropy_coeff=entropy_coeff, mean_theta=mean_theta,
                            use_adam_optimizer=use_adam_optimizer, momentum=momentum)
         self.critic = Critic(env, n_units_critic, learning_rate, gamma, agent_idx, critic_variant,
                              mean_theta=mean_theta, weight_decay=weight_decay, std_theta=std_theta,
                              use_adam_optimizer=use_adam_optimizer, momentum=momentum)
-        self.sess.run(tf.global_variables_initializer())
+        if not self.shared_sess:
+            self.sess.run(tf.global_variables_initializer())
 
     def learn(self, s, a, r, s_, done=False, *args):
         if done:
@@ -151,10 +193,17 @@ class Actor(object):
     def __init__(self, env, n_units=20, learning_rate=0.001, agent_idx=0, weight_decay=0.0, training=True,
                  std_theta=0.1, entropy_coeff=0.001, mean_theta=0.0, use_adam_optimizer=True,
                  momentum=0.9):
-        self.s = tf.placeholder(tf.float32, [1, env.n_features], "state_ag")
+        # The leading dimension is the batch dimension (1 when learning from a single environment)
+        self.s = tf.placeholder(tf.float32, [None, env.n_features], "state_ag")
         self.a = tf.placeholder(tf.int32, None, "act")
         self.td_error = tf.placeholder(tf.float32, None, "td_error")  # TD_error
         self.env_name = env.NAME
+        self.learning_rate = learning_rate
+        self.weight_decay = weight_decay
+        self.entropy_coeff = entropy_coeff
+        self.use_adam_optimizer = use_adam_optimizer
+        self.momentum = momentum
+        self.hidden_layers = []
         with tf.variable_scope(f'Actor_{agent_idx}'):
             if not isinstance(n_units, list):
                 units = [env.n_features, n_units, env.NUM_ACTIONS]
@@ -176,12 +225,14 @@ class Actor(object):
                     b_l1 = tf.Variable(tf.random_normal([n_out], mean=0.0, stddev=std_theta))
                     l1 = tf.nn.leaky_relu(tf.matmul(input_, w_l1) + b_l1)
                     var_list.extend([w_l1, b_l1])
+                    self.hidden_layers.append((w_l1, b_l1))
                     input_ = l1
             self.w_pi1 = tf.Variable(tf.random_normal([n_in, n_out], mean=0.0, stddev=std_theta))
             self.b_pi1 = tf.Variable(tf.random_normal([n_out], mean=mean_theta, stddev=std_theta))
             self.actions_prob = tf.nn.softmax(tf.matmul(input_, self.w_pi1) + self.b_pi1)
             var_list.extend([self.w_pi1, self.b_pi1])
-            self.entropy = tf.reduce_sum(tf.log(self.actions_prob) * self.actions_prob)
+            self.var_list = var_list
+            self.entropy = tf.reduce_mean(tf.reduce_sum(tf.log(self.actions_prob) * self.actions_prob, axis=1))
 
             self.parameters = tf.concat(axis=0, values=[tf.reshape(v, [numel(v)]) for v in var_list])
             weights_norm = math_ops.reduce_sum(self.parameters * self.parameters, None, keepdims=True)
@@ -189,23 +240,32 @@ class Actor(object):
 
 
             with tf.variable_scope('exp_v'):
-                log_prob = tf.log(self.actions_prob[0, self.a])
-                self.exp_v = tf.reduce_mean(log_prob * self.td_error)
+                a = tf.reshape(self.a, [-1])
+                log_prob = tf.log(tf.gather_nd(self.actions_prob, tf.stack([tf.range(tf.shape(a)[0]), a], axis=1)))
+                self.exp_v = tf.reduce_mean(log_prob * tf.reshape(self.td_error, [-1]))
                 self.g_log_pi = tf.gradients(log_prob, self.s)
 
             with tf.variable_scope('trainActor'):
-                self.loss = -self.exp_v
-                if weight_decay > 0.0:
-                    self.loss += self.weights_norm * weight_decay
-                if entropy_coeff > 0.0:
-                    self.loss += entropy_coeff * self.entropy
-                if use_adam_optimizer:
-                    self.train_op = tf.train.AdamOptimizer(learning_rate).minimize(self.loss)
-                else:
-                    self.train_op = tf.train.MomentumOptimizer(learning_rate, momentum=momentum).minimize(self.loss)
+                self.loss = self.build_loss(self.exp_v, self.entropy)
+                self.train_op = create_optimizer(learning_rate, use_adam_optimizer, momentum).minimize(self.loss)
+
+    def build_loss(self, exp_v, entropy):
+        loss = -exp_v
+        if self.weight_decay > 0.0:
+            loss += self.weights_norm * self.weight_decay
+        if self.entropy_coeff > 0.0:
+            loss += self.entropy_coeff * entropy
+        return loss
+
+    def forward(self, s):
+        """Apply the actor network (sharing the same variables) to another state tensor"""
+        input_ = s
+        for w_l1, b_l1 in self.hidden_layers:
+            input_ = tf.nn.leaky_relu(tf.matmul(input_, w_l1) + b_l1)
+        return tf.nn.softmax(tf.matmul(input_, self.w_pi1) + self.b_pi1)
 
     def learn(self, sess, s, a, td):
-        s = s[np.newaxis, :]
+        s = np.atleast_2d(s)
         feed_dict = {self.s: s, self.a: a, self.td_error: td}
         _, exp_v = sess.run([self.train_op, self.exp_v], feed_dict)
         return exp_v
@@ -228,13 +288,21 @@ class Critic(object):
                  use_adam_optimizer=True, momentum=0.9):
         self.critic_variant = critic_variant
         self.env = env
-
-        self.s = tf.placeholder(tf.float32, [1, env.n_features], "state_critic")
-        self.v_ = tf.placeholder(tf.float32, [1, 1], "v_next")
+        self.gamma = gamma
+        self.learning_rate = learning_rate
+        self.weight_decay = weight_decay
+        self.use_adam_optimizer = use_adam_optimizer
+        self.momentum = momentum
+        self.hidden_layers = []
+
+        # The leading dimension is the batch dimension (1 when learning from a single environment)
+        self.s = tf.placeholder(tf.float32, [None, env.n_features], "state_critic")
+        self.v_ = tf.placeholder(tf.float32, [None, 1], "v_next")
         self.r = tf.placeholder(tf.float32, None, 'r')
 
         if self.critic_variant is Critic_Variant.CENTRALIZED:
-            self.act_probs = tf.placeholder(tf.float32, shape=[1, env.NUM_ACTIONS * env.NUM_AGENTS], name="act_probs")
+            self.act_probs = tf.placeholder(tf.float32, shape=[None, env.NUM_ACTIONS * env.NUM_AGENTS],
+                                            name="act_probs")
             self.nn_inputs = tf.concat([self.s, self.act_probs], axis=1)
         else:
             self.nn_inputs = self.s
@@ -267,35 +335,47 @@ class Critic(object):
                     b_l1 = tf.Variable(tf.random_normal([n_out], mean=0.0, stddev=std_theta))
                     l1 = tf.nn.leaky_relu(tf.matmul(input_, w_l1) + b_l1)
                     var_list.extend([w_l1, b_l1])
+                    self.hidden_layers.append((w_l1, b_l1))
                     input_ = l1
 
             self.w_pi1 = tf.Variable(tf.random_normal([n_in, n_out], mean=0.0, stddev=std_theta))
             self.b_pi1 = tf.Variable(tf.random_normal([n_out], mean=mean_theta, stddev=std_theta))
             self.v = tf.matmul(input_, self.w_pi1) + self.b_pi1
             var_list.extend([self.w_pi1, self.b_pi1])
+            self.var_list = var_list
 
         self.parameters = tf.concat(axis=0, values=[tf.reshape(v, [numel(v)]) for v in var_list])
         weights_norm = math_ops.reduce_sum(self.parameters * self.parameters, None, keepdims=True)
         self.weights_norm = tf.sqrt(tf.reduce_sum(weights_norm))
 
         with tf.variable_scope('squared_TD_error'):
-            self.td_error = self.r + gamma * self.v_ - self.v
+            self.td_error = tf.reshape(self.r, [-1, 1]) + gamma * self.v_ - self.v
             self.loss = tf.square(self.td_error)
         with tf.variable_scope('trainCritic'):
-            if weight_decay > 0.0:
-                self.loss += self.weights_norm * weight_decay
-            if use_adam_optimizer:
-                self.train_op = tf.train.AdamOptimizer(learning_rate).minimize(self.loss)
-            else:
-                self.train_op = tf.train.MomentumOptimizer(learning_rate, momentum=momentum).minimize(self.loss)
-
-
+            self.loss = self.build_loss(self.loss)
+            # Average over the batch
+            self.train_op = create_optimizer(learning_rate, use_adam_optimizer, momentum).minimize(
+                tf.reduce_mean(self.loss))
+
+    def build_loss(self, squared_td_error):
+        loss = squared_td_error
+        if self.weight_decay > 0.0:
+            loss += self.weights_norm * self.weight_decay
+        return loss
+
+    def forward(self, nn_inputs):
+        """Apply the critic network (sharing the same variables) to another input tensor"""
+        input_ = nn_inputs
+        for w_l1, b_l1 in self.hidden_layers:
+            input_ = tf.nn.leaky_relu(tf.matmul(input_, w_l1) + b_l1)
+        return tf.matmul(input_, self.w_pi1) + self.b_pi1
 
     def pass_agent_list(self, agent_list):
         self.agent_list = agent_list
 
     def learn(self, sess, s, r, s_, *args):
-        s, s_ = s.astype(np.float32), s_.astype(np.float32)
+        """s and s_ are single states or batches of states (with the shape [batch_size, n_features])"""
+        s, s_ = np.atleast_2d(s).astype(np.float32), np.atleast_2d(s_).astype(np.float32)
 
         if self.critic_variant is Critic_Variant.CENTRALIZED:
             if args:
@@ -306,12 +386,14 @@ class Critic(object):
                 act_probs_ = np.hstack(
                     [agent.calc_action_probs(obs_list[idx]) for idx, agent in enumerate(self.agent_list)])
             else:
-                act_probs = np.hstack([agent.calc_action_probs(s) for idx, agent in enumerate(self.agent_list)])
-                act_probs_ = np.hstack([agent.calc_action_probs(s_) for idx, agent in enumerate(self.agent_list)])
-            nn_inputs = np.hstack([s[np.newaxis, :], act_probs])
-            nn_inputs_ = np.hstack([s_[np.newaxis, :], act_probs_])
+                act_probs = np.hstack([agent.calc_action_probs(s, add_dim=False)
+                                       for idx, agent in enumerate(self.agent_list)])
+                act_probs_ = np.hstack([agent.calc_action_probs(s_, add_dim=False)
+                                        for idx, agent in enumerate(self.agent_list)])
+            nn_inputs = np.hstack([s, act_probs])
+            nn_inputs_ = np.hstack([s_, act_probs_])
         else:
-            nn_inputs, nn_inputs_ = s[np.newaxis, :], s_[np.newaxis, :]
+            nn_inputs, nn_inputs_ = s, s_
         v_ = sess.run(self.v, {self.nn_inputs: nn_inputs_})
         td_error, _, critic_loss = sess.run([self.td_error, self.train_op, self.loss],
                                {self.nn_inputs: nn_inputs, self.v_: v_, self.r: r})
@@ -343,9 +425,9 @@ class Critic(object):
 
 class Simple_Agent(Agent):  # plays games with 2 actions, using a single parameter
     def __init__(self, env, learning_rate=0.001, n_units_critic=20, gamma=0.95, agent_idx=0,
-                 critic_variant=Critic_Variant.INDEPENDENT, mean_theta=-2.0, std_theta=0.5):
-        super().__init__(env, learning_rate, gamma, agent_idx)
-        self.s = tf.placeholder(tf.float32, [1, env.n_features], "state")  # dummy variable
+                 critic_variant=Critic_Variant.INDEPENDENT, mean_theta=-2.0, std_theta=0.5, sess=None):
+        super().__init__(env, learning_rate, gamma, agent_idx, sess)
+        self.s = tf.placeholder(tf.float32, [None, env.n_features], "state")  # dummy variable
         self.a = tf.placeholder(tf.int32, None, "act")
         self.td_error = tf.placeholder(tf.float32, None, "td_error")  # TD_error
 
@@ -354,9 +436,9 @@ class Simple_Agent(Agent):  # plays games with 2 actions, using a single paramet
             self.actions_prob = tf.expand_dims(tf.concat([1 - tf.sigmoid(self.theta), tf.sigmoid(self.theta)], 0), 0)
 
         with tf.variable_scope('exp_v'):
-            self.log_prob = tf.log(self.actions_prob[0, self.a])
+            self.log_prob = tf.log(tf.gather(self.actions_prob[0], self.a))
             self.g_log_pi = tf.gradients(self.log_prob, self.theta)
-            self.exp_v = tf.reduce_mean(self.log_prob * self.td_error)
+            self.exp_v = tf.reduce_mean(self.log_prob * tf.reshape(self.td_error, [-1]))
 
         with tf.variable_scope('trainActor'):
             self.train_op = tf.train.AdamOptimizer(learning_rate).minimize(-self.exp_v)
@@ -364,7 +446,8 @@ class Simple_Agent(Agent):  # plays games with 2 actions, using a single paramet
         self.critic = Critic(env, n_units_critic, learning_rate, gamma, agent_idx, critic_variant,
                              weight_decay=0.0, std_theta=0.1)
 
-        self.sess.run(tf.global_variables_initializer())
+        if not self.shared_sess:
+            self.sess.run(tf.global_variables_initializer())
 
     def learn(self, s, a, r, s_, done=False, *args):
         if done:
@@ -379,9 +462,10 @@ class Simple_Agent(Agent):  # plays games with 2 actions, using a single paramet
         return 'Simple_Agent_' + str(self.agent_idx)
 
     def calc_action_probs(self, s, add_dim=None):
-        s = s[np.newaxis, :]
         probs = self.sess.run(self.actions_prob)
-        return probs
+        # The action probabilities do not depend on the state, repeat them for each state in the batch
+        batch_size = s.shape[0] if s.ndim == 2 else 1
+        return np.repeat(probs, batch_size, axis=0)
 
     def pass_agent_list(self, agent_list):
         self.critic.pass_agent_list(agent_list)
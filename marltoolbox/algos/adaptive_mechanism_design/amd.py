@@ -17,14 +17,20 @@ from ray.rllib.evaluation.sample_batch_builder import MultiAgentSampleBatchBuild
 
 from marltoolbox.algos.adaptive_mechanism_design.agent import Actor_Critic_Agent, Critic_Variant, Simple_Agent, \
     convert_from_rllib_env_format, convert_to_rllib_env_format
+from marltoolbox.algos.adaptive_mechanism_design.fused_step import Fused_Population_Step
 from marltoolbox.algos.adaptive_mechanism_design.planning_agent import Planning_Agent
 from marltoolbox.envs.matrix_sequential_social_dilemma import define_greed_fear_matrix_game
+from marltoolbox.envs.vectorized_matrix_sequential_social_dilemma import define_vectorized_greed_fear_matrix_game
 from marltoolbox.envs.vectorized_coin_game import CoinGame
 
 
 def create_population(env, n_agents, n_units, use_simple_agents=False,
                       lr=0.01, gamma=0.9, weight_decay=0.0, mean_theta=-2.0, std_theta=0.5,
-                      entropy_coeff=0.001, use_adam_optimizer=True, momentum=0.9, use_rllib_polcy=False):
+                      entropy_coeff=0.001, use_adam_optimizer=True, momentum=0.9, use_rllib_polcy=False, sess=None):
+    """
+    :param sess: (optional) session shared by all the agents. The variables must then be initialized by the caller
+        after the whole graph is built.
+    """
     if use_rllib_polcy:
         agent_config = a3c_config
         agent_config.update({
@@ -66,7 +72,8 @@ def create_population(env, n_agents, n_units, use_simple_agents=False,
                               agent_idx=i,
                               critic_variant=critic_variant,
                               mean_theta=mean_theta,
-                              std_theta=std_theta) for i in range(n_agents)
+                              std_theta=std_theta,
+                              sess=sess) for i in range(n_agents)
                  ]
         else:
             l = [Actor_Critic_Agent(env,
@@ -80,7 +87,8 @@ def create_population(env, n_agents, n_units, use_simple_agents=False,
                                     mean_theta=mean_theta,
                                     entropy_coeff=entropy_coeff,
                                     use_adam_optimizer=use_adam_optimizer,
-                                    momentum=momentum) for i in range(n_agents)]
+                                    momentum=momentum,
+                                    sess=sess) for i in range(n_agents)]
         # Pass list of agents for centralized critic
         if critic_variant is Critic_Variant.CENTRALIZED:
             for agent in l:
@@ -97,7 +105,8 @@ class AdaptiveMechanismDesign(tune.Trainable):
                    planner_clip_norm, entropy_coeff, seed, normalize_planner, no_weights_decay_planner,
                    planner_std_theta_mul, use_adam_optimizer, use_softmax_hot, report_every_n, momentum,
                    weight_decay_pl_mul, square_cost, normalize_against_v, use_v_pl,
-                   normalize_against_vp, normalize_vp_separated, use_rllib_polcy, **kwargs):
+                   normalize_against_vp, normalize_vp_separated, use_rllib_polcy,
+                   fused_population_step=False, **kwargs):
 
         if not use_simple_agents:
             speed_ratio = 5.0
@@ -114,19 +123,38 @@ class AdaptiveMechanismDesign(tune.Trainable):
         tf.set_random_seed(seed)
         random.seed(seed)
 
+        # With env_config["batch_size"] > 1, batch_size games are played in parallel and the agents and the planner
+        # act and learn on the whole batch at each step
+        n_parallel_envs = env_config.get("batch_size", 1)
         if env == "FearGreedMatrix":
-            env = define_greed_fear_matrix_game(fear=fear, greed=greed)(env_config)
+            if n_parallel_envs > 1:
+                env = define_vectorized_greed_fear_matrix_game(fear=fear, greed=greed)(env_config)
+            else:
+                env = define_greed_fear_matrix_game(fear=fear, greed=greed)(env_config)
         elif env == "CoinGame":
             env = CoinGame(env_config)
 
         env.seed(seed=seed)
 
+        # With fused_population_step, the agents and the planner are built in one graph used by one session and all
+        # their updates are computed with one sess.run per env step
+        if n_parallel_envs > 1:
+            assert not use_rllib_polcy and not fused_population_step
+            assert value_fn_variant == 'exact'
+            # The actions perturbed for the planner are not supported with parallel games
+            assert action_flip_prob == 0
+        if fused_population_step:
+            assert not use_simple_agents and not use_rllib_polcy
+            sess = tf.Session()
+        else:
+            sess = None
+
         agents = create_population(env, n_players,
                                    use_simple_agents=use_simple_agents, n_units=n_units,
                                    lr=lr, gamma=gamma, weight_decay=weight_decay,
                                    mean_theta=mean_theta, std_theta=std_theta, entropy_coeff=entropy_coeff,
                                    use_adam_optimizer=use_adam_optimizer, momentum=momentum,
-                                   use_rllib_polcy=use_rllib_polcy)
+                                   use_rllib_polcy=use_rllib_polcy, sess=sess)
         np.random.seed(seed + 1)
         tf.set_random_seed(seed + 1)
         random.seed(seed + 1)
@@ -156,10 +184,17 @@ class AdaptiveMechanismDesign(tune.Trainable):
                                             normalize_against_v=normalize_against_v,
                                             use_v_pl=use_v_pl,
                                             normalize_against_vp=normalize_against_vp,
-                                            normalize_vp_separated=normalize_vp_separated)
+                                            normalize_vp_separated=normalize_vp_separated,
+                                            sess=sess)
         else:
             planning_agent = None
 
+        if fused_population_step:
+            self.fused_step = Fused_Population_Step(agents, planning_agent)
+            sess.run(tf.global_variables_initializer())
+        else:
+            self.fused_step = None
+
         self.epi_n = 0
         self.players = agents
         self.env = env
@@ -178,6 +213,7 @@ class AdaptiveMechanismDesign(tune.Trainable):
         self.report_every_n = report_every_n
         self.normalize_vp_separated = normalize_vp_separated
         self.use_rllib_polcy = use_rllib_polcy
+        self.n_parallel_envs = n_parallel_envs
 
         self.avg_planning_rewards_per_round = []
         self.episode_reward = []
@@ -195,6 +231,9 @@ class AdaptiveMechanismDesign(tune.Trainable):
         self._init_algo(**config)
 
     def step(self):
+        if self.n_parallel_envs > 1:
+            return self._step_with_parallel_envs()
+
         (loss, cost, extra_loss, g_V, planning_rs, mean_v, mean_vp,
         planning_reward_when_pick_own_coin, planning_reward_when_pick_opp_coin,
         planning_reward_when_no_picking, planning_reward_when_specific_action) = [None] * 11
@@ -209,6 +248,8 @@ class AdaptiveMechanismDesign(tune.Trainable):
                                                            coin_game=self.env.NAME == "CoinGame",)
 
             flag = isinstance(obs_before_act, list)
+            if self.fused_step is not None:
+                actions_probs = self.fused_step.calc_actions_probs(obs_before_act)
 
             cum_planning_rs = [0] * len(self.players)
             planning_reward_when_pick_own_coin = [None] * len(self.players)
@@ -223,6 +264,9 @@ class AdaptiveMechanismDesign(tune.Trainable):
                 # choose action based on s
                 if self.use_rllib_polcy:
                     actions = [player.compute_actions(obs_before_act[None, ...])[0][0] for player in self.players]
+                elif self.fused_step is not None:
+                    actions = [player.sample_action(player_actions_probs)
+                               for player, player_actions_probs in zip(self.players, actions_probs)]
                 else:
                     if flag:
                         actions = [player.choose_action(obs_before_act[idx]) for idx, player in enumerate(self.players)]
@@ -256,7 +300,19 @@ class AdaptiveMechanismDesign(tune.Trainable):
 
                 env_rewards = rewards
 
-                if self.planning_agent is not None and self.epi_n < self.n_planning_eps:
+                use_planner = self.planning_agent is not None and self.epi_n < self.n_planning_eps
+                if self.fused_step is not None:
+                    # One sess.run to update the planner and all the agents and get the next actions probabilities
+                    actions_probs, agents_losses, fused_planning_rs, planner_results = self.fused_step.step(
+                        obs_before_act, actions, env_rewards, obs_after_act, actions_probs, use_planner,
+                        perturbed_actions=perturbed_actions, coin_game=self.env.NAME == "CoinGame")
+                    if use_planner:
+                        planning_rs = fused_planning_rs
+                        rewards = [sum(r) for r in zip(rewards, planning_rs)]
+                        cum_planning_rs = [sum(r) for r in zip(cum_planning_rs, planning_rs)]
+                        (action, loss, g_Vp, g_V, r_players, cost, extra_loss, l1,
+                         mean_v, vp, values, mean_vp) = planner_results
+                elif use_planner:
                     planning_rs = self.planning_agent.choose_action(obs_before_act, perturbed_actions)
                     if self.with_redistribution:
                         sum_planning_r = sum(planning_rs)
@@ -287,6 +343,10 @@ class AdaptiveMechanismDesign(tune.Trainable):
                         }
                         self.multi_agent_batch_builder.add_values(agent_id=idx, policy_id=idx, **step_player_values)
 
+                    elif self.fused_step is not None:
+                        critic_loss, advantage = agents_losses[idx]
+                        to_report[f"critic_loss_p_{idx}"] = critic_loss[0, 0]
+                        to_report[f"advantage_loss_p_{idx}"] = advantage
                     else:
                         if flag:
                             critic_loss, advantage = player.learn(obs_before_act[idx], actions[idx], rewards[idx],
@@ -339,6 +399,112 @@ class AdaptiveMechanismDesign(tune.Trainable):
                                           planning_reward_when_no_picking, planning_reward_when_specific_action)
         return to_report
 
+    def _step_with_parallel_envs(self):
+        """
+        Same as step but with a batch of n_parallel_envs games played in parallel. The agents and the planner
+        act and learn on the whole batch at each step (one sess.run per agent and per operation instead of one per
+        game).
+        """
+        (loss, cost, extra_loss, g_V, planning_rs, mean_v, mean_vp) = [None] * 7
+        coin_game = self.env.NAME == "CoinGame"
+
+        for _ in range(self.report_every_n):
+            self.epi_n += 1
+            to_report = {"episodes_total": self.epi_n}
+
+            s_rllib_format = self.env.reset()
+            obs_before_act = convert_from_rllib_env_format(s_rllib_format, self.player_ids, state=True,
+                                                           n_states=self.env.n_features,
+                                                           coin_game=coin_game, batched=True)
+
+            cum_planning_rs = np.zeros(len(self.players))
+            planning_reward_when_pick_own_coin = [[] for _ in self.players]
+            planning_reward_when_pick_opp_coin = [[] for _ in self.players]
+            planning_reward_when_no_picking = [[] for _ in self.players]
+            planning_reward_when_specific_action = [[[] for _ in range(self.env.NUM_ACTIONS)]
+                                                    for _ in self.players]
+            done = False
+            while not done:
+                # choose the batch of actions based on the batch of s
+                actions = [player.choose_actions(obs_before_act) for player in self.players]
+                actions_rllib_format = convert_to_rllib_env_format(actions, self.player_ids, coin_game=coin_game)
+
+                # take actions and get next s and rewards
+                s_rllib_format, rewards_rllib_format, done_rllib_format, info_rllib_format = self.env.step(
+                    actions_rllib_format)
+                obs_after_act = convert_from_rllib_env_format(s_rllib_format, self.player_ids, state=True,
+                                                              n_states=self.env.n_features,
+                                                              coin_game=coin_game, batched=True)
+                # rewards with shape [n_envs, n_players]
+                rewards = np.transpose(convert_from_rllib_env_format(rewards_rllib_format, self.player_ids))
+                done = convert_from_rllib_env_format(done_rllib_format, self.player_ids)
+                self.episode_reward.append(rewards.mean(axis=0))
+
+                # joint actions with shape [n_envs, n_players]
+                actions = np.stack(actions, axis=1)
+                env_rewards = rewards
+
+                if self.planning_agent is not None and self.epi_n < self.n_planning_eps:
+                    planning_rs = self.planning_agent.choose_action(obs_before_act, actions)
+                    if self.with_redistribution:
+                        planning_rs = planning_rs - planning_rs.mean(axis=1, keepdims=True)
+                    rewards = rewards + planning_rs
+                    cum_planning_rs += planning_rs.mean(axis=0)
+                    # Training planning agent
+                    (action, loss, g_Vp, g_V, r_players, cost, extra_loss, l1,
+                     mean_v, vp, values, mean_vp) = self.planning_agent.learn(
+                        obs_before_act, actions, coin_game=coin_game, env_rewards=env_rewards)
+
+                for idx, player in enumerate(self.players):
+                    critic_loss, advantage = player.learn(obs_before_act, actions[:, idx], rewards[:, idx],
+                                                          obs_after_act)
+                    to_report[f"critic_loss_p_{idx}"] = np.mean(critic_loss)
+                    to_report[f"advantage_loss_p_{idx}"] = advantage
+
+                    if self.planning_agent is not None and planning_rs is not None:
+                        opp_idx = (idx + 1) % 2
+                        own_r, opp_r = env_rewards[:, idx], env_rewards[:, opp_idx]
+                        planning_reward_when_pick_own_coin[idx].extend(
+                            planning_rs[(own_r == 1.0) & (opp_r == 0.0), idx])
+                        planning_reward_when_pick_opp_coin[idx].extend(
+                            planning_rs[(own_r == 1.0) & (opp_r == -2.0), idx])
+                        planning_reward_when_no_picking[idx].extend(
+                            planning_rs[(own_r == 0.0) & (opp_r == 0.0), idx])
+                        for act_v in range(self.env.NUM_ACTIONS):
+                            planning_reward_when_specific_action[idx][act_v].extend(
+                                planning_rs[actions[:, idx] == act_v, idx])
+
+                if done:
+                    for player in self.players:
+                        player.learn_at_episode_end()
+
+                # swap s
+                obs_before_act = obs_after_act
+
+            if self.planning_agent is not None and self.epi_n < self.n_planning_eps:
+                self.avg_planning_rewards_per_round.append(
+                    list(cum_planning_rs / self.env.step_count_in_current_episode))
+            epi_rewards = np.array(self.episode_reward)
+            self.training_epi_avg_reward.append(np.mean(epi_rewards, axis=0))
+            self.episode_reward.clear()
+
+        # Report the means over the last step of all the games
+        if planning_rs is not None:
+            planning_rs = planning_rs.mean(axis=0)
+            g_V = np.mean(g_V)
+        actions_rllib_format = {player_id: np.mean(player_actions)
+                                for player_id, player_actions in actions_rllib_format.items()}
+        mean_or_none = lambda values: np.mean(values) if len(values) > 0 else None
+        to_report = self._add_info_to_log(
+            to_report, actions_rllib_format, info_rllib_format, epi_rewards,
+            loss, cost, extra_loss, g_V, planning_rs, mean_v, mean_vp,
+            [mean_or_none(values) for values in planning_reward_when_pick_own_coin],
+            [mean_or_none(values) for values in planning_reward_when_pick_opp_coin],
+            [mean_or_none(values) for values in planning_reward_when_no_picking],
+            [[mean_or_none(values) for values in player_values]
+             for player_values in planning_reward_when_specific_action])
+        return to_report
+
     def _add_info_to_log(self, to_report, actions_rllib_format, info_rllib_format, epi_rewards, loss, cost,
                          extra_loss, g_V, planning_rs, mean_v, mean_vp, planning_reward_when_pick_own_coin,
                          planning_reward_when_pick_opp_coin, planning_reward_when_no_picking,
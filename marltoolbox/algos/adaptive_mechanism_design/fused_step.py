@@ -0,0 +1,150 @@
+import numpy as np
+import tensorflow as tf
+
+from marltoolbox.algos.adaptive_mechanism_design.agent import Actor_Critic_Agent, Critic_Variant, create_optimizer
+
+
+class Fused_Population_Step(object):
+    """
+    Build, in the graph shared by the population and the planner, the ops to compute with one sess.run per env step:
+    the updates of all the actor-critic agents, the update of the planner and the action probabilities of all the
+    agents for the next step.
+
+    Differences with the sequential per-agent updates:
+    - all the updates of one step are computed with the weights from before this step (an agent does not see the
+    updates made by the other agents during the same step),
+    - the actions of the next step are sampled from the action probabilities computed before the update.
+
+    Since the weights are read and written in the same sess.run, the writes are explicitly ordered after all the
+    reads (control dependencies), such that all the values of the step are computed with the weights from before it.
+    """
+
+    def __init__(self, agents, planning_agent=None):
+        assert all(isinstance(agent, Actor_Critic_Agent) for agent in agents)
+        self.sess = agents[0].sess
+        assert all(agent.sess is self.sess for agent in agents)
+        if planning_agent is not None:
+            assert planning_agent.sess is self.sess
+            assert planning_agent.value_fn_variant == 'exact'
+        self.agents = agents
+        self.planning_agent = planning_agent
+        env = agents[0].env
+
+        with tf.variable_scope('Fused_Population_Step'):
+            self.s = tf.placeholder(tf.float32, [1, env.n_features], "state")
+            self.s_ = tf.placeholder(tf.float32, [1, env.n_features], "next_state")
+            self.a = tf.placeholder(tf.int32, [len(agents)], "actions")
+            self.env_rewards = tf.placeholder(tf.float32, [len(agents)], "env_rewards")
+
+            self.actions_probs = [agent.actor.forward(self.s) for agent in agents]
+            self.next_actions_probs = [agent.actor.forward(self.s_) for agent in agents]
+
+            # The same optimizers are used with and without the planner, such that they share their slots
+            self.actor_optimizers = [create_optimizer(agent.actor.learning_rate, agent.actor.use_adam_optimizer,
+                                                      agent.actor.momentum) for agent in agents]
+            self.critic_optimizers = [create_optimizer(agent.critic.learning_rate, agent.critic.use_adam_optimizer,
+                                                       agent.critic.momentum) for agent in agents]
+
+            with tf.variable_scope('without_planner'):
+                self.updates_without_planner = self._build_updates(self.env_rewards)
+            if planning_agent is not None:
+                self.planning_rewards = planning_agent.vp[0, :]
+                if planning_agent.with_redistribution:
+                    self.planning_rewards -= tf.reduce_mean(self.planning_rewards)
+                # Same update as planning_agent.train_op (with the same optimizer), but applied only once the
+                # values fetched from the planner are computed
+                planner_grads_and_vars = planning_agent.optimizer.compute_gradients(
+                    planning_agent.loss, var_list=planning_agent.var_list)
+                planner_reads = planning_agent.learn_fetches[1:] + [self.planning_rewards] + [
+                    grad for grad, _ in planner_grads_and_vars]
+                with tf.control_dependencies(planner_reads):
+                    planner_train_op = planning_agent.optimizer.apply_gradients(planner_grads_and_vars)
+                self.planner_learn_fetches = [planner_train_op] + planning_agent.learn_fetches[1:]
+                with tf.variable_scope('with_planner'):
+                    self.updates_with_planner = self._build_updates(self.env_rewards + self.planning_rewards,
+                                                                    planner_reads)
+
+    def _build_updates(self, rewards, planner_reads=()):
+        all_actions_probs = tf.stop_gradient(tf.concat(self.actions_probs, axis=1))
+        all_next_actions_probs = tf.stop_gradient(tf.concat(self.next_actions_probs, axis=1))
+
+        updates = []
+        for idx, agent in enumerate(self.agents):
+            actor, critic = agent.actor, agent.critic
+            with tf.variable_scope(f'agent_{idx}'):
+                if critic.critic_variant is Critic_Variant.CENTRALIZED:
+                    nn_inputs = tf.concat([self.s, all_actions_probs], axis=1)
+                    nn_inputs_ = tf.concat([self.s_, all_next_actions_probs], axis=1)
+                else:
+                    nn_inputs, nn_inputs_ = self.s, self.s_
+                v = critic.forward(nn_inputs)
+                v_ = tf.stop_gradient(critic.forward(nn_inputs_))
+                td_error = rewards[idx] + critic.gamma * v_ - v
+                critic_loss = critic.build_loss(tf.square(td_error))
+                critic_grads_and_vars = self.critic_optimizers[idx].compute_gradients(
+                    critic_loss, var_list=critic.var_list)
+
+                actions_prob = self.actions_probs[idx]
+                log_prob = tf.log(actions_prob[0, self.a[idx]])
+                exp_v = tf.reduce_mean(log_prob * tf.stop_gradient(td_error))
+                entropy = tf.reduce_sum(tf.log(actions_prob) * actions_prob)
+                actor_loss = actor.build_loss(exp_v, entropy)
+                actor_grads_and_vars = self.actor_optimizers[idx].compute_gradients(
+                    actor_loss, var_list=actor.var_list)
+
+            updates.append({
+                "grads_and_vars": [critic_grads_and_vars, actor_grads_and_vars],
+                "critic_loss": critic_loss,
+                "advantage": exp_v,
+            })
+
+        # The weights of the agents are written only once all the values of the step are computed
+        reads = self.actions_probs + self.next_actions_probs + list(planner_reads)
+        for update in updates:
+            reads += [update["critic_loss"], update["advantage"]]
+            reads += [grad for grads_and_vars in update["grads_and_vars"] for grad, _ in grads_and_vars]
+        with tf.control_dependencies(reads):
+            for idx, update in enumerate(updates):
+                critic_grads_and_vars, actor_grads_and_vars = update.pop("grads_and_vars")
+                update["train_ops"] = [self.critic_optimizers[idx].apply_gradients(critic_grads_and_vars),
+                                       self.actor_optimizers[idx].apply_gradients(actor_grads_and_vars)]
+        return updates
+
+    def calc_actions_probs(self, s):
+        """Action probabilities of all the agents in state s (to use at the start of an episode)"""
+        return self.sess.run(self.actions_probs, {self.s: s[np.newaxis, :]})
+
+    def step(self, s, actions, env_rewards, s_, actions_probs, with_planner,
+             perturbed_actions=None, coin_game=False):
+        """
+        :param actions_probs: the action probabilities of all the agents in state s (used by the planner)
+        :return: next_actions_probs, the list of (critic_loss, advantage) of the agents, the planning rewards and
+            the results of the planner update (as returned by Planning_Agent.learn) or None
+        """
+        feed_dict = {
+            self.s: s[np.newaxis, :],
+            self.s_: s_[np.newaxis, :],
+            self.a: actions,
+            self.env_rewards: env_rewards,
+        }
+        fetches = {"next_actions_probs": self.next_actions_probs}
+        if with_planner:
+            planner_feed_dict, r_players = self.planning_agent.get_learn_feed_dict(
+                s, perturbed_actions, coin_game=coin_game, env_rewards=env_rewards,
+                players_action_probs=actions_probs)
+            feed_dict.update(planner_feed_dict)
+            fetches["planner"] = self.planner_learn_fetches
+            fetches["planning_rewards"] = self.planning_rewards
+            fetches["updates"] = self.updates_with_planner
+        else:
+            fetches["updates"] = self.updates_without_planner
+
+        results = self.sess.run(fetches, feed_dict)
+
+        agents_losses = [(update["critic_loss"], update["advantage"]) for update in results["updates"]]
+        if with_planner:
+            planning_rewards = list(results["planning_rewards"])
+            planner_results = self.planning_agent.process_learn_results(results["planner"], r_players)
+        else:
+            planning_rewards, planner_results = None, None
+        return results["next_actions_probs"], agents_losses, planning_rewards, planner_results
@@ -25,6 +25,10 @@ def numel(x):
     return intprod(var_shape(x))
 
 
+# Joint actions in the order DD, CD, DC, CC (used by calc_conditional_planning_actions)
+CONDITIONAL_JOINT_ACTIONS = np.array([[0, 0], [1, 0], [0, 1], [1, 1]])
+
+
 class Planning_Agent(Agent):
     def __init__(self, env, underlying_agents, learning_rate=0.01,
                  gamma=0.95, max_reward_strength=None, cost_param=0, with_redistribution=False,
@@ -32,12 +36,13 @@ class Planning_Agent(Agent):
                  loss_mul_planner=1.0, std_theta=0.1, planner_clip_norm=0.5, normalize_planner=False,
                  add_state_grad=False, planner_momentum=0.9, use_adam_optimizer=True, use_softmax_hot=True,
                  square_cost=False, normalize_against_v=False, use_v_pl=False,
-                 normalize_against_vp=False, normalize_vp_separated=False):
-        super().__init__(env, learning_rate, gamma)
+                 normalize_against_vp=False, normalize_vp_separated=False, sess=None):
+        super().__init__(env, learning_rate, gamma, sess=sess)
         self.underlying_agents = underlying_agents
         self.log = []
         self.max_reward_strength = max_reward_strength
         n_players = len(underlying_agents)
+        self.n_players = n_players
         self.with_redistribution = with_redistribution
         self.value_fn_variant = value_fn_variant
         self.convert_a_to_one_hot = convert_a_to_one_hot
@@ -46,18 +51,21 @@ class Planning_Agent(Agent):
         self.loss_mul_planner = loss_mul_planner
 
         with tf.variable_scope('Planner'):
-            self.s = tf.placeholder(tf.float32, [1, env.n_features], "state_pl")
-            self.a_players = tf.placeholder(tf.float32, [1, n_players], "player_actions")
+            # The leading dimension is the batch dimension (1 when learning from a single environment).
+            # With the 'exact' value function, the cost is averaged over the batch.
+            self.s = tf.placeholder(tf.float32, [None, env.n_features], "state_pl")
+            self.a_players = tf.placeholder(tf.float32, [None, n_players], "player_actions")
 
             self.convertion_to_one_hot(use_softmax_hot)
 
             if value_fn_variant == 'exact':
                 if self.convert_a_to_one_hot:
-                    self.p_players = tf.placeholder(tf.float32, [1, n_players, env.NUM_ACTIONS], "player_action_probs")
+                    self.p_players = tf.placeholder(tf.float32, [None, n_players, env.NUM_ACTIONS],
+                                                    "player_action_probs")
                 else:
-                    self.p_players = tf.placeholder(tf.float32, [1, n_players], "player_action_probs")
+                    self.p_players = tf.placeholder(tf.float32, [None, n_players], "player_action_probs")
                 self.a_plan = tf.placeholder(tf.float32, [2, 2], "conditional_planning_actions")  # works only for matrix games
-            self.r_players = tf.placeholder(tf.float32, [1, n_players], "player_rewards")
+            self.r_players = tf.placeholder(tf.float32, [None, n_players], "player_rewards")
 
             if self.convert_a_to_one_hot:
                 self.inputs = tf.concat([self.s, self.a_players_one_hot_reshape], 1)
@@ -97,10 +105,12 @@ class Planning_Agent(Agent):
                     self.v = 2 * self.a_players - 1
                 # if value_fn_variant == 'estimated':
                 if value_fn_variant == 'estimated' or value_fn_variant == 'exact':
+                    # With the 'exact' value function, one value per element in the batch
+                    sum_axis = 1 if value_fn_variant == 'exact' else None
                     if "CoinGame" in self.env_name:
-                        self.v = tf.reduce_sum(self.r_players)
+                        self.v = tf.reduce_sum(self.r_players, axis=sum_axis)
                     else:
-                        self.v = tf.reduce_sum(self.r_players) - 1.9
+                        self.v = tf.reduce_sum(self.r_players, axis=sum_axis) - 1.9
                 # if value_fn_variant == 'exact':
                 #     self.v = tf.placeholder(tf.float32, [1, n_players], "player_values")
 
@@ -123,31 +133,30 @@ class Planning_Agent(Agent):
                                                                 if value_fn_variant == 'proxy'
                                                                 else self.v)
                     if value_fn_variant == 'exact':
-                        act_idx = tf.cast(self.a_players[0, idx], tf.int32)
+                        # All the terms below have one value per element in the batch.
+                        # Since each vp[b, idx] only depends on the inputs at b, the gradients of vp[:, idx]
+                        # are the per-element gradients.
+                        act_idx = tf.cast(self.a_players[:, idx], tf.int32)
 
                         if self.convert_a_to_one_hot:
-                            self.g_p = self.p_players[0, idx, act_idx] * (1 - self.p_players[0, idx, act_idx])
-                            self.p_opp = self.p_players[0, 1 - idx, act_idx]
-                            grad = tf.gradients(ys=self.vp[0, idx], xs=self.a_players)
-                            if add_state_grad:
-                                grad_s = tf.gradients(ys=self.vp[0, idx], xs=self.s)
-                            self.g_Vp = self.g_p * grad[0][0, idx]
-                            if add_state_grad:
-                                self.g_Vp += self.g_p * tf.reduce_sum(grad_s)
+                            batch_act_idx = tf.stack([tf.range(tf.shape(act_idx)[0]), act_idx], axis=1)
+                            p_player = tf.gather_nd(self.p_players[:, idx, :], batch_act_idx)
+                            self.g_p = p_player * (1 - p_player)
+                            self.p_opp = tf.gather_nd(self.p_players[:, 1 - idx, :], batch_act_idx)
                         else:
-                            self.g_p = self.p_players[0, idx] * (1 - self.p_players[0, idx])
-                            self.p_opp = self.p_players[0, 1 - idx]
-                            grad = tf.gradients(ys=self.vp[0, idx], xs=self.a_players)
-                            if add_state_grad:
-                                grad_s = tf.gradients(ys=self.vp[0, idx], xs=self.s)
-                            self.g_Vp = self.g_p * grad[0][0, idx]
-                            if add_state_grad:
-                                self.g_Vp += self.g_p * tf.reduce_sum(grad_s)
+                            self.g_p = self.p_players[:, idx] * (1 - self.p_players[:, idx])
+                            self.p_opp = self.p_players[:, 1 - idx]
+                        grad = tf.gradients(ys=self.vp[:, idx], xs=self.a_players)
+                        if add_state_grad:
+                            grad_s = tf.gradients(ys=self.vp[:, idx], xs=self.s)
+                        self.g_Vp = self.g_p * grad[0][:, idx]
+                        if add_state_grad:
+                            self.g_Vp += self.g_p * tf.reduce_sum(grad_s[0], axis=1)
 
                         if "CoinGame" in self.env_name:
                             if add_state_grad:
                                 self.g_Vp = self.g_Vp / (3*9+4)
-                            self.g_V = self.g_p * tf.reduce_sum(self.v)
+                            self.g_V = self.g_p * self.v
                         else:
                             if add_state_grad:
                                 self.g_Vp = self.g_Vp / (5+1)
@@ -155,21 +164,22 @@ class Planning_Agent(Agent):
                                 self.g_V = self.g_p * (self.p_opp * (2 * env.R - env.T - env.S)
                                                    + (1 - self.p_opp) * (env.T + env.S - 2 * env.P))
                             else:
-                                self.g_V = self.g_p * tf.reduce_sum(self.v)
+                                self.g_V = self.g_p * self.v
 
-                    cost_list.append(- underlying_agent.learning_rate * self.g_Vp * self.g_V)
+                    if value_fn_variant == 'exact':
+                        cost_list.append(tf.reduce_mean(- underlying_agent.learning_rate * self.g_Vp * self.g_V))
+                    else:
+                        cost_list.append(- underlying_agent.learning_rate * self.g_Vp * self.g_V)
 
+                # Norm of the planning rewards of each element in the batch, averaged over the batch
                 if with_redistribution:
-                    if square_cost:
-                        self.extra_loss = cost_param * tf.norm(self.vp - tf.reduce_mean(self.vp)) * \
-                                          tf.norm(self.vp - tf.reduce_mean(self.vp))
-                    else:
-                        self.extra_loss = cost_param * tf.norm(self.vp - tf.reduce_mean(self.vp))
+                    vp_norm = tf.norm(self.vp - tf.reduce_mean(self.vp, axis=1, keepdims=True), axis=1)
                 else:
-                    if square_cost:
-                        self.extra_loss = cost_param * tf.norm(self.vp) * tf.norm(self.vp)
-                    else:
-                        self.extra_loss = cost_param * tf.norm(self.vp)
+                    vp_norm = tf.norm(self.vp, axis=1)
+                if square_cost:
+                    self.extra_loss = cost_param * tf.reduce_mean(vp_norm * vp_norm)
+                else:
+                    self.extra_loss = cost_param * tf.reduce_mean(vp_norm)
 
                 if not normalize_vp_separated:
                     self.cost = tf.reduce_sum(tf.stack(cost_list))
@@ -188,19 +198,19 @@ class Planning_Agent(Agent):
 
 
             with tf.variable_scope('trainPlanningAgent'):
+                # The optimizer and the variables are kept to build other updates sharing the optimizer slots
+                self.var_list = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='Planner/Policy_p')
                 #AdamOptimizer
                 if use_adam_optimizer:
-                    self.train_op = tf.train.AdamOptimizer(self.loss_mul_planner *learning_rate).minimize(self.loss,
-                                                                               var_list=tf.get_collection(
-                                                                                   tf.GraphKeys.GLOBAL_VARIABLES,
-                                                                                   scope='Planner/Policy_p'))
+                    self.optimizer = tf.train.AdamOptimizer(self.loss_mul_planner *learning_rate)
                 else:
-                    self.train_op = tf.train.MomentumOptimizer(self.loss_mul_planner *learning_rate,
-                                                           momentum=planner_momentum).minimize(self.loss,
-                                                                               var_list=tf.get_collection(
-                                                                                   tf.GraphKeys.GLOBAL_VARIABLES,
-                                                                                   scope='Planner/Policy_p'))
-            self.sess.run(tf.global_variables_initializer())
+                    self.optimizer = tf.train.MomentumOptimizer(self.loss_mul_planner *learning_rate,
+                                                                momentum=planner_momentum)
+                self.train_op = self.optimizer.minimize(self.loss, var_list=self.var_list)
+            self.learn_fetches = [self.train_op, self.vp, self.loss, self.g_Vp, self.g_V, self.cost,
+                                  self.extra_loss, self.l1, self.mean_v_out, self.vp, self.v, self.mean_vp_out]
+            if not self.shared_sess:
+                self.sess.run(tf.global_variables_initializer())
 
     def convertion_to_one_hot(self, use_softmax_hot):
         if "CoinGame" in self.env_name:
@@ -221,7 +231,8 @@ class Planning_Agent(Agent):
             self.a_players_one_hot = tf.nn.softmax(values)
         else:
             self.a_players_one_hot = values + 1
-        self.a_players_one_hot_reshape = tf.reshape(self.a_players_one_hot, (1, -1))
+        self.a_players_one_hot_reshape = tf.reshape(self.a_players_one_hot,
+                                                    (-1, self.n_players * self.env.NUM_ACTIONS))
 
     def create_multi_layer_fc(self, units, mean_theta, std_theta):
         print("units", units)
@@ -269,7 +280,7 @@ class Planning_Agent(Agent):
             if not normalize_vp_separated:
                 null = 0.0
                 self.mean_vp_out = ((1 - (1 / normalize_against_vp)) * self.mean_vp_in +
-                                    tf.math.abs(tf.reduce_sum(self.vp)))
+                                    tf.reduce_mean(tf.math.abs(tf.reduce_sum(self.vp, axis=1))))
                 self.cost = tf.cond(tf.equal(self.mean_vp_out, null), lambda: null,
                                     lambda: self.cost / (
                                             self.mean_vp_out / normalize_against_vp * 10 / max_reward_strength))
@@ -277,7 +288,7 @@ class Planning_Agent(Agent):
                 null = 0.0
 
                 self.mean_vp_out = ((1 - (1 / normalize_against_vp)) * self.mean_vp_in +
-                                    tf.math.abs(tf.reduce_sum(self.vp, axis=0)))
+                                    tf.reduce_mean(tf.math.abs(self.vp), axis=0))
                 cost_list = []
                 cost_list.append(tf.cond(tf.equal(self.mean_vp_out[0], 0.0), lambda: null,
                                     lambda: self.cost[0] / (
@@ -297,7 +308,7 @@ class Planning_Agent(Agent):
         self.mean_v_in = tf.placeholder(tf.float32, name="mean_v")
         if normalize_against_v:
             self.mean_v_out = ((1-(1/normalize_against_v)) * self.mean_v_in +
-                           tf.reduce_sum(tf.math.abs(self.v)))
+                           tf.reduce_mean(tf.math.abs(self.v)))
             self.cost = tf.cond(tf.equal(self.mean_v_out, 0.0), lambda:0.0, lambda:self.cost /
                                                                                    (self.mean_v_out/normalize_against_v))
         else:
@@ -307,6 +318,24 @@ class Planning_Agent(Agent):
         return self.sess.run(self.parameters, {})
 
     def learn(self, s, a_players, coin_game=False, env_rewards=None):
+        feed_dict, r_players = self.get_learn_feed_dict(s, a_players, coin_game, env_rewards)
+        learn_results = self.sess.run(self.learn_fetches, feed_dict)
+        return self.process_learn_results(learn_results, r_players)
+
+    def get_learn_feed_dict(self, s, a_players, coin_game=False, env_rewards=None, players_action_probs=None):
+        """
+        :param players_action_probs: (optional) list of the action probabilities of each underlying agent in the
+            state s. If None, they are computed with the underlying agents.
+
+        s, a_players and env_rewards can also be batches (with a leading batch dimension) from vectorized environments.
+        The env_rewards are then required.
+        """
+        batched = s.ndim == 2
+        if batched:
+            assert env_rewards is not None
+            a_players, r_players = np.asarray(a_players), np.asarray(env_rewards)
+            return self._get_learn_feed_dict(s, a_players, r_players, players_action_probs), r_players
+
         s = s[np.newaxis, :]
         if env_rewards is None:
             if coin_game:
@@ -319,13 +348,17 @@ class Planning_Agent(Agent):
         else:
             r_players = env_rewards
         a_players = np.asarray(a_players)
+        feed_dict = self._get_learn_feed_dict(s, a_players[np.newaxis, ...], r_players[np.newaxis, :],
+                                              players_action_probs)
+        return feed_dict, r_players
 
-        if self.convert_a_to_one_hot:
-            a_players_one_hot = self.np_action_to_one_hot(a_players)
-
+    def _get_learn_feed_dict(self, s, a_players, r_players, players_action_probs):
+        """All the inputs have a leading batch dimension"""
         feed_dict = {self.s: s,
-                     self.a_players: a_players[np.newaxis, ...],
-                     self.r_players: r_players[np.newaxis, :]}
+                     self.a_players: a_players,
+                     self.r_players: r_players}
+        if self.convert_a_to_one_hot:
+            a_players_one_hot = self.np_action_to_one_hot(a_players[0])
         if self.value_fn_variant == 'estimated':
             g_log_pi_list = []
             for underlying_agent in self.underlying_agents:
@@ -341,19 +374,18 @@ class Planning_Agent(Agent):
             # print("g_log_pi_arr", g_log_pi_arr.shape)
             feed_dict[self.g_log_pi] = g_log_pi_arr
         if self.value_fn_variant == 'exact':
+            if players_action_probs is None:
+                players_action_probs = [underlying_agent.calc_action_probs(s, add_dim=False)
+                                        for underlying_agent in self.underlying_agents]
             p_players_list = []
-            for underlying_agent in self.underlying_agents:
-                idx = underlying_agent.agent_idx
+            for action_probs in players_action_probs:
                 if self.convert_a_to_one_hot:
-                    p_players_list.append(underlying_agent.calc_action_probs(s, add_dim=False))
+                    p_players_list.append(action_probs)
                 else:
-                    p_players_list.append(underlying_agent.calc_action_probs(s)[0, -1])  # Only 2 actions
+                    p_players_list.append(action_probs[:, -1])  # Only 2 actions
                 # if "CoinGame" in self.env_name:
                 #     v_list.append(underlying_agent.calcul_value(s, add_dim=False))
-            if self.convert_a_to_one_hot:
-                p_players_arr = np.stack(p_players_list, axis=1)
-            else:
-                p_players_arr = np.reshape(np.asarray(p_players_list), [1, -1])
+            p_players_arr = np.stack(p_players_list, axis=1)
             feed_dict[self.p_players] = p_players_arr
             # if "CoinGame" in self.env_name:
             #     v_players_arr = np.reshape(np.asarray(v_list), [1, -1])
@@ -363,13 +395,12 @@ class Planning_Agent(Agent):
 
         feed_dict[self.mean_v_in] = self.mean_v_np
         feed_dict[self.mean_vp_in] = self.mean_vp_np
+        return feed_dict
 
+    def process_learn_results(self, learn_results, r_players):
+        """Process the values fetched with self.learn_fetches"""
         (_, action, loss, g_Vp, g_V, cost, extra_loss, l1,
-            mean_v, vp, v, mean_vp) = self.sess.run([self.train_op, self.vp, self.loss,
-                                                 self.g_Vp, self.g_V,
-                                                 self.cost, self.extra_loss, self.l1,
-                                               self.mean_v_out, self.vp, self.v,
-                                            self.mean_vp_out], feed_dict)
+            mean_v, vp, v, mean_vp) = learn_results
         self.mean_v_np = mean_v
         self.mean_vp_np = mean_vp
 
@@ -385,9 +416,12 @@ class Planning_Agent(Agent):
         return a_players_one_hot
 
     def choose_action(self, s, a_players):
-        s = s[np.newaxis, :]
         a_players = np.asarray(a_players)
+        if s.ndim == 2:
+            # Batch of states and of joint actions
+            return self.sess.run(self.vp, {self.s: s, self.a_players: a_players})
 
+        s = s[np.newaxis, :]
         a_plan = self.sess.run(self.vp, {self.s: s,
                                      self.a_players: a_players[np.newaxis, ...]})[0, :]
 
@@ -395,21 +429,19 @@ class Planning_Agent(Agent):
         return a_plan
 
     def calc_conditional_planning_actions(self, s):
+        """
+        Planning reward given to the first player for each joint action in the state s, as a [2, 2] array
+        indexed by the actions of the two players. Only used to inspect the planner: it is not called during
+        the training (see the commented logging in choose_action).
+        """
         assert "CoinGame" not in self.env_name
-        # Planning actions in each of the 4 cases: DD, CD, DC, CC
-        a_plan_DD = self.sess.run(self.action_layer, {self.s: s, self.a_players: np.array([0, 0])[np.newaxis, :]})
-        a_plan_CD = self.sess.run(self.action_layer, {self.s: s, self.a_players: np.array([1, 0])[np.newaxis, :]})
-        a_plan_DC = self.sess.run(self.action_layer, {self.s: s, self.a_players: np.array([0, 1])[np.newaxis, :]})
-        a_plan_CC = self.sess.run(self.action_layer, {self.s: s, self.a_players: np.array([1, 1])[np.newaxis, :]})
-        l_temp = [a_plan_DD, a_plan_CD, a_plan_DC, a_plan_CC]
+        # Planning actions in each of the 4 cases: DD, CD, DC, CC (evaluated as one batch)
+        n_cases = len(CONDITIONAL_JOINT_ACTIONS)
+        a_plan = self.sess.run(self.action_layer, {self.s: np.repeat(np.atleast_2d(s), n_cases, axis=0),
+                                                   self.a_players: CONDITIONAL_JOINT_ACTIONS})
         if self.max_reward_strength is not None:
-            l = [2 * self.max_reward_strength * (a_plan_X[0, 0] - 0.5) for a_plan_X in l_temp]
-        else:
-            l = [a_plan_X[0, 0] for a_plan_X in l_temp]
+            a_plan = 2 * self.max_reward_strength * (a_plan - 0.5)
+        l = a_plan[:, 0]
         if self.with_redistribution:
-            if self.max_reward_strength is not None:
-                l2 = [2 * self.max_reward_strength * (a_plan_X[0, 1] - 0.5) for a_plan_X in l_temp]
-            else:
-                l2 = [a_plan_X[0, 1] for a_plan_X in l_temp]
-            l = [0.5 * (elt[0] - elt[1]) for elt in zip(l, l2)]
-        return np.transpose(np.reshape(np.asarray(l), [2, 2]))
+            l = 0.5 * (l - a_plan[:, 1])
+        return np.transpose(np.reshape(l, [2, 2]))
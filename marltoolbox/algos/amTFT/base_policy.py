@@ -44,6 +44,15 @@ DEFAULT_CONFIG = merge_dicts(
         "punishment_multiplier": 6.0,
         "rollout_length": 40,
         "n_rollout_replicas": 20,
+        # Play all the replicas of the rollouts in parallel in copies of the environment, with one call per
+        # timestep to each nested policy (only used by amTFTRolloutsTorchPolicy)
+        "batch_rollouts": False,
+        # Search of the duration of the punishment k: "linear" (explore the k one by one) or "galloping" (opt-in,
+        # exponential then binary search, assuming that the loss of the opponent increases with k)
+        "k_search": "linear",
+        # Number of states for which the losses of the opponent (for each k) are kept, to not redo the same rollouts
+        # (the cache is cleared when new weights are set). 0 to disable.
+        "k_opp_loss_cache_size": 1000,
         # TODO use log level of RLLib instead of mine
         "verbose": 1,
 
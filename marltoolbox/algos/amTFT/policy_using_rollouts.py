@@ -1,3 +1,6 @@
+import copy
+from collections import OrderedDict
+
 import numpy as np
 from ray.rllib.evaluation import MultiAgentEpisode
 from ray.rllib.utils.typing import TensorType
@@ -7,10 +10,18 @@ from marltoolbox.algos.amTFT.base_policy import amTFTPolicyBase, OWN_COOP_POLICY
     OPP_SELFISH_POLICY_IDX, OPP_COOP_POLICY_IDX
 from marltoolbox.utils import rollout
 
+K_SEARCH_LINEAR = "linear"
+K_SEARCH_GALLOPING = "galloping"
+K_SEARCHES = (K_SEARCH_LINEAR, K_SEARCH_GALLOPING)
+
 
 class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
 
     def __init__(self, observation_space, action_space, config, **kwargs):
+        # Before super().__init__ since the weights can be set when loading a checkpoint
+        # (weights version, state) -> (k_opp_loss, k_n_steps_played), oldest entry first
+        self._k_opp_loss_cache = OrderedDict()
+        self._weights_version = 0
         super().__init__(observation_space, action_space, config, **kwargs)
         self._init_for_rollout(self.config)
 
@@ -19,6 +30,13 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
         self.use_opponent_policies = False
         self.rollout_length = config["rollout_length"]
         self.n_rollout_replicas = config["n_rollout_replicas"]
+        self.batch_rollouts = config["batch_rollouts"]
+        self._rollout_envs = []
+        self._rollout_envs_source = None
+        self.k_search = config["k_search"]
+        assert self.k_search in K_SEARCHES, f"k_search: {self.k_search} must be in {K_SEARCHES}"
+        self.k_opp_loss_cache_size = config["k_opp_loss_cache_size"]
+        self.n_rollouts_performed = 0
         self.performing_rollouts = False
         self.overwrite_action = []
         self.own_policy_id = config["own_policy_id"]
@@ -54,6 +72,12 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
         return super().compute_actions(obs_batch, state_batches, prev_action_batch, prev_reward_batch,
                                        info_batch, episodes, explore, timestep, **kwargs)
 
+    def set_weights(self, weights):
+        super().set_weights(weights)
+        # The losses estimated with the previous weights are no more valid
+        self._weights_version += 1
+        self._k_opp_loss_cache.clear()
+
     def _select_algo_to_use_in_eval(self):
         if not self.use_opponent_policies:
             if self.n_steps_to_punish == 0:
@@ -84,18 +108,23 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
     def _compute_debit_using_rollouts(self, last_obs, opp_action, worker):
         n_steps_to_punish, policy_map, policy_agent_mapping = self._prepare_to_perform_virtual_rollouts_in_env(worker)
 
-        # Cooperative rollouts
-        mean_total_reward_for_totally_coop_opp, _ = self._compute_opp_mean_total_reward(worker, policy_map,
-                                                                                        policy_agent_mapping,
-                                                                                        partially_coop=False,
-                                                                                        opp_action=None,
-                                                                                        last_obs=last_obs)
-        # Cooperative rollouts with first action as the real one
-        mean_total_reward_for_partially_coop_opp, _ = self._compute_opp_mean_total_reward(worker, policy_map,
-                                                                                          policy_agent_mapping,
-                                                                                          partially_coop=True,
-                                                                                          opp_action=opp_action,
-                                                                                          last_obs=last_obs)
+        if self.batch_rollouts:
+            # Cooperative rollouts and cooperative rollouts with first action as the real one, played together
+            mean_total_reward_for_totally_coop_opp, mean_total_reward_for_partially_coop_opp, _ = \
+                self._compute_opp_mean_total_rewards_in_batch(worker, last_obs, opp_action=opp_action)
+        else:
+            # Cooperative rollouts
+            mean_total_reward_for_totally_coop_opp, _ = self._compute_opp_mean_total_reward(worker, policy_map,
+                                                                                            policy_agent_mapping,
+                                                                                            partially_coop=False,
+                                                                                            opp_action=None,
+                                                                                            last_obs=last_obs)
+            # Cooperative rollouts with first action as the real one
+            mean_total_reward_for_partially_coop_opp, _ = self._compute_opp_mean_total_reward(worker, policy_map,
+                                                                                              policy_agent_mapping,
+                                                                                              partially_coop=True,
+                                                                                              opp_action=opp_action,
+                                                                                              last_obs=last_obs)
 
         print("mean_total_reward_for_partially_coop_opp", mean_total_reward_for_partially_coop_opp)
         print("mean_total_reward_for_totally_coop_opp", mean_total_reward_for_totally_coop_opp)
@@ -142,14 +171,20 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
         # policy_agent_mapping = (lambda agent_id: self._switch_own_and_opp(agent_id))
         n_steps_to_punish, policy_map, policy_agent_mapping = self._prepare_to_perform_virtual_rollouts_in_env(worker)
 
-        self.k_opp_loss = {}
+        self.k_opp_loss, self.k_n_steps_played = self._get_k_opp_loss_memo(worker, last_obs)
+        # The k explored during this search (the memo can contain k explored in previous searches)
+        self.k_explored = set()
         k_to_explore = self.last_k
         self.debit_threshold_wt_multiplier = self.total_debit * self.punishment_multiplier
 
-        continue_to_search_k = True
-        while continue_to_search_k:
-            k_to_explore, continue_to_search_k = self._search_duration_of_future_punishment(
+        if self.k_search == K_SEARCH_GALLOPING:
+            k_to_explore = self._galloping_search_duration_of_future_punishment(
                 k_to_explore, worker, policy_map, policy_agent_mapping, last_obs)
+        else:
+            continue_to_search_k = True
+            while continue_to_search_k:
+                k_to_explore, continue_to_search_k = self._search_duration_of_future_punishment(
+                    k_to_explore, worker, policy_map, policy_agent_mapping, last_obs)
 
         self._stop_performing_virtual_rollouts_in_env(n_steps_to_punish)
         self.last_k = k_to_explore
@@ -177,19 +212,84 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
             # to compensate for the current total debit
             if k_to_explore >= n_steps_played and self.k_opp_loss[k_to_explore] < self.debit_threshold_wt_multiplier:
                 print("n_steps_played", n_steps_played, "k_to_explore", k_to_explore)
-                k_to_explore = max(self.k_opp_loss.keys())
+                k_to_explore = max(self.k_explored)
                 continue_to_search_k = False
                 return k_to_explore, continue_to_search_k
 
             if self.k_opp_loss[k_to_explore] > self.debit_threshold_wt_multiplier:
-                k_to_explore = min(self.k_opp_loss.keys())
+                k_to_explore = min(self.k_explored)
             elif self.k_opp_loss[k_to_explore] < self.debit_threshold_wt_multiplier:
-                k_to_explore = max(self.k_opp_loss.keys()) + 1
+                k_to_explore = max(self.k_explored) + 1
 
         return k_to_explore, continue_to_search_k
 
+    def _galloping_search_duration_of_future_punishment(self, k_to_explore, worker, policy_map,
+                                                        policy_agent_mapping, last_obs):
+        """
+        Search the smallest k for which the loss of the opponent reaches the threshold, assuming that this loss
+        increases with k: gallop from the last k found (steps of 1, 2, 4, ...) to bracket it, then bisect.
+        """
+        threshold = self.debit_threshold_wt_multiplier
+
+        def reaches_threshold(k):
+            self._compute_opp_loss_for_one_k(k, worker, policy_map, policy_agent_mapping, last_obs)
+            return self.k_opp_loss[k] >= threshold
+
+        k_to_explore = min(max(k_to_explore, 1), self.rollout_length)
+        n_steps_played = self._compute_opp_loss_for_one_k(k_to_explore, worker, policy_map, policy_agent_mapping,
+                                                          last_obs)
+        # Punishing after the end of the episode doesn't increase the loss of the opponent
+        max_k = max(1, min(self.rollout_length, n_steps_played))
+
+        step = 1
+        if self.k_opp_loss[k_to_explore] >= threshold:
+            # k_opp_loss[0] is 0, below the threshold
+            high_k = k_to_explore
+            low_k = max(high_k - step, 0)
+            while low_k > 0 and reaches_threshold(low_k):
+                high_k = low_k
+                step *= 2
+                low_k = max(high_k - step, 0)
+        else:
+            low_k = min(k_to_explore, max_k)
+            high_k = min(low_k + step, max_k)
+            while high_k > low_k and not reaches_threshold(high_k):
+                low_k = high_k
+                step *= 2
+                high_k = min(low_k + step, max_k)
+            if high_k == low_k:
+                # There is not enough steps remaining in the episode to compensate for the current total debit
+                if self.verbose > 0:
+                    print("n_steps_played", n_steps_played, "k_to_explore", high_k)
+                return high_k
+
+        while high_k - low_k > 1:
+            middle_k = (low_k + high_k) // 2
+            if reaches_threshold(middle_k):
+                high_k = middle_k
+            else:
+                low_k = middle_k
+        return high_k
+
+    def _get_k_opp_loss_memo(self, worker, last_obs):
+        """
+        Losses of the opponent already estimated (for each k) from the same state with the same weights, if any.
+        The state is identified by the observations and the step in the episode of the environment.
+        """
+        if self.k_opp_loss_cache_size <= 0:
+            return {}, {}
+        obs_key = tuple((agent_id, np.asarray(obs).tobytes()) for agent_id, obs in sorted(last_obs.items()))
+        key = (self._weights_version, obs_key, getattr(worker.env, "step_count_in_current_episode", None))
+        if key in self._k_opp_loss_cache:
+            self._k_opp_loss_cache.move_to_end(key)
+        else:
+            self._k_opp_loss_cache[key] = ({}, {})
+            if len(self._k_opp_loss_cache) > self.k_opp_loss_cache_size:
+                self._k_opp_loss_cache.popitem(last=False)
+        return self._k_opp_loss_cache[key]
+
     def _compute_opp_loss_for_one_k(self, k_to_explore, worker, policy_map, policy_agent_mapping, last_obs):
-        n_steps_played = 0
+        self.k_explored.add(k_to_explore)
         if self._is_k_out_of_bound(k_to_explore):
             self.k_opp_loss[k_to_explore] = 0
         elif k_to_explore not in self.k_opp_loss.keys():
@@ -198,10 +298,11 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
                                                                                         policy_agent_mapping,
                                                                                         last_obs=last_obs)
             self.k_opp_loss[k_to_explore] = opp_total_reward_loss
+            self.k_n_steps_played[k_to_explore] = n_steps_played
             if self.verbose > 0:
                 print(f"k_to_explore {k_to_explore}: {opp_total_reward_loss}")
 
-        return n_steps_played
+        return self.k_n_steps_played.get(k_to_explore, 0)
 
     def _is_k_out_of_bound(self, k_to_explore):
         return k_to_explore <= 0 or k_to_explore > self.rollout_length
@@ -212,18 +313,24 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
         return found_k
 
     def _compute_opp_total_reward_loss(self, k_to_explore, worker, policy_map, policy_agent_mapping, last_obs):
-        # Cooperative rollouts
-        coop_mean_total_reward, n_steps_played = self._compute_opp_mean_total_reward(worker, policy_map,
-                                                                                     policy_agent_mapping,
-                                                                                     partially_coop=False,
-                                                                                     opp_action=None,
-                                                                                     last_obs=last_obs)
-        # Cooperative rollouts with first action as the real one
-        partially_coop_mean_total_reward, _ = self._compute_opp_mean_total_reward(worker, policy_map,
-                                                                                  policy_agent_mapping,
-                                                                                  partially_coop=False,
-                                                                                  opp_action=None, last_obs=last_obs,
-                                                                                  k_to_explore=k_to_explore)
+        if self.batch_rollouts:
+            # Cooperative rollouts and rollouts with k steps of punishment, played together
+            coop_mean_total_reward, partially_coop_mean_total_reward, n_steps_played = \
+                self._compute_opp_mean_total_rewards_in_batch(worker, last_obs, k_to_explore=k_to_explore)
+        else:
+            # Cooperative rollouts
+            coop_mean_total_reward, n_steps_played = self._compute_opp_mean_total_reward(worker, policy_map,
+                                                                                         policy_agent_mapping,
+                                                                                         partially_coop=False,
+                                                                                         opp_action=None,
+                                                                                         last_obs=last_obs)
+            # Cooperative rollouts with first action as the real one
+            partially_coop_mean_total_reward, _ = self._compute_opp_mean_total_reward(worker, policy_map,
+                                                                                      policy_agent_mapping,
+                                                                                      partially_coop=False,
+                                                                                      opp_action=None,
+                                                                                      last_obs=last_obs,
+                                                                                      k_to_explore=k_to_explore)
 
         opp_total_reward_loss = coop_mean_total_reward - partially_coop_mean_total_reward
 
@@ -257,9 +364,114 @@ class amTFTRolloutsTorchPolicy(amTFTPolicyBase):
             opp_total_reward = sum(opp_rewards)
 
             opp_total_rewards.append(opp_total_reward)
+            self.n_rollouts_performed += 1
         # print("total_rewards", total_rewards)
         self.n_steps_to_punish = 0
         self.n_steps_to_punish_opponent = 0
         n_steps_played = len(epi)
         opp_mean_total_reward = sum(opp_total_rewards) / len(opp_total_rewards)
         return opp_mean_total_reward, n_steps_played
+
+    def _compute_opp_mean_total_rewards_in_batch(self, worker, last_obs, k_to_explore=0, opp_action=None):
+        """
+        Play n_rollout_replicas rollouts together: the first half are cooperative rollouts, in the second half
+        both players punish during the first k_to_explore steps and the first action of the opponent is
+        overwritten with opp_action (if provided).
+
+        :return: the mean total reward of the opponent in the cooperative rollouts, the same in the other
+            rollouts and the number of steps played
+        """
+        n_replicas_per_half = self.n_rollout_replicas // 2
+        n_steps_to_punish = [0] * n_replicas_per_half + [k_to_explore] * n_replicas_per_half
+        first_opp_actions = [None] * n_replicas_per_half + [opp_action] * n_replicas_per_half
+        opp_total_rewards, n_steps_played = self._play_rollouts_in_batch(worker, last_obs, n_steps_to_punish,
+                                                                         first_opp_actions)
+        self.n_rollouts_performed += len(n_steps_to_punish)
+        return (opp_total_rewards[:n_replicas_per_half].mean(), opp_total_rewards[n_replicas_per_half:].mean(),
+                n_steps_played)
+
+    def _play_rollouts_in_batch(self, worker, last_obs, n_steps_to_punish, first_opp_actions):
+        """
+        Play one rollout per replica, all the replicas together: each replica is a copy of the environment of the
+        worker and, at each timestep, each nested policy computes with one call the actions of all the replicas in
+        which it is active (instead of one call per replica and per player in the sequential rollouts).
+
+        :param n_steps_to_punish: number of steps during which both players punish, for each replica
+        :param first_opp_actions: first action of the opponent for each replica (None to not overwrite it)
+        :return: the total reward of the opponent in each replica and the number of steps played
+        """
+        n_replicas = len(n_steps_to_punish)
+        own_steps_to_punish = np.array(n_steps_to_punish)
+        opp_steps_to_punish = own_steps_to_punish.copy()
+        overwrite_first_opp_action = np.array([action is not None for action in first_opp_actions])
+        envs = self._get_rollout_envs(worker.env, n_replicas)
+        # As in the sequential rollouts, all the players are mapped to the own policy
+        preprocessor = worker.preprocessors[self.own_policy_id]
+        obs_filter = worker.filters[self.own_policy_id]
+
+        observations = [last_obs] * n_replicas
+        opp_total_rewards = np.zeros(n_replicas)
+        playing = np.ones(n_replicas, dtype=bool)
+        timestep = self.global_timestep
+        n_steps_played = 0
+        while playing.any() and n_steps_played < self.rollout_length:
+            timestep += 1
+            replicas = np.flatnonzero(playing)
+            actions = {}
+            for agent_id in last_obs.keys():
+                obs_batch = np.stack([obs_filter(preprocessor.transform(observations[i][agent_id]), update=False)
+                                      for i in replicas])
+                if agent_id == self.own_policy_id:
+                    steps_to_punish = own_steps_to_punish
+                    coop_idx, selfish_idx = OWN_COOP_POLICY_IDX, OWN_SELFISH_POLICY_IDX
+                    overwritten = np.zeros(len(replicas), dtype=bool)
+                else:
+                    steps_to_punish = opp_steps_to_punish
+                    coop_idx, selfish_idx = OPP_COOP_POLICY_IDX, OPP_SELFISH_POLICY_IDX
+                    overwritten = overwrite_first_opp_action[replicas] & (n_steps_played == 0)
+
+                agent_actions = np.zeros(len(replicas), dtype=np.int64)
+                agent_actions[overwritten] = [first_opp_actions[i] for i in replicas[overwritten]]
+                algo_idx = np.where(steps_to_punish[replicas] > 0, selfish_idx, coop_idx)
+                for idx in np.unique(algo_idx[~overwritten]):
+                    selected = ~overwritten & (algo_idx == idx)
+                    agent_actions[selected], _, _ = self.algorithms[idx].compute_actions(obs_batch[selected],
+                                                                                         timestep=timestep)
+                # As in _select_algo_to_use_in_eval (not called when the action is overwritten)
+                stepped = replicas[~overwritten]
+                steps_to_punish[stepped] = np.maximum(steps_to_punish[stepped] - 1, 0)
+                actions[agent_id] = agent_actions
+
+            for replica_idx, i in enumerate(replicas):
+                observations[i], rewards, done, _ = envs[i].step(
+                    {agent_id: replicas_actions[replica_idx] for agent_id, replicas_actions in actions.items()})
+                opp_total_rewards[i] += rewards[self.opp_policy_id]
+                playing[i] = not done["__all__"]
+            n_steps_played += 1
+
+        return opp_total_rewards, n_steps_played
+
+    def _get_rollout_envs(self, env, n_replicas):
+        """
+        Copies of env in its current state, one per replica. When env supports snapshots (get_state and
+        set_state), the copies are created once and only their state is updated before each batch of rollouts.
+        """
+        if not (hasattr(env, "get_state") and hasattr(env, "set_state")):
+            return [self._copy_env_for_rollouts(env) for _ in range(n_replicas)]
+
+        if self._rollout_envs_source is not env or len(self._rollout_envs) != n_replicas:
+            self._rollout_envs = [self._copy_env_for_rollouts(env) for _ in range(n_replicas)]
+            self._rollout_envs_source = env
+        # Without the RNG state: each copy keeps its own random stream
+        env_state = env.get_state(with_rng_state=False)
+        for rollout_env in self._rollout_envs:
+            rollout_env.set_state(env_state)
+        return self._rollout_envs
+
+    @staticmethod
+    def _copy_env_for_rollouts(env):
+        env_copy = copy.deepcopy(env)
+        # Different random streams in each replica, as when internal_rollout seeds the env before each rollout
+        if hasattr(env_copy, "seed") and callable(env_copy.seed):
+            env_copy.seed(None)
+        return env_copy
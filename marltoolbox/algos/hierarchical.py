@@ -54,17 +54,18 @@ class HierarchicalTorchPolicy(rllib.policy.TorchPolicy):
 
         self.to_log = {}
 
-    def __getattribute__(self, attr):
+    def __getattr__(self, attr):
         """
         Here we try to fallback to attributes in the active policy.
+        Only called when the normal attribute lookup fails, such that the attributes of this policy are accessed
+        without overhead.
         """
         try:
-            return object.__getattribute__(self, attr)
-        except AttributeError as initial:
-            try:
-                return object.__getattribute__(self.algorithms[self.active_algo_idx], attr)
-            except AttributeError:
-                raise initial
+            algorithms = object.__getattribute__(self, "algorithms")
+            active_algo_idx = object.__getattribute__(self, "active_algo_idx")
+            return object.__getattribute__(algorithms[active_algo_idx], attr)
+        except AttributeError:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{attr}'") from None
 
     @property
     def model(self):
@@ -161,6 +162,9 @@ class HierarchicalTorchPolicy(rllib.policy.TorchPolicy):
         if remove:
             # torch logical not
             filter = ~ filter
+        if not copy_data and np.all(filter):
+            # Nothing to remove: keep sharing the data
+            return samples
         return SampleBatch({k: np.array(v, copy=copy_data)[filter] for (k, v) in samples.data.items()})
 
     def postprocess_trajectory(self, sample_batch,
@@ -168,3 +172,20 @@ class HierarchicalTorchPolicy(rllib.policy.TorchPolicy):
                                episode=None):
         return self.algorithms[self.active_algo_idx].postprocess_trajectory(sample_batch, other_agent_batches, episode)
 
+
+
+def read_only_view(samples: SampleBatch, overlay: Optional[Dict[str, TensorType]] = None) -> SampleBatch:
+    """
+    SampleBatch sharing the data of samples without copying it, to give the same training batch to several nested
+    policies. The numpy columns are read-only views, such that a nested policy can't modify the data seen by the
+    others. The columns in overlay replace (or add) columns only in the returned batch.
+    """
+    columns = dict(samples.data)
+    if overlay is not None:
+        columns.update(overlay)
+    for key, value in columns.items():
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.flags.writeable = False
+            columns[key] = value
+    return SampleBatch(columns)
@@ -8,11 +8,32 @@ from tensorflow.python.ops import math_ops
 from marltoolbox.algos.lola.utils import flatgrad
 
 
+def cumsum_values(policy_network, opp_policy_network, batch_size, trace_length):
+    """Computes the values used for the corrections with cumulative sums over time.
+
+    For each element in the batch: sum_t r_t * (sum_{i<=t} log_pi_0_i) * (sum_{j<=t} log_pi_1_j), which is what the
+    cube and the unrolled loop compute, with O(trace_length) memory and a graph size independent of trace_length.
+
+    Returns:
+    -----
+        v_0, v_1: tensors of shape [batch_size]
+    """
+    ac_logp0 = tf.reshape(policy_network.log_pi_action_bs_t,
+                          [batch_size, trace_length])
+    ac_logp1 = tf.reshape(opp_policy_network.log_pi_action_bs_t,
+                          [batch_size, trace_length])
+    mat_cumsum = tf.cumsum(ac_logp0, axis=1) * tf.cumsum(ac_logp1, axis=1)
+    v_0 = tf.reduce_sum(mat_cumsum * policy_network.sample_reward, axis=1)
+    v_1 = tf.reduce_sum(mat_cumsum * opp_policy_network.sample_reward, axis=1)
+    return v_0, v_1
+
+
 def corrections_func(mainPN, batch_size, trace_length,
                      corrections=False, cube=None, clip_lola_update_norm=False,
                      lola_correction_multiplier=1.0,
                      clip_lola_correction_norm=False,
-                     clip_lola_actor_norm=False, against_destabilizer_exploiter=False):
+                     clip_lola_actor_norm=False, against_destabilizer_exploiter=False,
+                     use_cumsum=False):
     """Computes corrections for policy gradients.
 
     Args:
@@ -29,6 +50,11 @@ def corrections_func(mainPN, batch_size, trace_length,
             compile but is quite memory inefficient.
             When None, variance reduction graph is contructed dynamically,
             is a little longer to compile, but has lower memory footprint.
+        use_cumsum: bool (default: False)
+            Only used when cube is None. Whether to compute the variance reduction
+            with cumulative sums over time (see `cumsum_values`) instead of a loop
+            unrolled over trace_length. Same values, with a graph size independent
+            of trace_length.
     """
     # not mem_efficient
     if cube is not None:
@@ -47,6 +73,15 @@ def corrections_func(mainPN, batch_size, trace_length,
 
         v_0 = 2 * tf.reduce_sum(v_0 * cube) / batch_size
         v_1 = 2 * tf.reduce_sum(v_1 * cube) / batch_size
+    # wt mem_efficient and constant graph size
+    elif use_cumsum:
+        v_0, v_1 = cumsum_values(mainPN[0], mainPN[1], batch_size, trace_length)
+        v_0 = 2 * tf.reduce_sum(v_0) / batch_size
+
+        if against_destabilizer_exploiter:
+            v_1 = 2 * v_1 / batch_size
+        else:
+            v_1 = 2 * tf.reduce_sum(v_1) / batch_size
     # wt mem_efficient
     else:
         ac_logp0 = tf.reshape(mainPN[0].log_pi_action_bs_t,
@@ -194,7 +229,8 @@ def corrections_func(mainPN, batch_size, trace_length,
 
 
 
-def simple_actor_training_func(policy_network, opp_policy_network, batch_size, trace_length, cube=None):
+def simple_actor_training_func(policy_network, opp_policy_network, batch_size, trace_length, cube=None,
+                               use_cumsum=False):
                                # corrections=False, , clip_lola_update_norm=False,
                      # lola_correction_multiplier=1.0,
                      # clip_lola_correction_norm=False,
@@ -216,6 +252,11 @@ def simple_actor_training_func(policy_network, opp_policy_network, batch_size, t
 
         v_0 = 2 * tf.reduce_sum(v_0 * cube) / batch_size
         v_1 = 2 * tf.reduce_sum(v_1 * cube) / batch_size
+    # wt mem_efficient and constant graph size
+    elif use_cumsum:
+        v_0, v_1 = cumsum_values(policy_network, opp_policy_network, batch_size, trace_length)
+        v_0 = 2 * tf.reduce_sum(v_0) / batch_size
+        v_1 = 2 * tf.reduce_sum(v_1) / batch_size
     # wt mem_efficient
     else:
         ac_logp0 = tf.reshape(policy_network.log_pi_action_bs_t,
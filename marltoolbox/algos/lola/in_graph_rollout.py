@@ -0,0 +1,179 @@
+"""
+Coin Game transition implemented with TF ops, to collect whole batches of LOLA episodes with one sess.run.
+The dynamics are the ones of marltoolbox.envs.vectorized_coin_game (with the same uniform samples, the states,
+rewards and coin positions are identical).
+"""
+import numpy as np
+import tensorflow as tf
+
+MOVES = np.array([
+    [0, 1],
+    [0, -1],
+    [1, 0],
+    [-1, 0],
+])
+
+
+def place_coin(red_pos, blue_pos, grid_size, coin_rand):
+    """
+    Same as vectorized_coin_game.place_coin for a batch: the coin is placed on the free cell selected by the
+    uniform sample coin_rand (float64).
+    """
+    red_pos_flat = red_pos[:, 0] * grid_size + red_pos[:, 1]
+    blue_pos_flat = blue_pos[:, 0] * grid_size + blue_pos[:, 1]
+    first_occupied = tf.minimum(red_pos_flat, blue_pos_flat)
+    second_occupied = tf.maximum(red_pos_flat, blue_pos_flat)
+    two_occupied = tf.not_equal(first_occupied, second_occupied)
+    n_free_cells = grid_size * grid_size - 1 - tf.cast(two_occupied, tf.int32)
+
+    flat_coin_pos = tf.cast(tf.floor(coin_rand * tf.cast(n_free_cells, tf.float64)), tf.int32)
+    flat_coin_pos += tf.cast(flat_coin_pos >= first_occupied, tf.int32)
+    flat_coin_pos += tf.cast(tf.logical_and(two_occupied, flat_coin_pos >= second_occupied), tf.int32)
+    return tf.stack([flat_coin_pos // grid_size, flat_coin_pos % grid_size], axis=1)
+
+
+def coin_game_step(red_pos, blue_pos, coin_pos, red_coin, actions_red, actions_blue, coin_rand, grid_size,
+                   asymmetric=False):
+    """
+    Same as vectorized_coin_game.vectorized_step_with_numba_optimization (without the observations).
+    The positions have the shape [batch_size, 2] and red_coin, the actions and coin_rand the shape [batch_size].
+
+    :return: red_pos, blue_pos, coin_pos, red_coin, reward_red, reward_blue and the pick flags red_pick_any,
+        red_pick_red, blue_pick_any, blue_pick_blue (one per sub-environment)
+    """
+    moves = tf.constant(MOVES, dtype=tf.int32)
+    red_pos = (red_pos + tf.gather(moves, actions_red)) % grid_size
+    blue_pos = (blue_pos + tf.gather(moves, actions_blue)) % grid_size
+
+    is_red_coin = tf.equal(red_coin, 1)
+    red_pick_any = tf.reduce_all(tf.equal(red_pos, coin_pos), axis=1)
+    blue_pick_any = tf.reduce_all(tf.equal(blue_pos, coin_pos), axis=1)
+    red_pick_red = tf.logical_and(red_pick_any, is_red_coin)
+    blue_pick_blue = tf.logical_and(blue_pick_any, tf.logical_not(is_red_coin))
+    red_pick_blue = tf.logical_and(red_pick_any, tf.logical_not(is_red_coin))
+    blue_pick_red = tf.logical_and(blue_pick_any, is_red_coin)
+
+    red_pick_reward = 4.0 if asymmetric else 1.0
+    reward_red = red_pick_reward * tf.cast(red_pick_any, tf.float32) - 2.0 * tf.cast(blue_pick_red, tf.float32)
+    reward_blue = tf.cast(blue_pick_any, tf.float32) - 2.0 * tf.cast(red_pick_blue, tf.float32)
+
+    generate = tf.logical_or(red_pick_any, blue_pick_any)
+    red_coin = tf.where(generate, 1 - red_coin, red_coin)
+    coin_pos = tf.where(generate, place_coin(red_pos, blue_pos, grid_size, coin_rand), coin_pos)
+    return (red_pos, blue_pos, coin_pos, red_coin, reward_red, reward_blue,
+            red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue)
+
+
+def generate_state(red_pos, blue_pos, coin_pos, red_coin, grid_size):
+    """Same as vectorized_coin_game.generate_state (observation of the red player), as float32"""
+    n_cells = grid_size * grid_size
+
+    def plane(pos):
+        return tf.one_hot(pos[:, 0] * grid_size + pos[:, 1], n_cells, dtype=tf.float32)
+
+    coin_plane = plane(coin_pos)
+    is_red_coin = tf.cast(red_coin, tf.float32)[:, tf.newaxis]
+    state = tf.stack([plane(red_pos), plane(blue_pos),
+                      coin_plane * is_red_coin, coin_plane * (1.0 - is_red_coin)], axis=-1)
+    return tf.reshape(state, [-1, grid_size, grid_size, 4])
+
+
+class CoinGameInGraphRollout:
+    """
+    Play a batch of Coin Game episodes between recurrent policies inside a tf.while_loop, such that the whole
+    batch of episodes is collected with one sess.run.
+
+    The initial states and the uniform samples used to place the coins are drawn by the (numpy) vectorized
+    Coin Game, in the same order as when stepping it. As in LOLAPGCG.step(), both policies observe the
+    observation of the red player.
+    """
+
+    def __init__(self, policy_fns, h_sizes, batch_size, trace_length, grid_size, asymmetric=False):
+        """
+        :param policy_fns: one function per player (state_input, lstm_state) -> (log_pi, lstm_state_output),
+            e.g. created with networks.make_step_policy_fn
+        :param h_sizes: size of the hidden state of the LSTM of each player
+        """
+        assert len(policy_fns) == 2
+        self.batch_size = batch_size
+        self.trace_length = trace_length
+        self.grid_size = grid_size
+
+        with tf.variable_scope('in_graph_rollout'):
+            self.red_pos = tf.placeholder(tf.int32, [batch_size, 2], "red_pos")
+            self.blue_pos = tf.placeholder(tf.int32, [batch_size, 2], "blue_pos")
+            self.coin_pos = tf.placeholder(tf.int32, [batch_size, 2], "coin_pos")
+            self.red_coin = tf.placeholder(tf.int32, [batch_size], "red_coin")
+            self.coin_rand = tf.placeholder(tf.float64, [trace_length, batch_size], "coin_rand")
+
+            def body(t, red_pos, blue_pos, coin_pos, red_coin, lstm_states, arrays):
+                state = generate_state(red_pos, blue_pos, coin_pos, red_coin, grid_size)
+                actions, next_lstm_states = [], []
+                for policy_fn, lstm_state in zip(policy_fns, lstm_states):
+                    log_pi, next_lstm_state = policy_fn(state, lstm_state)
+                    actions.append(tf.cast(tf.squeeze(tf.multinomial(log_pi, 1), axis=1), tf.int32))
+                    next_lstm_states.append(next_lstm_state)
+                (red_pos, blue_pos, coin_pos, red_coin, reward_red, reward_blue,
+                 *pick_flags) = coin_game_step(red_pos, blue_pos, coin_pos, red_coin, actions[0], actions[1],
+                                               self.coin_rand[t], grid_size, asymmetric)
+                values = [state, actions[0], actions[1], reward_red, reward_blue] + \
+                         [tf.reduce_any(flag) for flag in pick_flags]
+                arrays = [array.write(t, value) for array, value in zip(arrays, values)]
+                return t + 1, red_pos, blue_pos, coin_pos, red_coin, next_lstm_states, arrays
+
+            dtypes = [tf.float32, tf.int32, tf.int32, tf.float32, tf.float32] + [tf.bool] * 4
+            arrays = [tf.TensorArray(dtype, size=trace_length) for dtype in dtypes]
+            lstm_states = [tf.zeros((batch_size, h_size * 2), dtype=tf.float32) for h_size in h_sizes]
+            _, red_pos, blue_pos, coin_pos, red_coin, lstm_states, arrays = tf.while_loop(
+                lambda t, *_: t < trace_length, body,
+                [tf.constant(0), self.red_pos, self.blue_pos, self.coin_pos, self.red_coin, lstm_states, arrays])
+
+            stacked = [array.stack() for array in arrays]
+            # [trace_length, batch_size, ...]
+            self.states = stacked[0]
+            self.actions = stacked[1:3]
+            self.rewards = stacked[3:5]
+            # [trace_length] (any over the batch, as accumulated by the environment)
+            self.pick_flags = stacked[5:]
+            self.last_state = generate_state(red_pos, blue_pos, coin_pos, red_coin, grid_size)
+            self.last_lstm_states = lstm_states
+
+    def rollout(self, sess, env):
+        """
+        Reset env (a vectorized Coin Game with the same batch_size, grid_size and max_steps) and play a full
+        batch of episodes from its initial state.
+
+        :return: dict with the observations "states" [trace_length, batch_size, grid_size, grid_size, 4], the
+            "last_state" after the last step, the "actions" and "rewards" of each player [trace_length, batch_size],
+            the "last_lstm_states" and the "info" of the episode (as returned by the environment)
+        """
+        assert env.batch_size == self.batch_size and env.grid_size == self.grid_size
+        assert env.max_steps == self.trace_length
+        env.reset()
+        # Draw the samples in the same order as when stepping the environment
+        coin_rand = np.stack([env._draw_coin_rand() for _ in range(self.trace_length)], axis=0)
+        results = sess.run({
+            "states": self.states,
+            "last_state": self.last_state,
+            "actions": self.actions,
+            "rewards": self.rewards,
+            "pick_flags": self.pick_flags,
+            "last_lstm_states": self.last_lstm_states,
+        }, feed_dict={
+            self.red_pos: env.red_pos,
+            self.blue_pos: env.blue_pos,
+            self.coin_pos: env.coin_pos,
+            self.red_coin: env.red_coin,
+            self.coin_rand: coin_rand,
+        })
+
+        info = {}
+        if env.output_additional_info:
+            for step_pick_flags in zip(*results.pop("pick_flags")):
+                env._accumulate_info(*step_pick_flags)
+            player_red_info, player_blue_info = env._get_episode_info()
+            info = {env.player_red_id: player_red_info, env.player_blue_id: player_blue_info}
+        else:
+            results.pop("pick_flags")
+        results["info"] = info
+        return results
@@ -13,6 +13,46 @@ from ray.rllib.agents.dqn import DEFAULT_CONFIG, DQNTorchPolicy
 from ray.rllib.evaluation.sample_batch_builder import MultiAgentSampleBatchBuilder
 from ray.rllib.execution.replay_buffer import LocalReplayBuffer
 
+def conv_features(state_input):
+    """Convolutional features of the observations, shared by the policy and the value of Pnetwork"""
+    output = layers.convolution2d(state_input,
+        stride=1, kernel_size=3, num_outputs=20,
+        normalizer_fn=layers.batch_norm, activation_fn=tf.nn.relu)
+    output = layers.convolution2d(output,
+        stride=1, kernel_size=3, num_outputs=20,
+        normalizer_fn=layers.batch_norm, activation_fn=tf.nn.relu)
+    return layers.flatten(output)
+
+
+def policy_head(features, lstm_state, h_size, env, batch_size, trace_length):
+    """Recurrent policy head of Pnetwork. Returns the log probabilities of the actions and the next LSTM state."""
+    output_seq = batch_to_seq(features, batch_size, trace_length)
+    output_seq, state_output = lstm(output_seq, lstm_state,
+                                    scope='rnn', nh=h_size)
+    output = seq_to_batch(output_seq)
+
+    output = layers.fully_connected(output,
+                                    num_outputs=env.NUM_ACTIONS,
+                                    activation_fn=None)
+    return tf.nn.log_softmax(output), state_output
+
+
+def make_step_policy_fn(myScope, h_size, env, batch_size):
+    """
+    Create a function applying the step policy of the Pnetwork built in myScope to other tensors than its
+    placeholders (e.g. inside a tf.while_loop). The weights of the Pnetwork are reused.
+
+    :return: function (state_input, lstm_state) -> (log_pi, lstm_state_output)
+    """
+    def step_policy_fn(state_input, lstm_state):
+        with tf.variable_scope(myScope, reuse=True):
+            with tf.variable_scope('input_proc', reuse=True):
+                features = conv_features(state_input)
+            return policy_head(features, lstm_state, h_size, env, batch_size, trace_length=1)
+
+    return step_policy_fn
+
+
 class Pnetwork:
     """
     Recurrent policy network used in Coin Game experiments.
@@ -89,12 +129,7 @@ class Pnetwork:
 
             with tf.variable_scope('input_proc', reuse=reuse):
                 # if not changed_config:
-                output = layers.convolution2d(self.state_input,
-                    stride=1, kernel_size=3, num_outputs=20,
-                    normalizer_fn=layers.batch_norm, activation_fn=tf.nn.relu)
-                output = layers.convolution2d(output,
-                    stride=1, kernel_size=3, num_outputs=20,
-                    normalizer_fn=layers.batch_norm, activation_fn=tf.nn.relu)
+                output = conv_features(self.state_input)
                 # output = layers.convolution2d(self.state_input,
                 #     stride=1, kernel_size=3, num_outputs=20,
                 #     normalizer_fn=partial(layers.batch_norm,
@@ -126,8 +161,6 @@ class Pnetwork:
                 # output = tf.layers.batch_normalization(output, training=self.is_training)
                 # output = tf.nn.relu(output)
 
-                output = layers.flatten(output)
-
                 # if step:
                 #     position_in_epi = self.j
                 # else:
@@ -172,19 +205,8 @@ class Pnetwork:
                 # self.value = tf.reshape(layers.fully_connected(
                 #     tf.nn.relu(output), 1), [-1, trace_length]) * 0.0
 
-            if step:
-                output_seq = batch_to_seq(output, self.batch_size, 1)
-            else:
-                output_seq = batch_to_seq(output, self.batch_size, trace_length)
-            output_seq, state_output = lstm(output_seq, lstm_state,
-                                            scope='rnn', nh=h_size)
-            output = seq_to_batch(output_seq)
-
-            output = layers.fully_connected(output,
-                                            num_outputs=env.NUM_ACTIONS,
-                                            activation_fn=None)
-            self.log_pi = tf.nn.log_softmax(output)
-            self.lstm_state_output = state_output
+            self.log_pi, self.lstm_state_output = policy_head(output, lstm_state, h_size, env,
+                                                             self.batch_size, trace_length)
 
             entropy_temp = self.log_pi * tf.exp(self.log_pi)
             self.entropy = tf.reduce_mean(entropy_temp) * 4
@@ -366,6 +388,73 @@ class ExperienceBuffer:
         sampledTraces = np.array(sampledTraces)
         return np.reshape(sampledTraces,[batch_size*trace_length,6])
 
+
+class SampledTraces:
+    """
+    Transitions sampled by ArrayExperienceBuffer, stored as one array per field. Can be indexed like the array of
+    shape [batch_size * trace_length, 6] returned by ExperienceBuffer.sample (e.g. traces[:, 2] are the rewards).
+    """
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __getitem__(self, key):
+        rows, field_idx = key
+        return self.fields[field_idx][rows]
+
+
+class ArrayExperienceBuffer:
+    """
+    Same behavior as ExperienceBuffer (it keeps the last buffer_size episodes and sample returns one trace from
+    each stored episode) but the episodes are stored in preallocated numpy arrays used as a ring buffer. Adding an
+    episode is O(1) (one copy of the episode, no list shifting) and the traces are sampled with fancy indexing
+    (no deepcopy).
+
+    Memory use: at the first add, one array of shape [buffer_size, episode_length, *field_shape] is allocated for
+    each of the 6 fields of the transitions (state, action, reward, next state, done, agent). That is
+    buffer_size * episode_length * (2 * state_size + 4) values, e.g. 10k episodes of 20 steps with one-hot states
+    of size 5 take 10000 * 20 * 14 * 8 bytes = 22.4MB. The longest episode must be added first.
+    """
+    N_FIELDS = 6
+
+    def __init__(self, buffer_size=1000):
+        self.buffer_size = buffer_size
+        self.fields = None
+        self.episode_lengths = np.zeros(buffer_size, dtype=np.int64)
+        self.n_stored = 0
+        self.next_idx = 0
+
+    def __len__(self):
+        return self.n_stored
+
+    def add(self, experience):
+        """
+        :param experience: episode with the shape [episode_length, 6] (one row per transition) as for
+            ExperienceBuffer
+        """
+        episode_length = len(experience)
+        episode_fields = [np.asarray([transition[field_idx] for transition in experience])
+                          for field_idx in range(self.N_FIELDS)]
+        if self.fields is None:
+            self.fields = [np.zeros((self.buffer_size,) + episode_field.shape, dtype=episode_field.dtype)
+                           for episode_field in episode_fields]
+        assert episode_length <= self.fields[0].shape[1]
+
+        for field, episode_field in zip(self.fields, episode_fields):
+            field[self.next_idx, :episode_length] = episode_field
+        self.episode_lengths[self.next_idx] = episode_length
+        self.next_idx = (self.next_idx + 1) % self.buffer_size
+        self.n_stored = min(self.n_stored + 1, self.buffer_size)
+
+    def sample(self, batch_size, trace_length):
+        # From the oldest to the newest episode
+        episode_idx = (self.next_idx - self.n_stored + np.arange(self.n_stored)) % self.buffer_size
+        start = np.random.randint(0, self.episode_lengths[episode_idx] + 1 - trace_length)
+        step_idx = start[:, np.newaxis] + np.arange(trace_length)
+        episode_idx = episode_idx[:, np.newaxis]
+        return SampledTraces([
+            np.reshape(field[episode_idx, step_idx], (batch_size * trace_length,) + field.shape[2:])
+            for field in self.fields])
+
 class DQNAgent:
 
     def __init__(self, env, batch_size, trace_length, grid_size, exploiter_base_lr, exploiter_decay_lr_in_n_epi,
@@ -16,7 +16,8 @@ import tensorflow as tf
 from ray import tune
 
 from marltoolbox.algos.lola.corrections import corrections_func, simple_actor_training_func
-from marltoolbox.algos.lola.networks import Pnetwork, DQNAgent
+from marltoolbox.algos.lola.in_graph_rollout import CoinGameInGraphRollout
+from marltoolbox.algos.lola.networks import Pnetwork, DQNAgent, make_step_policy_fn
 from marltoolbox.algos.lola.utils import get_monte_carlo, make_cube
 from marltoolbox.envs.vectorized_coin_game import CoinGame, AsymCoinGame
 
@@ -63,7 +64,7 @@ class LOLAPGCG(tune.Trainable):
 
     def _init_lola(self, env, seed, num_episodes, trace_length, batch_size,
                    lola_update, opp_model, grid_size, gamma, hidden, bs_mul, lr,
-                   mem_efficient=True,
+                   mem_efficient=True, use_cumsum_corrections=False, in_graph_rollout=False,
                    #asymmetry=False,
                    warmup=False,
                    changed_config=False, ac_lr=1.0, summary_len=20, use_MAE=False,
@@ -132,6 +133,7 @@ class LOLAPGCG(tune.Trainable):
         self.bs_mul = bs_mul
         self.lr = lr
         self.mem_efficient = mem_efficient
+        self.use_cumsum_corrections = use_cumsum_corrections
         self.asymmetry = env == AsymCoinGame
         self.warmup = warmup
         self.changed_config = changed_config
@@ -249,7 +251,8 @@ class LOLAPGCG(tune.Trainable):
                                  lola_correction_multiplier=self.lola_correction_multiplier,
                                  clip_lola_correction_norm=clip_lola_correction_norm,
                                  clip_lola_actor_norm=clip_lola_actor_norm,
-                                 against_destabilizer_exploiter=self.use_destabilizer
+                                 against_destabilizer_exploiter=self.use_destabilizer,
+                                 use_cumsum=use_cumsum_corrections
                                  )
             else:
                 corrections_func([self.mainPN[0], self.mainPN_clone[1]],
@@ -258,7 +261,8 @@ class LOLAPGCG(tune.Trainable):
                                  lola_correction_multiplier=self.lola_correction_multiplier,
                                  clip_lola_correction_norm=clip_lola_correction_norm,
                                  clip_lola_actor_norm=clip_lola_actor_norm,
-                                 against_destabilizer_exploiter=self.use_destabilizer
+                                 against_destabilizer_exploiter=self.use_destabilizer,
+                                 use_cumsum=use_cumsum_corrections
                                  )
                 corrections_func([self.mainPN[1], self.mainPN_clone[0]],
                                  batch_size, trace_length, corrections, self.cube,
@@ -266,13 +270,27 @@ class LOLAPGCG(tune.Trainable):
                                  lola_correction_multiplier=self.lola_correction_multiplier,
                                  clip_lola_correction_norm=clip_lola_correction_norm,
                                  clip_lola_actor_norm=clip_lola_actor_norm,
-                                 against_destabilizer_exploiter=self.use_destabilizer
+                                 against_destabilizer_exploiter=self.use_destabilizer,
+                                 use_cumsum=use_cumsum_corrections
                                  )
                 clone_update(self.mainPN_clone)
 
             if self.use_PG_exploiter:
                 simple_actor_training_func(self.mainPN[2], self.mainPN[0],
-                                 batch_size, trace_length, self.cube)
+                                 batch_size, trace_length, self.cube,
+                                 use_cumsum=use_cumsum_corrections)
+
+            # With in_graph_rollout, the Coin Game is played inside the graph and a batch of episodes is
+            # collected with one sess.run (instead of trace_length sess.run)
+            if in_graph_rollout:
+                assert not self.playing_against_exploiter
+                self.in_graph_rollout = CoinGameInGraphRollout(
+                    [make_step_policy_fn(f'main_{agent}', self.h_size[agent], self.env, batch_size)
+                     for agent in range(self.n_agents)],
+                    h_sizes=self.h_size[:self.n_agents], batch_size=batch_size, trace_length=trace_length,
+                    grid_size=grid_size, asymmetric=self.asymmetry)
+            else:
+                self.in_graph_rollout = None
 
             self.init = tf.global_variables_initializer()
 
@@ -366,26 +384,15 @@ class LOLAPGCG(tune.Trainable):
             # self.episodes_run_counter[agent] += 1
             lstm_state.append(np.zeros((self.batch_size, self.h_size[agent] * 2)))
 
-        while j < self.max_epLength:
+        if self.in_graph_rollout is not None:
+            j, lstm_state, last_info = self._collect_batch_in_graph(trainBatch0, trainBatch1, rAll, aAll)
+
+        # Otherwise, step the environment from python
+        while self.in_graph_rollout is None and j < self.max_epLength:
             lstm_state_old = lstm_state
             j += 1
-            a_all = []
-            lstm_state = []
-            for agent_role, agent in enumerate(these_agents):
-                # Batch of observations => batch of actions
-                a, lstm_s = self.sess.run(
-                    [
-                        self.mainPN_step[agent].predict,
-                        self.mainPN_step[agent].lstm_state_output
-                    ],
-                    feed_dict={
-                        self.mainPN_step[agent].state_input: s,
-                        self.mainPN_step[agent].lstm_state: lstm_state_old[agent],
-                        self.mainPN_step[agent].is_training: True,
-                    }
-                )
-                lstm_state.append(lstm_s)
-                a_all.append(a)
+            # Batch of observations => batch of actions
+            a_all, lstm_state = self._compute_actions_and_lstm_states(s, lstm_state_old, these_agents)
 
             if self.use_DQN_exploiter:
                 expl_actions, _, _ = self.exploiter.compute_actions(obs_batch=s)
@@ -517,20 +524,7 @@ class LOLAPGCG(tune.Trainable):
             # for agent_role, agent in enumerate(these_agents):
             #     self.episodes_reward[agent] += r[agent_role]
 
-            for index in range(self.batch_size):
-                r_pb = [r[0][index], r[1][index]]
-
-                rAll[0] += r_pb[0]
-                rAll[1] += r_pb[1]
-                # Total reward for both agents over the episode
-                rAll[6] += r_pb[0] + r_pb[1]
-                # Count n steps in env (episode length)
-                rAll[7] += 1
-
-                for agent_n in range(a_all.shape[1]):
-                    aAll[int(a_all[index, agent_n] + 4*agent_n)] += 1
-                # aAll[a_all[index, 0]] += 1
-                # aAll[a_all[index, 1] + 4] += 1
+            self._accumulate_step_stats(rAll, aAll, r, a_all)
 
             s_old = s
             s = s1
@@ -964,6 +958,74 @@ class LOLAPGCG(tune.Trainable):
 
         return to_report
 
+    def _compute_actions_and_lstm_states(self, s, lstm_state_old, these_agents):
+        """
+        Compute the batch of actions and the next LSTM states of all the agents with one sess.run
+        """
+        fetches = []
+        feed_dict = {}
+        for agent in these_agents:
+            fetches.append([
+                self.mainPN_step[agent].predict,
+                self.mainPN_step[agent].lstm_state_output
+            ])
+            feed_dict.update({
+                self.mainPN_step[agent].state_input: s,
+                self.mainPN_step[agent].lstm_state: lstm_state_old[agent],
+                self.mainPN_step[agent].is_training: True,
+            })
+        results = self.sess.run(fetches, feed_dict=feed_dict)
+        a_all = [a for a, _ in results]
+        lstm_state = [lstm_s for _, lstm_s in results]
+        return a_all, lstm_state
+
+    def _collect_batch_in_graph(self, trainBatch0, trainBatch1, rAll, aAll):
+        """
+        Fill the train batches with one batch of episodes played inside the graph
+
+        :return: the number of steps played, the last LSTM states and the info of the episodes
+        """
+        results = self.in_graph_rollout.rollout(self.sess, self.env)
+        states = list(results["states"])
+        next_states = states[1:] + [results["last_state"]]
+        for t in range(self.trace_length):
+            a_all = [results["actions"][0][t], results["actions"][1][t]]
+            r = [results["rewards"][0][t], results["rewards"][1][t]]
+            trainBatch0[0].append(states[t])
+            trainBatch1[0].append(states[t])
+            trainBatch0[1].append(a_all[0])
+            trainBatch1[1].append(a_all[1])
+            trainBatch0[2].append(r[0])
+            trainBatch1[2].append(r[1])
+            trainBatch0[3].append(next_states[t])
+            trainBatch1[3].append(next_states[t])
+            self.total_steps += 1
+            self._accumulate_step_stats(rAll, aAll, r, np.transpose(np.vstack(a_all)))
+
+        last_info = {}
+        for player_id, player_info in results["info"].items():
+            last_info.update({f"{player_id}_{k}": v for k, v in player_info.items()})
+        return self.trace_length, results["last_lstm_states"], last_info
+
+    def _accumulate_step_stats(self, rAll, aAll, r, a_all):
+        """
+        Accumulate in place the rewards and actions of one step of the whole batch
+
+        :param a_all: actions with the shape [batch_size, n_agents]
+        """
+        reward_sum_0, reward_sum_1 = np.sum(r[0]), np.sum(r[1])
+        rAll[0] += reward_sum_0
+        rAll[1] += reward_sum_1
+        # Total reward for both agents over the episode
+        rAll[6] += reward_sum_0 + reward_sum_1
+        # Count n steps in env (episode length)
+        rAll[7] += self.batch_size
+
+        n_actions = self.env.NUM_ACTIONS
+        for agent_n in range(a_all.shape[1]):
+            aAll[agent_n * n_actions:(agent_n + 1) * n_actions] += np.bincount(
+                a_all[:, agent_n].astype(np.int64), minlength=n_actions)
+
     def compute_centered_discounted_r(self, rewards, discount):
         sample_return = np.reshape(
             get_monte_carlo(rewards, self.y, self.trace_length, self.batch_size),
@@ -104,7 +104,7 @@ class LOLAPGMatrice(tune.Trainable):
 
             self.buffers = []
             for i in range(self.total_n_agents):
-                self.buffers.append(ExperienceBuffer(batch_size))
+                self.buffers.append(ArrayExperienceBuffer(batch_size))
 
             # create lists to contain total rewards and steps per episode
             self.jList = []
@@ -3,6 +3,7 @@ Various utility functions.
 """
 import numpy as np
 import tensorflow as tf
+from numba import jit
 
 
 def batch_to_seq(h, nbatch, nsteps, flat=False):
@@ -149,16 +150,24 @@ class GetFlatWtSess(object):
 
 
 def get_monte_carlo(reward, y, trace_length, batch_size):
-    reward = np.reshape(reward, ((batch_size, trace_length)))
-    reward_buffer = np.zeros(((batch_size, trace_length+1)))
-    reward_buffer[:, :trace_length] = reward
-    discounted_reward = np.zeros(((batch_size, trace_length)))
+    reward = np.reshape(np.asarray(reward, dtype=np.float64), ((batch_size, trace_length)))
+    discounted_reward = discounted_cumsum(reward, y)
+    return np.reshape(discounted_reward,(batch_size *trace_length))
 
-    for t in range(trace_length-1, -1, -1):
-        reward_buffer[:,t+1:] *= y
-        discounted_reward[:,t] = np.sum(reward_buffer[:,t:],1)
 
-    return np.reshape(discounted_reward,(batch_size *trace_length))
+@jit(nopython=True)
+def discounted_cumsum(reward, y):
+    """
+    Discounted returns of rewards with the shape [batch_size, trace_length], computed with one reverse scan over time
+    """
+    batch_size, trace_length = reward.shape
+    discounted_reward = np.zeros((batch_size, trace_length))
+    for i in range(batch_size):
+        running_return = 0.0
+        for t in range(trace_length - 1, -1, -1):
+            running_return = reward[i, t] + y * running_return
+            discounted_reward[i, t] = running_return
+    return discounted_reward
 
 
 def make_cube(trace_length):
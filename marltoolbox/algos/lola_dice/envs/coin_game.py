@@ -9,11 +9,17 @@ from gym.spaces import Discrete, Tuple
 from gym.utils import seeding
 from collections import deque
 
+from marltoolbox.envs.vectorized_coin_game import move_players, generate_coin
+
 
 class CoinGameVec(gym.Env):
     """
     Vectorized Coin Game environment.
     Note: slightly deviates from the Gym API.
+
+    The whole batch is stepped with numpy operations and the numba kernels of
+    marltoolbox.envs.vectorized_coin_game (the coins are placed uniformly
+    among the free cells, without rejection sampling).
     """
     NUM_AGENTS = 2
     NUM_ACTIONS = 4
@@ -23,6 +29,10 @@ class CoinGameVec(gym.Env):
         np.array([1,  0]),
         np.array([-1, 0]),
     ]
+    # Rewards of the red player when it picks its own coin and when the blue
+    # player picks its coin
+    RED_PICK_OWN_REWARD = 1
+    RED_COIN_PICKED_BY_BLUE_REWARD = -2
 
     def __init__(self, max_steps, batch_size, grid_size=3):
         self.max_steps = max_steps
@@ -67,12 +77,14 @@ class CoinGameVec(gym.Env):
             self.grid_size, size=(self.batch_size, 2))
         self.blue_pos = self.np_random.randint(
             self.grid_size, size=(self.batch_size, 2))
-        self.coin_pos = np.zeros((self.batch_size, 2), dtype=np.int8)
-        for i in range(self.batch_size):
-            # Make sure coins don't overlap
-            while self._same_pos(self.red_pos[i], self.blue_pos[i]):
-                self.blue_pos[i] = self.np_random.randint(self.grid_size, size=2)
-            self._generate_coin(i)
+        # Make sure the players don't overlap
+        overlap = self._same_pos(self.red_pos, self.blue_pos)
+        while overlap.any():
+            self.blue_pos[overlap] = self.np_random.randint(
+                self.grid_size, size=(overlap.sum(), 2))
+            overlap = self._same_pos(self.red_pos, self.blue_pos)
+        self.coin_pos = np.zeros((self.batch_size, 2), dtype=np.int64)
+        self._generate_coin(np.ones(self.batch_size, dtype=np.bool_))
         state = self._generate_state()
         # state = np.reshape(state, (self.batch_size, -1))
         observations = [state, state]
@@ -80,83 +92,58 @@ class CoinGameVec(gym.Env):
         info = {"available_actions": info}
         return observations, info
 
-    def _generate_coin(self, i):
-        self.red_coin[i] = 1 - self.red_coin[i]
-        # Make sure coin has a different position than the agent
-        success = 0
-        while success < 2:
-            success = 0
-            self.coin_pos[i] = self.np_random.randint(self.grid_size, size=(2))
-            success = 1 - self._same_pos(self.red_pos[i],
-                                          self.coin_pos[i])
-            success += 1 - self._same_pos(self.blue_pos[i],
-                                          self.coin_pos[i])
+    def _generate_coin(self, generate):
+        """Flips the color of the coins in the sub-environments selected by
+        the boolean mask generate and places them on free cells."""
+        coin_rand = self.np_random.random_sample(self.batch_size)
+        generate_coin(self.batch_size, generate, self.red_coin, self.red_pos,
+                      self.blue_pos, self.coin_pos, self.grid_size, coin_rand)
 
     def _same_pos(self, x, y):
-        return (x == y).all()
+        return (x == y).all(axis=-1)
 
     def _generate_state(self):
         state = np.zeros([self.batch_size] + self.ob_space_shape)
-        for i in range(self.batch_size):
-            state[i, 0, self.red_pos[i][0], self.red_pos[i][1]] = 1
-            state[i, 1, self.blue_pos[i][0], self.blue_pos[i][1]] = 1
-            if self.red_coin[i]:
-                state[i, 2, self.coin_pos[i][0], self.coin_pos[i][1]] = 1
-            else:
-                state[i, 3, self.coin_pos[i][0], self.coin_pos[i][1]] = 1
+        batch_idx = np.arange(self.batch_size)
+        state[batch_idx, 0, self.red_pos[:, 0], self.red_pos[:, 1]] = 1
+        state[batch_idx, 1, self.blue_pos[:, 0], self.blue_pos[:, 1]] = 1
+        # Channel 2 for a red coin and 3 for a blue coin
+        state[batch_idx, 3 - self.red_coin,
+              self.coin_pos[:, 0], self.coin_pos[:, 1]] = 1
         return state
 
-
     def _compute_rewards(self):
-        reward_red = np.zeros(self.batch_size)
-        reward_blue = np.zeros(self.batch_size)
-        generate_count = 0
-        coop_blue = 0
-        coop_red = 0
-        defect_red = 0
-        defect_blue = 0
-        for i in range(self.batch_size):
-            generate = False
-            if self.red_coin[i]:
-                if self._same_pos(self.red_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += 1
-                    coop_red += 1
-                if self._same_pos(self.blue_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += -2
-                    reward_blue[i] += 1
-                    defect_blue += 1
-            else:
-                if self._same_pos(self.red_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += 1
-                    reward_blue[i] += -2
-                    defect_red += 1
-                if self._same_pos(self.blue_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_blue[i] += 1
-                    coop_blue += 1
-            if generate:
-                self._generate_coin(i)
-                generate_count += 1
-        return (reward_red, reward_blue, generate_count, coop_blue, coop_red,
-                defect_red, defect_blue)
+        is_red_coin = self.red_coin == 1
+        red_pick = self._same_pos(self.red_pos, self.coin_pos)
+        blue_pick = self._same_pos(self.blue_pos, self.coin_pos)
+        red_pick_own = red_pick & is_red_coin
+        red_pick_other = red_pick & ~is_red_coin
+        blue_pick_own = blue_pick & ~is_red_coin
+        blue_pick_other = blue_pick & is_red_coin
+
+        reward_red = (self.RED_PICK_OWN_REWARD * red_pick_own
+                      + 1. * red_pick_other
+                      + self.RED_COIN_PICKED_BY_BLUE_REWARD * blue_pick_other)
+        reward_blue = 1. * blue_pick - 2. * red_pick_other
+
+        generate = red_pick | blue_pick
+        self._generate_coin(generate)
+        return (reward_red, reward_blue, int(generate.sum()),
+                int(blue_pick_own.sum()), int(red_pick_own.sum()),
+                int(red_pick_other.sum()), int(blue_pick_other.sum()))
 
     def step(self, actions):
         ac0, ac1 = actions
 
         self.step_count += 1
 
-        for j in range(self.batch_size):
-            a0, a1 = ac0[j], ac1[j]
-            assert a0 in {0, 1, 2, 3} and a1 in {0, 1, 2, 3}
+        actions = np.stack([np.reshape(ac0, -1), np.reshape(ac1, -1)], axis=1)
+        assert np.all((actions >= 0) & (actions < self.NUM_ACTIONS))
 
-            # Move players
-            self.red_pos[j] = \
-                (self.red_pos[j] + self.MOVES[a0]) % self.grid_size
-            self.blue_pos[j] = \
-                (self.blue_pos[j] + self.MOVES[a1]) % self.grid_size
+        # Move players
+        self.red_pos, self.blue_pos = move_players(
+            self.batch_size, actions, self.red_pos, self.blue_pos,
+            self.grid_size)
 
         # Compute rewards
         (reward_red, reward_blue, generate_count, coop_blue, coop_red,
@@ -212,39 +199,5 @@ class CoinGameVec(gym.Env):
 
 
 class AsymCoinGameVec(CoinGameVec):
-
-    def _compute_rewards(self):
-        reward_red = np.zeros(self.batch_size)
-        reward_blue = np.zeros(self.batch_size)
-        generate_count = 0
-        coop_blue = 0
-        coop_red = 0
-        defect_red = 0
-        defect_blue = 0
-        for i in range(self.batch_size):
-            generate = False
-            if self.red_coin[i]:
-                if self._same_pos(self.red_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += 2
-                    coop_red += 1
-                if self._same_pos(self.blue_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += -1
-                    reward_blue[i] += 1
-                    defect_blue += 1
-            else:
-                if self._same_pos(self.red_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_red[i] += 1
-                    reward_blue[i] += -2
-                    defect_red += 1
-                if self._same_pos(self.blue_pos[i], self.coin_pos[i]):
-                    generate = True
-                    reward_blue[i] += 1
-                    coop_blue += 1
-            if generate:
-                self._generate_coin(i)
-                generate_count += 1
-        return (reward_red, reward_blue, generate_count, coop_blue, coop_red,
-                defect_red, defect_blue)
\ No newline at end of file
+    RED_PICK_OWN_REWARD = 2
+    RED_COIN_PICKED_BY_BLUE_REWARD = -1
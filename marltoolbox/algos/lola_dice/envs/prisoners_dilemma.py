@@ -51,14 +51,13 @@ class IteratedPrisonersDilemma(gym.Env):
 
         self.step_count += 1
 
-        rewards = []
+        ac0, ac1 = np.reshape(ac0, -1), np.reshape(ac1, -1)
+        batch_idx = np.arange(self.batch_size)
+        rewards = [self.payout_mat[ac1, ac0], self.payout_mat[ac0, ac1]]
         state0 = np.zeros((self.batch_size, self.NUM_STATES))
         state1 = np.zeros((self.batch_size, self.NUM_STATES))
-        for i, (a0, a1) in enumerate(zip(ac0, ac1)):
-            rewards.append([self.payout_mat[a1][a0], self.payout_mat[a0][a1]])
-            state0[i, a0 * 2 + a1] = 1
-            state1[i, a1 * 2 + a0] = 1
-        rewards = list(map(np.asarray, zip(*rewards)))
+        state0[batch_idx, ac0 * 2 + ac1] = 1
+        state1[batch_idx, ac1 * 2 + ac0] = 1
         observations = [state0, state1]
 
         done = (self.step_count == self.max_steps)
@@ -24,6 +24,7 @@ class Policy(object):
             self._parents = prev.parents + (prev, )
         self._params = []
         self._opponents = None
+        self._assign_ops = {}
 
     def build(self, scope, reuse=None):
         raise NotImplementedError
@@ -48,6 +49,19 @@ class Policy(object):
     def root(self):
         return self._root
 
+    def get_assign_ops(self, policy):
+        """Returns ops that copy the parameters of the given policy into the
+        parameters of this policy.
+
+        The ops are built at the first call and then reused, such that calling
+        this repeatedly (e.g., at each rollout) does not grow the graph.
+        """
+        if policy not in self._assign_ops:
+            self._assign_ops[policy] = [
+                tf.assign(p_self, p)
+                for p, p_self in zip(policy.parameters, self.parameters)]
+        return self._assign_ops[policy]
+
     def get_feed_list(self, trace):
         obs, acs, rets, values, infos = trace
         aa = np.asarray([info['available_actions'] for info in infos])
@@ -61,19 +75,8 @@ class Policy(object):
         return feed_list
 
     def act(self, ob, info, sess, parent_feed_list=[]):
-        aa = info['available_actions']
-        feed_list = [(self.obs_ph, [ob]), (self.avail_acs_ph, [aa])] + \
-                    parent_feed_list
-        # print("feed_list",feed_list[0][1][0].shape)
-        # print("feed_list",feed_list[1][1][0].shape)
-        #
-        # obs_ph = sess.run(self.obs_ph, feed_dict=dict(feed_list))
-        # print("obs_ph",obs_ph)
-        #
-        # log_pi = sess.run(self.log_pi, feed_dict=dict(feed_list))
-        # print("log_pi",log_pi)
-        ac = sess.run(self.action, feed_dict=dict(feed_list))
-        return ac
+        return act_all([self], [ob], [info], sess,
+                       parent_feed_list=parent_feed_list)[0]
 
     def predict(self, ob, sess, parent_feed_list=[]):
         feed_list = [(self.obs_ph, [ob])] + parent_feed_list
@@ -85,6 +88,27 @@ class Policy(object):
         return self._params
 
 
+def act_all(policies, obs, infos, sess, parent_feed_list=[]):
+    """Samples the actions of several policies with a single `sess.run`.
+
+    Args:
+        policies (list): A list of Policy objects (with distinct placeholders).
+        obs (list): The batch of observations of each policy.
+        infos (list): The info dict (with the available actions) of each
+            policy.
+        sess (tf.Session): A tf.Session instance that will be used for running.
+        parent_feed_list (list): Feed list of the parent placeholders of the
+            policies.
+
+    Returns:
+        actions: A list with the actions of each policy for the whole batch.
+    """
+    feed_list = sum([
+        [(pi.obs_ph, [ob]), (pi.avail_acs_ph, [info['available_actions']])]
+        for pi, ob, info in zip(policies, obs, infos)], []) + parent_feed_list
+    return sess.run([pi.action for pi in policies], feed_dict=dict(feed_list))
+
+
 class SimplePolicy(Policy):
     """A single layer network that maps states to action probabilities."""
 
@@ -215,7 +239,7 @@ class RecurrentPolicy(Policy):
     """A recurrent network with one or multiple hidden layers."""
 
     def __init__(self, ob_space_shape, num_actions, hidden_sizes=[16], prev=None, batch_size=64):
-        super(MLPPolicy, self).__init__(ob_space_shape, num_actions, prev=prev)
+        super(RecurrentPolicy, self).__init__(ob_space_shape, num_actions, prev=prev)
         self.hidden_sizes = hidden_sizes
         self.batch_size = batch_size
 
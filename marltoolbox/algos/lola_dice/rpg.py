@@ -9,6 +9,7 @@ from ray import tune
 from . import utils as U
 from .envs import IPD, IMP
 from .meta import make_with_custom_variables
+from .policy import act_all
 
 
 def stop_forward(x):
@@ -232,11 +233,11 @@ def rollout(env, policies, rollout_policies, sess, *, gamma, parent_traces=[], u
         for parents, traces in zip(parent_policies, parent_traces)
         for pi, trace in zip(parents, traces)], [])
 
-    # Cache parameters and push them into rollout policies.
-    assign_ops = [
-        tf.assign(pr, p)
-        for pi, pi_roll in zip(policies, rollout_policies)
-        for p, pr in zip(pi.parameters, pi_roll.parameters)]
+    # Cache parameters and push them into rollout policies (the assign ops are
+    # built once per pair of policies, such that the graph does not grow).
+    assign_ops = sum([
+        pi_roll.get_assign_ops(pi)
+        for pi, pi_roll in zip(policies, rollout_policies)], [])
     sess.run(assign_ops, feed_dict=dict(parent_feed_list))
 
     # Roll out
@@ -255,10 +256,7 @@ def rollout(env, policies, rollout_policies, sess, *, gamma, parent_traces=[], u
         obs.append(ob)
         infos.append(info)
 
-        ac = [
-            pi.act(o, i, sess)
-            for pi, o, i in zip(rollout_policies, ob, info)
-        ]
+        ac = act_all(rollout_policies, ob, info, sess)
 
         ob, rew, done, all_info = env.step(ac)
         acs.append(ac)
@@ -271,10 +269,19 @@ def rollout(env, policies, rollout_policies, sess, *, gamma, parent_traces=[], u
         to_log.append(all_info)
 
 
+    trace = build_trace(obs, acs, rets, rews, infos, ob, rollout_policies, sess,
+                        gamma=gamma)
+    return trace, to_log
+
+
+def build_trace(obs, acs, rets, rews, infos, last_ob, rollout_policies, sess,
+                *, gamma):
+    """Computes the value estimates and assembles the per-agent trace from the
+    per-timestep lists collected during a rollout."""
     # Adjust rets and compute value estimates
     last_vpreds =  [
         pi.predict(o, sess) * 0
-        for pi, o in zip(rollout_policies, ob)]
+        for pi, o in zip(rollout_policies, last_ob)]
     # for k, last_vpred in enumerate(last_vpreds):
     #     rets[-1][k] += gamma_t * last_vpred
     values = compute_values(rews, last_vpreds, gamma=gamma)
@@ -285,8 +292,111 @@ def rollout(env, policies, rollout_policies, sess, *, gamma, parent_traces=[], u
     values = list(map(np.asarray, zip(*values)))
     infos = list(map(np.asarray, zip(*infos)))
     trace = list(zip(obs, acs, rets, values, infos))
+    return trace
 
-    return trace, to_log
+
+def batched_rollouts(envs, policies_list, rollout_policies_list, sess, *,
+                     gamma, parent_traces_list):
+    """Rolls out several independent batches of episodes at the same time.
+
+    Same as calling `rollout` once per element of the given lists, but the
+    actions of all the rollout policies are computed with one `sess.run` per
+    timestep (and the parameters are copied with one `sess.run`). Each rollout
+    needs its own environment and its own set of rollout policies.
+
+    Args:
+        envs (list): One environment per rollout.
+        policies_list (list): One list of policies per rollout.
+        rollout_policies_list (list): One list of rollout policies per rollout
+            (the lists must not share any policy).
+        sess (tf.Session): A tf.Session instance that will be used for running.
+        gamma (float): The discount factor that will be fed into the graph.
+        parent_traces_list (list): The parent traces of each rollout.
+
+    Returns:
+        traces: A list with the trace of each rollout.
+        to_log: A list with the logs of each rollout.
+    """
+    n_rollouts = len(envs)
+    assert len(policies_list) == len(rollout_policies_list) == n_rollouts
+    assert len(parent_traces_list) == n_rollouts
+
+    # Cache parameters and push them into all the rollout policies.
+    feed_dict = build_batched_parent_feed_dict(
+        policies_list, parent_traces_list, gamma=gamma)
+    assign_ops = []
+    for policies, rollout_policies in zip(
+            policies_list, rollout_policies_list):
+        assign_ops += sum([
+            pi_roll.get_assign_ops(pi)
+            for pi, pi_roll in zip(policies, rollout_policies)], [])
+    sess.run(assign_ops, feed_dict=feed_dict)
+
+    # Roll out
+    collected = [
+        {"obs": [], "acs": [], "rets": [], "rews": [], "infos": [],
+         "to_log": []}
+        for _ in range(n_rollouts)]
+    obs, infos = [], []
+    for env in envs:
+        ob, all_info = env.reset()
+        obs.append(ob)
+        infos.append(all_info.pop("available_actions"))
+    done = False
+    gamma_t = 1.
+
+    while not done:
+        all_actions = act_all(
+            sum(rollout_policies_list, []), sum(obs, []), sum(infos, []), sess)
+        actions, start = [], 0
+        for rollout_policies in rollout_policies_list:
+            actions.append(all_actions[start:start + len(rollout_policies)])
+            start += len(rollout_policies)
+
+        dones = []
+        for j, (env, ac) in enumerate(zip(envs, actions)):
+            collected[j]["obs"].append(obs[j])
+            collected[j]["infos"].append(infos[j])
+            ob, rew, env_done, all_info = env.step(ac)
+            collected[j]["acs"].append(ac)
+            collected[j]["rews"].append(rew)
+            collected[j]["rets"].append([r * gamma_t for r in rew])
+            obs[j] = ob
+            infos[j] = all_info.pop("available_actions")
+            collected[j]["to_log"].append(all_info)
+            dones.append(env_done)
+        # The environments have the same episode length
+        assert all(env_done == dones[0] for env_done in dones)
+        done = dones[0]
+        gamma_t *= gamma
+
+    traces = [
+        build_trace(c["obs"], c["acs"], c["rets"], c["rews"], c["infos"],
+                    ob, rollout_policies, sess, gamma=gamma)
+        for c, ob, rollout_policies in zip(
+            collected, obs, rollout_policies_list)]
+    return traces, [c["to_log"] for c in collected]
+
+
+def build_batched_parent_feed_dict(policies_list, parent_traces_list, *,
+                                   gamma):
+    """Merges the parent feed lists of several rollouts into one `feed_dict`.
+
+    The rollouts must not share any parent placeholder, otherwise the parent
+    traces of one rollout would silently overwrite those of another.
+    """
+    feed_dict = {}
+    for policies, parent_traces in zip(policies_list, parent_traces_list):
+        parent_policies = zip(*[pi.parents for pi in policies])
+        parent_feed_list = sum([
+            pi.get_feed_list(trace) + [(pi.gamma_ph, [[gamma]])]
+            for parents, traces in zip(parent_policies, parent_traces)
+            for pi, trace in zip(parents, traces)], [])
+        assert feed_dict.keys().isdisjoint(
+            ph for ph, _ in parent_feed_list), \
+            "The rollouts share parent placeholders."
+        feed_dict.update(dict(parent_feed_list))
+    return feed_dict
 
 
 def gen_trace_batches(trace, *, batch_size):
@@ -304,6 +414,14 @@ def gen_trace_batches(trace, *, batch_size):
         yield trace_batch
 
 
+def build_rollout_policies(env, make_policy, scope, *, n_agents=2):
+    """Builds one rollout policy per agent (plain variables, used to run the
+    copied parameters of other policies in the environment)."""
+    return [
+        build_policy(env, make_policy, "%s/pi_%d" % (scope, k))
+        for k in range(n_agents)]
+
+
 def build_graph(env, make_policy, make_optimizer, *,
                 lr_inner=1.,          # lr for the inner loop steps
                 lr_outer=1.,          # lr for the outer loop steps
@@ -343,10 +461,8 @@ def build_graph(env, make_policy, make_optimizer, *,
 
     # Rollout policies (used to speed up rollouts).
     print("Building rollout policies...", end=""); sys.stdout.flush()
-    rollout_policies = []
-    for k in range(n_agents):
-        pi = build_policy(env, make_policy, "rollout/pi_%d" % k)
-        rollout_policies.append(pi)
+    rollout_policies = build_rollout_policies(
+        env, make_policy, "rollout", n_agents=n_agents)
     print("Done.")
 
     # Build asymmetric inner loops recursively.
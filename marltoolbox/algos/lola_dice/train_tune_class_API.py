@@ -3,13 +3,15 @@
 ##########
 
 import os
+import copy
 import json
 import functools
 from ray import tune
 
 import tensorflow as tf
 import numpy as np
-from marltoolbox.algos.lola_dice.rpg import build_graph, get_update, rollout, gen_trace_batches
+from marltoolbox.algos.lola_dice.rpg import build_graph, build_rollout_policies, get_update, rollout, \
+    batched_rollouts, gen_trace_batches
 from marltoolbox.algos.lola_dice.policy import SimplePolicy, MLPPolicy, ConvPolicy
 import marltoolbox.algos.lola_dice.envs as lola_dice_envs
 import marltoolbox.algos.lola_dice.utils as utils
@@ -57,6 +59,7 @@ class LOLADICE(tune.Trainable):
           use_dice,
           use_opp_modeling,
           seed,
+          batch_rollouts=False,
            **kwargs):
 
         print("args not used:",kwargs)
@@ -92,8 +95,17 @@ class LOLADICE(tune.Trainable):
         self.use_baseline = use_baseline
         self.use_dice = use_dice
         self.use_opp_modeling = use_opp_modeling
+        self.batch_rollouts = batch_rollouts
         self.timestep = 0
 
+        if self.batch_rollouts:
+            # One environment per agent, to roll out the lookahead steps of all the agents at the same time
+            self.batched_envs = [self.env]
+            for k in range(1, self.n_agents):
+                env_copy = copy.deepcopy(self.env)
+                env_copy.seed(int(seed) + k)
+                self.batched_envs.append(env_copy)
+
         if make_policy[0] == "make_simple_policy":
             make_policy = functools.partial(make_simple_policy, **make_policy[1])
         elif make_policy[0] == "make_conv_policy":
@@ -122,6 +134,12 @@ class LOLADICE(tune.Trainable):
                 use_baseline=use_baseline, use_dice=use_dice,
                 use_opp_modeling=self.use_opp_modeling, inner_asymm=inner_asymm)
 
+            if self.batch_rollouts:
+                # One set of rollout policies per agent (the rollouts of the different agents run at the same time)
+                self.batched_rollout_policies = [self.rollout_policies] + [
+                    build_rollout_policies(self.env, make_policy, "rollout_%d" % k, n_agents=self.n_agents)
+                    for k in range(1, self.n_agents)]
+
             # Train.
             self.acs_all = []
             self.rets_all = []
@@ -230,35 +248,46 @@ class LOLADICE(tune.Trainable):
         # Inner loop rollouts (lookahead steps).
         inner_all_to_log = []
         with utils.elapsed_timer() as inner_timer:
-            inner_traces = []
-            for k in range(self.n_agents):
-                parent_traces = []
-                to_log = []
-                for m in range(self.n_inner_steps):
-                    policies_k = [self.policies[k].parents[m]] + [
-                        opp.parents[m] for opp in self.policies[k].opponents]
-                    traces, sub_to_log = rollout(
-                        self.env, policies_k, self.rollout_policies, self.sess,
-                        gamma=self.gamma, parent_traces=parent_traces)
-                    parent_traces.append(traces)
-                    to_log.append(sub_to_log)
-                inner_traces.append(parent_traces)
-                inner_all_to_log.append(to_log)
+            if self.batch_rollouts:
+                inner_traces, inner_all_to_log = self._batched_inner_rollouts()
+            else:
+                inner_traces = []
+                for k in range(self.n_agents):
+                    parent_traces = []
+                    to_log = []
+                    for m in range(self.n_inner_steps):
+                        policies_k = [self.policies[k].parents[m]] + [
+                            opp.parents[m] for opp in self.policies[k].opponents]
+                        traces, sub_to_log = rollout(
+                            self.env, policies_k, self.rollout_policies, self.sess,
+                            gamma=self.gamma, parent_traces=parent_traces)
+                        parent_traces.append(traces)
+                        to_log.append(sub_to_log)
+                    inner_traces.append(parent_traces)
+                    inner_all_to_log.append(to_log)
         times.append(inner_timer())
 
         print("start Outer loops")
         # Outer loop rollouts (each agent plays against updated opponents).
         outer_all_to_log = []
         with utils.elapsed_timer() as outer_timer:
-            outer_traces = []
-            for k in range(self.n_agents):
-                parent_traces = inner_traces[k]
-                policies_k = [self.policies[k]] + self.policies[k].opponents
-                traces, to_log = rollout(
-                    self.env, policies_k, self.rollout_policies, self.sess,
-                    gamma=self.gamma, parent_traces=parent_traces)
-                outer_traces.append(traces)
-                outer_all_to_log.append([to_log])
+            if self.batch_rollouts:
+                outer_traces, outer_to_log = batched_rollouts(
+                    self.batched_envs,
+                    [[self.policies[k]] + self.policies[k].opponents for k in range(self.n_agents)],
+                    self.batched_rollout_policies, self.sess,
+                    gamma=self.gamma, parent_traces_list=inner_traces)
+                outer_all_to_log = [[to_log] for to_log in outer_to_log]
+            else:
+                outer_traces = []
+                for k in range(self.n_agents):
+                    parent_traces = inner_traces[k]
+                    policies_k = [self.policies[k]] + self.policies[k].opponents
+                    traces, to_log = rollout(
+                        self.env, policies_k, self.rollout_policies, self.sess,
+                        gamma=self.gamma, parent_traces=parent_traces)
+                    outer_traces.append(traces)
+                    outer_all_to_log.append([to_log])
         times.append(outer_timer())
 
         # Updates.
@@ -275,6 +304,12 @@ class LOLADICE(tune.Trainable):
             update_time += pol_upd_timer()
 
         to_report = {"episodes_total": self.timestep}
+        # Duration of each phase of this step (in seconds)
+        phases = (["opp_modeling"] if self.use_opp_modeling else []) + \
+                 ["value_fit", "inner_rollouts", "outer_rollouts"]
+        for phase, phase_time in zip(phases, times):
+            to_report[f"time_{phase}"] = phase_time
+        to_report["time_policy_updates"] = update_time
         for ag_idx in range(self.n_agents):
             print("== For ag_idx", ag_idx, "==")
             # Logging.
@@ -334,6 +369,25 @@ class LOLADICE(tune.Trainable):
 
         return to_report
 
+    def _batched_inner_rollouts(self):
+        """
+        Same as the sequential inner loop rollouts, but the rollouts of the lookahead step m of all the agents are
+        independent and are run at the same time (one sess.run per timestep for all the agents).
+        """
+        inner_traces = [[] for _ in range(self.n_agents)]
+        inner_all_to_log = [[] for _ in range(self.n_agents)]
+        for m in range(self.n_inner_steps):
+            policies_list = [
+                [self.policies[k].parents[m]] + [opp.parents[m] for opp in self.policies[k].opponents]
+                for k in range(self.n_agents)]
+            traces, to_log = batched_rollouts(
+                self.batched_envs, policies_list, self.batched_rollout_policies, self.sess,
+                gamma=self.gamma, parent_traces_list=[list(parent_traces) for parent_traces in inner_traces])
+            for k in range(self.n_agents):
+                inner_traces[k].append(traces[k])
+                inner_all_to_log[k].append(to_log[k])
+        return inner_traces, inner_all_to_log
+
     def save_checkpoint(self, checkpoint_dir):
         path = os.path.join(checkpoint_dir, "checkpoint.json")
         tf_checkpoint_path = os.path.join(checkpoint_dir, "checkpoint")
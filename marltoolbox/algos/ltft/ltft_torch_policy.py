@@ -33,6 +33,13 @@ LTFT_DEFAULT_CONFIG_UPDATE = merge_dicts(
         "length_of_history": 200,
         "n_steps_in_bootstrap_replicates": 20,
         "n_bootstrap_replicates": 50,
+        # Buffer the observations and actions of the opponent and compute their log-likelihoods with one batched
+        # forward pass of the opponent models, every log_likelihood_computation_interval steps (or at the end of
+        # the episode if None), instead of one forward pass per step
+        "batch_log_likelihood_computations": False,
+        "log_likelihood_computation_interval": None,
+        # Seed of the np.random.Generator used to draw the bootstrap replicates (None to use the global numpy RNG)
+        "bootstrap_seed": None,
     }
 )
 
@@ -76,6 +83,10 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
         self.length_of_history = config['length_of_history']
         self.n_steps_in_bootstrap_replicates = config['n_steps_in_bootstrap_replicates']
         self.n_bootstrap_replicates = config['n_bootstrap_replicates']
+        self.batch_log_likelihood_computations = config['batch_log_likelihood_computations']
+        self.log_likelihood_computation_interval = config['log_likelihood_computation_interval']
+        self.bootstrap_rng = (np.random.default_rng(config['bootstrap_seed'])
+                              if config['bootstrap_seed'] is not None else None)
 
         assert len(self.algorithms) == 4, str(len(self.algorithms))
         self.opp_policy_from_supervised_learning = True
@@ -84,6 +95,8 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
         self.last_computed_w = None
 
         self.data_queue = deque(maxlen=self.length_of_history)
+        # Observations and actions of the opponent waiting for the computation of their log-likelihoods
+        self.opp_obs_actions_buffer = []
 
         # Defection
         self.detected_defection = False
@@ -140,11 +153,11 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
 
         for policy_n, algo in enumerate(self.algorithms):
 
-            samples_copy = samples.copy()
-            samples_copy = self._modify_batch_for_policy(policy_n, samples_copy)
+            # The nested policies share the data of the batch (read-only) instead of each using a copy
+            samples_view = self._modify_batch_for_policy(policy_n, samples)
 
-            if len(samples_copy[samples_copy.ACTIONS]) > 0:
-                learner_stats["learner_stats"][f"learner_stats_algo{policy_n}"] = algo.learn_on_batch(samples_copy)
+            if len(samples_view[samples_view.ACTIONS]) > 0:
+                learner_stats["learner_stats"][f"learner_stats_algo{policy_n}"] = algo.learn_on_batch(samples_view)
                 # self.to_log[f'algo{policy_n}_cur_lr'] = algo.cur_lr
             # For debugging purpose log the true lr (to be compared to algo.cur_lr)
             # for j, opt in enumerate(algo._optimizers):
@@ -152,27 +165,27 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
 
         return learner_stats
 
-    def _modify_batch_for_policy(self, policy_n, samples_copy):
+    def _modify_batch_for_policy(self, policy_n, samples):
         if policy_n == self.COOP_POLICY_IDX or policy_n == self.COOP_OPP_POLICY_IDX:
-            samples_copy[samples_copy.REWARDS] = np.array(samples_copy.data[
-                                                              postprocessing.WELFARE_UTILITARIAN])
+            samples_view = hierarchical.read_only_view(samples, overlay={
+                samples.REWARDS: np.asarray(samples.data[postprocessing.WELFARE_UTILITARIAN])})
             if policy_n == self.COOP_POLICY_IDX:
-                samples_copy = self._filter_sample_batch(samples_copy, remove=True, filter_key="punishing")
+                samples_view = self._filter_sample_batch(samples_view, remove=True, filter_key="punishing")
             elif policy_n == self.COOP_OPP_POLICY_IDX:
-                samples_copy = self._filter_sample_batch(samples_copy, remove=True, filter_key="being_punished")
+                samples_view = self._filter_sample_batch(samples_view, remove=True, filter_key="being_punished")
             else:
                 raise ValueError()
         elif policy_n == self.PUNITIVE_POLICY_IDX:
-            samples_copy[samples_copy.REWARDS] = np.array(samples_copy.data[
-                                                              postprocessing.OPPONENT_NEGATIVE_REWARD])
+            samples_view = hierarchical.read_only_view(samples, overlay={
+                samples.REWARDS: np.asarray(samples.data[postprocessing.OPPONENT_NEGATIVE_REWARD])})
         elif policy_n == self.SPL_OPP_POLICY_IDX:
-            samples_copy[samples_copy.ACTIONS] = np.array(samples_copy.data[
-                                                              postprocessing.OPPONENT_ACTIONS])
-            samples_copy = self._filter_sample_batch(samples_copy, remove=True, filter_key="being_punished")
+            samples_view = hierarchical.read_only_view(samples, overlay={
+                samples.ACTIONS: np.asarray(samples.data[postprocessing.OPPONENT_ACTIONS])})
+            samples_view = self._filter_sample_batch(samples_view, remove=True, filter_key="being_punished")
         else:
             raise ValueError()
 
-        return samples_copy
+        return samples_view
 
     def on_episode_step(self, opp_obs, opp_a, being_punished_by_LE):
         self.being_punished_by_LE = being_punished_by_LE
@@ -187,6 +200,9 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
             self.n_cooperation_steps_in_current_epi += 1
 
     def on_episode_end(self):
+        if self.batch_log_likelihood_computations:
+            self._put_buffered_log_likelihoods_in_data_buffer(self.data_queue)
+
         if self.n_steps_since_start >= self.length_of_history + self.WARMUP_LENGTH:
             percentile_value = self._compare_log_likelihood_on_boostrapped_sequences(self.data_queue)
             self._update_defection_metric(epi_defection_metric=-percentile_value)
@@ -227,6 +243,13 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
         return self.add_welfare_fn(self, sample_batch, other_agent_batches, episode)
 
     def _put_log_likelihood_in_data_buffer(self, s, a, data_queue, log=True):
+        if self.batch_log_likelihood_computations:
+            self.opp_obs_actions_buffer.append((s, a))
+            if (self.log_likelihood_computation_interval is not None and
+                    len(self.opp_obs_actions_buffer) >= self.log_likelihood_computation_interval):
+                self._put_buffered_log_likelihoods_in_data_buffer(data_queue, log)
+            return
+
         s = torch.from_numpy(s).unsqueeze(dim=0)
         log_likelihood_opponent_cooperating = compute_log_likelihoods_wt_exploration(
             self.algorithms[self.COOP_OPP_POLICY_IDX], a, s)
@@ -240,27 +263,39 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
         data_queue.append([log_likelihood_opponent_cooperating,
                            log_likelihood_approximated_opponent])
 
-    def _bootstrap_replicats(self, data_queue, last_step_is_mandatory):
-        data_array = np.array(list(data_queue), dtype=np.object)
-        maximum_idx = data_array.shape[0] - 1
-        bstrap_idx = np.random.random_integers(0, high=maximum_idx,
-                                               size=(self.n_bootstrap_replicates,
-                                                     self.n_steps_in_bootstrap_replicates))
-        if last_step_is_mandatory:
-            # TODO only add it if it is not already present
-            bstrap_idx[:, -1] = [maximum_idx for _ in range(self.n_bootstrap_replicates)]
-        bstrap_replts_data = data_array[bstrap_idx]
-        return bstrap_replts_data
+    def _put_buffered_log_likelihoods_in_data_buffer(self, data_queue, log=True):
+        """
+        Compute the log-likelihoods of all the buffered (observation, action) of the opponent with one forward pass
+        per opponent model (with the current weights) and put them in the data buffer, in the order of the steps.
+        """
+        if len(self.opp_obs_actions_buffer) == 0:
+            return
+        s = torch.from_numpy(np.stack([obs for obs, _ in self.opp_obs_actions_buffer]))
+        a = np.array([action for _, action in self.opp_obs_actions_buffer])
+        self.opp_obs_actions_buffer.clear()
+
+        log_likelihoods_opponent_cooperating = compute_log_likelihoods_wt_exploration(
+            self.algorithms[self.COOP_OPP_POLICY_IDX], a, s).tolist()
+        log_likelihoods_approximated_opponent = compute_log_likelihoods_wt_exploration(
+            self.algorithms[self.SPL_OPP_POLICY_IDX], a, s).tolist()
+
+        if log:
+            self.to_log["log_likelihood_opponent_cooperating"] = log_likelihoods_opponent_cooperating[-1]
+            self.to_log["log_likelihood_approximated_opponent"] = log_likelihoods_approximated_opponent[-1]
+        data_queue.extend([log_likelihood_opponent_cooperating, log_likelihood_approximated_opponent]
+                          for log_likelihood_opponent_cooperating, log_likelihood_approximated_opponent
+                          in zip(log_likelihoods_opponent_cooperating, log_likelihoods_approximated_opponent))
+
+    def _bootstrap_replicats_sums(self, data_queue, last_step_is_mandatory):
+        return bootstrap_replicates_sums(data_queue, self.n_bootstrap_replicates,
+                                         self.n_steps_in_bootstrap_replicates, last_step_is_mandatory,
+                                         rng=self.bootstrap_rng)
 
     def _compare_log_likelihood_on_boostrapped_sequences(self, data_queue, log=True,
                                                          last_step_is_mandatory=False):
 
-        bstrap_replts_data = self._bootstrap_replicats(data_queue, last_step_is_mandatory)
-
         # Sum log_likelihood over u steps
-        log_lik_cooperate = bstrap_replts_data[:, :, 0].sum(axis=1)
-
-        log_lik_defect = bstrap_replts_data[:, :, 1].sum(axis=1)
+        log_lik_cooperate, log_lik_defect = self._bootstrap_replicats_sums(data_queue, last_step_is_mandatory)
 
         # Defect if in more than 0.95 of the replicates, the actual policy is more likely than the simulated coop policy
         log_lik_check_coop = log_lik_cooperate - log_lik_defect
@@ -284,6 +319,31 @@ class LTFTTorchPolicy(hierarchical.HierarchicalTorchPolicy):
         self.to_log["defection_metric"] = round(float(self.defection_metric), 4)
 
 
+def bootstrap_replicates_sums(data, n_replicates, n_steps_in_replicates, last_step_is_mandatory=False, rng=None):
+    """
+    Draw bootstrap replicates (sequences of steps sampled with replacement) from data and sum each of them,
+    with one (n_replicates, n_steps_in_replicates) index matrix gathering from float arrays.
+
+    :param data: sequence of steps, each step being a number or a sequence of numbers of the same length
+    :param last_step_is_mandatory: end every replicate with the last step of data
+    :param rng: (optional) np.random.Generator used to draw the indexes, by default the global numpy RNG is used
+    :return: float array [n_values_per_step, n_replicates], the sum of each value of the steps in each replicate
+    """
+    data_array = np.asarray(data, dtype=np.float64).reshape(len(data), -1)
+    maximum_idx = data_array.shape[0] - 1
+    size = (n_replicates, n_steps_in_replicates)
+    if rng is None:
+        bstrap_idx = np.random.randint(0, maximum_idx + 1, size=size)
+    else:
+        bstrap_idx = rng.integers(0, maximum_idx + 1, size=size)
+    if last_step_is_mandatory:
+        # TODO only add it if it is not already present
+        bstrap_idx[:, -1] = maximum_idx
+    # Gathering from each (contiguous) column is much faster than from the 2D array
+    return np.stack([np.take(values, bstrap_idx).sum(axis=1)
+                     for values in np.ascontiguousarray(data_array.T)])
+
+
 # Modified from torch_policy_template
 def compute_log_likelihoods_wt_exploration(
         policy,
@@ -1,5 +1,7 @@
 import copy
+from collections import OrderedDict
 
+import numpy as np
 import random
 from ray.rllib.env import BaseEnv
 from ray.rllib.evaluation import MultiAgentEpisode
@@ -30,6 +32,10 @@ DEFAULT_CONFIG_UPDATE = merge_dicts(
         "use_algo_in_order": False,
 
         "switch_of_algo_every_n_epi": 1,
+        # Memory budget of the cache of the weights loaded from the checkpoints (0 to disable the cache).
+        # Each checkpoint is read from disk only once, then switching to it only calls set_weights
+        # (the optimizer state is only loaded the first time).
+        "weights_cache_max_bytes": 1024 ** 3,
     }
 )
 
@@ -69,9 +75,10 @@ class PopulationOfIdenticalAlgo(hierarchical.HierarchicalTorchPolicy):
         assert not self.use_random_algo or not self.use_algo_in_order
         assert isinstance(self.switch_of_algo_every_n_epi, int)
 
+        self.weights_cache = WeightsLRUCache(config["weights_cache_max_bytes"])
+        self.active_checkpoint_idx = -1
         self.set_algo_to_use()
 
-
     def set_algo_to_use(self):
         """
         Called by a callback at the start of every episode.
@@ -106,11 +113,20 @@ class PopulationOfIdenticalAlgo(hierarchical.HierarchicalTorchPolicy):
             self.active_checkpoint_idx = 0
 
     def _load_checkpoint(self):
-        # print("self.policy_checkpoints[self.active_checkpoint_idx]",
-        #       self.policy_checkpoints[self.active_checkpoint_idx])
-        restore.load_one_policy_checkpoint(policy_id=self.policy_id_to_load, policy=self.algorithms[0],
-                                           checkpoint_path=self.policy_checkpoints[self.active_checkpoint_idx],
-                                           using_Tune_class=hasattr(self.algorithms[0], "tune_config"))
+        checkpoint_path = self.policy_checkpoints[self.active_checkpoint_idx]
+        using_Tune_class = hasattr(self.algorithms[0], "tune_config")
+        use_cache = not using_Tune_class and self.weights_cache.max_bytes > 0
+
+        weights = self.weights_cache.get(checkpoint_path) if use_cache else None
+        if weights is not None:
+            self.algorithms[0].set_weights(weights)
+        else:
+            restore.load_one_policy_checkpoint(policy_id=self.policy_id_to_load, policy=self.algorithms[0],
+                                               checkpoint_path=checkpoint_path,
+                                               using_Tune_class=using_Tune_class)
+            if use_cache:
+                # Copy since the weights returned can share their memory with the parameters of the model
+                self.weights_cache.put(checkpoint_path, copy.deepcopy(self.algorithms[0].get_weights()))
 
     def _freeze_algo(self):
         if hasattr(self.algorithms[0].model, "eval"):
@@ -156,6 +172,52 @@ class PopulationOfIdenticalAlgo(hierarchical.HierarchicalTorchPolicy):
     def to_log(self, value):
         self.algorithms[self.active_algo_idx].to_log = value
 
+
+class WeightsLRUCache:
+    """
+    Least recently used cache of policy weights (one entry per checkpoint). The least recently used entries are
+    evicted when the total size of the arrays stored would exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key, weights):
+        if key in self._entries:
+            self.n_bytes -= self._entries.pop(key)[1]
+        n_bytes = weights_n_bytes(weights)
+        if n_bytes > self.max_bytes:
+            return
+        while self.n_bytes + n_bytes > self.max_bytes:
+            _, (_, evicted_n_bytes) = self._entries.popitem(last=False)
+            self.n_bytes -= evicted_n_bytes
+        self._entries[key] = (weights, n_bytes)
+        self.n_bytes += n_bytes
+
+
+def weights_n_bytes(weights) -> int:
+    """Size of the arrays in weights (possibly nested in dicts, lists or tuples)"""
+    if isinstance(weights, dict):
+        return sum(weights_n_bytes(value) for value in weights.values())
+    if isinstance(weights, (list, tuple)):
+        return sum(weights_n_bytes(value) for value in weights)
+    return np.asarray(weights).nbytes
+
+
 def modify_config_to_use_population(config: dict, opponent_policy_id: str, opponents_checkpoints: list):
     population_policy = copy.deepcopy(list(config["multiagent"]["policies"][opponent_policy_id]))
 
@@ -4,3 +4,7 @@ from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersD
 from marltoolbox.envs.coin_game import CoinGame, AsymCoinGame
 from marltoolbox.envs.vectorized_coin_game import CoinGame as VectorizedCoinGame
 from marltoolbox.envs.vectorized_coin_game import AsymCoinGame as VectorizedAsymCoinGame
+from marltoolbox.envs.vectorized_matrix_sequential_social_dilemma import VectorizedIteratedPrisonersDilemma, \
+    VectorizedIteratedAsymBoS, VectorizedIteratedChicken, VectorizedIteratedBoS, VectorizedIteratedAsymChicken, \
+    VectorizedIteratedBoSAndPD, VectorizedIteratedStagHunt, VectorizedIteratedAsymPrisonersDilemma, \
+    VectorizedIteratedMatchingPennies, define_vectorized_greed_fear_matrix_game
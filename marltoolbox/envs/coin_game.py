@@ -9,9 +9,10 @@ from ray.rllib.env.multi_agent_env import MultiAgentEnv
 from typing import Dict
 
 from marltoolbox.envs.utils.interfaces import InfoAccumulationInterface
+from marltoolbox.envs.utils.mixins import StateSnapshotMixin
 
 
-class CoinGame(InfoAccumulationInterface, MultiAgentEnv, gym.Env):
+class CoinGame(InfoAccumulationInterface, StateSnapshotMixin, MultiAgentEnv, gym.Env):
     """
     Coin Game environment.
     """
@@ -26,6 +27,8 @@ class CoinGame(InfoAccumulationInterface, MultiAgentEnv, gym.Env):
         np.array([1, 0]),
         np.array([-1, 0]),
     ]
+    STATE_ATTRIBUTES = ("red_pos", "blue_pos", "coin_pos", "red_coin", "step_count_in_current_episode")
+    INFO_ATTRIBUTES = ("red_pick", "red_pick_own", "blue_pick", "blue_pick_own")
 
     def __init__(self, config: dict):
 
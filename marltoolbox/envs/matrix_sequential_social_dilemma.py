@@ -11,10 +11,11 @@ from gym.utils import seeding
 from ray.rllib.env.multi_agent_env import MultiAgentEnv
 
 from marltoolbox.envs.utils.interfaces import InfoAccumulationInterface
-from marltoolbox.envs.utils.mixins import TwoPlayersTwoActionsInfoMixin, NPlayersNDiscreteActionsInfoMixin
+from marltoolbox.envs.utils.mixins import TwoPlayersTwoActionsInfoMixin, NPlayersNDiscreteActionsInfoMixin, \
+    StateSnapshotMixin
 
 
-class MatrixSequentialSocialDilemma(InfoAccumulationInterface, MultiAgentEnv, ABC):
+class MatrixSequentialSocialDilemma(InfoAccumulationInterface, StateSnapshotMixin, MultiAgentEnv, ABC):
     """
     A multi-agent abstract class for two player matrix games.
     """
@@ -38,6 +39,8 @@ class MatrixSequentialSocialDilemma(InfoAccumulationInterface, MultiAgentEnv, AB
         self.player_row_id, self.player_col_id = self.players_ids
         self.max_steps = config.get("max_steps", 20)
         self.output_additional_info = config.get("output_additional_info", True)
+        # Size of the one-hot observations (used by the AMD agents)
+        self.n_features = self.NUM_STATES
 
         self.step_count_in_current_episode = None
 
@@ -1,12 +1,50 @@
+import copy
 from abc import ABC
 
 from marltoolbox.envs.utils.interfaces import InfoAccumulationInterface
 
 
+class StateSnapshotMixin(ABC):
+    """
+    Mixin class to save and restore the state of an environment without a deepcopy of the whole environment.
+    get_state copies only the attributes listed in STATE_ATTRIBUTES, the info accumulated during the current
+    episode (INFO_ATTRIBUTES, defined by the info mixins) and the state of the RNG of the environment.
+    """
+    STATE_ATTRIBUTES = ("step_count_in_current_episode",)
+    INFO_ATTRIBUTES = ()
+
+    def get_state(self, with_rng_state=True):
+        """
+        :param with_rng_state: include the state of the RNG of the environment (which is the most expensive part
+            of the snapshot)
+        :return: snapshot of the state of the environment, which can be restored with set_state
+        """
+        attributes = self.STATE_ATTRIBUTES
+        if self.output_additional_info:
+            attributes += self.INFO_ATTRIBUTES
+        # Shallow copies are enough: the attributes are numbers or arrays, lists and dicts of numbers
+        env_state = {attribute: copy.copy(getattr(self, attribute))
+                     for attribute in attributes if hasattr(self, attribute)}
+        if with_rng_state and hasattr(self, "np_random"):
+            env_state["np_random_state"] = self.np_random.get_state()
+        return env_state
+
+    def set_state(self, env_state):
+        """
+        Restore a snapshot produced by get_state. The same snapshot can be restored several times.
+        """
+        for attribute, value in env_state.items():
+            if attribute == "np_random_state":
+                self.np_random.set_state(value)
+            else:
+                setattr(self, attribute, copy.copy(value))
+
+
 class TwoPlayersTwoActionsInfoMixin(InfoAccumulationInterface, ABC):
     """
     Mixin class to add logging capability in a two player discrete game. Logs the frequency of each state.
     """
+    INFO_ATTRIBUTES = ("cc_count", "dd_count", "cd_count", "dc_count")
 
     def _init_info(self):
         self.cc_count = []
@@ -40,6 +78,7 @@ class NPlayersNDiscreteActionsInfoMixin(InfoAccumulationInterface, ABC):
     Mixin class to add logging capability in N player games with discrete actions.
     Logs the frequency of action profiles used (action profile: the set of actions used during one step by all players).
     """
+    INFO_ATTRIBUTES = ("info_counters",)
 
     def _init_info(self):
         self.info_counters = {"n_steps_accumulated": 0}
@@ -2,12 +2,12 @@
 # Code modified from: https://github.com/julianstastny/openspiel-social-dilemmas/blob/master/games/coin_game_gym.py
 ##########
 
-import copy
 from collections import Iterable
 
+import gym
 import numpy as np
+import numba
 from numba import jit, prange
-from numba.typed import List
 
 from marltoolbox.envs.coin_game import CoinGame as NotVectorizedCoinGame
 
@@ -20,11 +20,11 @@ def _same_pos(x, y):
 @jit(nopython=True)
 def move_players(batch_size, actions, red_pos, blue_pos, grid_size):
 
-    moves = List([
-        np.array([0, 1]),
-        np.array([0, -1]),
-        np.array([1, 0]),
-        np.array([-1, 0]),
+    moves = np.array([
+        [0, 1],
+        [0, -1],
+        [1, 0],
+        [-1, 0],
     ])
 
     for j in prange(batch_size):
@@ -41,7 +41,11 @@ def compute_reward(batch_size, red_pos, blue_pos, coin_pos, red_coin, asymmetric
     reward_red = np.zeros(batch_size)
     reward_blue = np.zeros(batch_size)
     generate = np.zeros(batch_size, dtype=np.bool_)
-    red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue = False, False, False, False
+    # One flag per sub-environment (and not one shared scalar) such that the loop can run in parallel
+    red_pick_any = np.zeros(batch_size, dtype=np.bool_)
+    red_pick_red = np.zeros(batch_size, dtype=np.bool_)
+    blue_pick_any = np.zeros(batch_size, dtype=np.bool_)
+    blue_pick_blue = np.zeros(batch_size, dtype=np.bool_)
     for i in prange(batch_size):
         if red_coin[i]:
             if _same_pos(red_pos[i], coin_pos[i]):
@@ -49,13 +53,13 @@ def compute_reward(batch_size, red_pos, blue_pos, coin_pos, red_coin, asymmetric
                 reward_red[i] += 1
                 if asymmetric:
                     reward_red[i] += 3
-                red_pick_any = True
-                red_pick_red = True
+                red_pick_any[i] = True
+                red_pick_red[i] = True
             if _same_pos(blue_pos[i], coin_pos[i]):
                 generate[i] = True
                 reward_red[i] += -2
                 reward_blue[i] += 1
-                blue_pick_any = True
+                blue_pick_any[i] = True
         else:
             if _same_pos(red_pos[i], coin_pos[i]):
                 generate[i] = True
@@ -63,14 +67,14 @@ def compute_reward(batch_size, red_pos, blue_pos, coin_pos, red_coin, asymmetric
                 reward_blue[i] += -2
                 if asymmetric:
                     reward_red[i] += 3
-                red_pick_any = True
+                red_pick_any[i] = True
             if _same_pos(blue_pos[i], coin_pos[i]):
                 generate[i] = True
                 reward_blue[i] += 1
-                blue_pick_any = True
-                blue_pick_blue = True
+                blue_pick_any[i] = True
+                blue_pick_blue[i] = True
     reward = [reward_red, reward_blue]
-    return reward, generate, red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue
+    return reward, generate, red_pick_any.any(), red_pick_red.any(), blue_pick_any.any(), blue_pick_blue.any()
 
 
 @jit(nopython=True)
@@ -89,54 +93,220 @@ def _unflatten_index(pos, grid_size):
 
 
 @jit(nopython=True)
-def place_coin(red_pos_i, blue_pos_i, grid_size):
+def place_coin(red_pos_i, blue_pos_i, grid_size, coin_rand_i):
+    """
+    Use the uniform sample coin_rand_i (in [0, 1)) drawn for this sub-environment to select the coin position.
+    Not using the numba global RNG makes the result independent of the thread executing this function.
+
+    The coin is placed uniformly among the free cells without rejection: we sample the index of the free cell and
+    then shift it over the (sorted) cells occupied by the players.
+    """
     red_pos_flat = _flatten_index(red_pos_i, grid_size)
     blue_pos_flat = _flatten_index(blue_pos_i, grid_size)
-    possible_coin_pos = np.array([x for x in range(9) if ((x != blue_pos_flat) and (x != red_pos_flat))])
-    flat_coin_pos = np.random.choice(possible_coin_pos)
+    first_occupied = min(red_pos_flat, blue_pos_flat)
+    second_occupied = max(red_pos_flat, blue_pos_flat)
+    n_occupied = 1 if first_occupied == second_occupied else 2
+    n_free_cells = grid_size * grid_size - n_occupied
+
+    flat_coin_pos = int(coin_rand_i * n_free_cells)
+    if flat_coin_pos >= first_occupied:
+        flat_coin_pos += 1
+    if n_occupied == 2 and flat_coin_pos >= second_occupied:
+        flat_coin_pos += 1
     return _unflatten_index(flat_coin_pos, grid_size)
 
 
 @jit(nopython=True)
-def generate_coin(batch_size, generate, red_coin, red_pos, blue_pos, coin_pos, grid_size):
+def generate_coin(batch_size, generate, red_coin, red_pos, blue_pos, coin_pos, grid_size, coin_rand):
     red_coin[generate] = 1 - red_coin[generate]
     for i in prange(batch_size):
         if generate[i]:
-            coin_pos[i] = place_coin(red_pos[i], blue_pos[i], grid_size)
+            coin_pos[i] = place_coin(red_pos[i], blue_pos[i], grid_size, coin_rand[i])
     return coin_pos
 
 
 @jit(nopython=True)
-def generate_state(batch_size, red_pos, blue_pos, coin_pos, red_coin,
-                   step_count_in_current_episode, max_steps, grid_size):
-    state = np.zeros((batch_size, grid_size, grid_size, 4))
+def reset_done(batch_size, done_mask, red_pos, blue_pos, coin_pos, red_coin, step_count, grid_size, reset_rand):
+    """
+    Reset in place the sub-environments selected by done_mask (including their step counter). reset_rand contains
+    4 uniform samples per sub-environment (coin color, red position, blue position and coin position), such that
+    the result does not depend on the thread executing the reset.
+    """
+    n_cells = grid_size * grid_size
+    for i in prange(batch_size):
+        if done_mask[i]:
+            red_coin[i] = int(reset_rand[i, 0] * 2)
+            # Make sure players don't overlap
+            red_pos_flat = int(reset_rand[i, 1] * n_cells)
+            blue_pos_flat = int(reset_rand[i, 2] * (n_cells - 1))
+            if blue_pos_flat >= red_pos_flat:
+                blue_pos_flat += 1
+            red_pos[i] = _unflatten_index(red_pos_flat, grid_size)
+            blue_pos[i] = _unflatten_index(blue_pos_flat, grid_size)
+            coin_pos[i] = place_coin(red_pos[i], blue_pos[i], grid_size, reset_rand[i, 3])
+            step_count[i] = 0
+    return red_pos, blue_pos, coin_pos, red_coin, step_count
+
+
+def _make_reset_all(reset_done):
+    @jit(nopython=True)
+    def reset_all(batch_size, grid_size, reset_rand):
+        red_pos = np.zeros((batch_size, 2), dtype=np.int64)
+        blue_pos = np.zeros((batch_size, 2), dtype=np.int64)
+        coin_pos = np.zeros((batch_size, 2), dtype=np.int64)
+        red_coin = np.zeros(batch_size, dtype=np.int64)
+        step_count = np.zeros(batch_size, dtype=np.int64)
+        done_mask = np.ones(batch_size, dtype=np.bool_)
+        return reset_done(batch_size, done_mask, red_pos, blue_pos, coin_pos, red_coin, step_count, grid_size,
+                          reset_rand)
+
+    return reset_all
+
+
+reset_all = _make_reset_all(reset_done)
+
+
+def _make_generate_state(dtype):
+    @jit(nopython=True)
+    def generate_state(batch_size, red_pos, blue_pos, coin_pos, red_coin,
+                       step_count_in_current_episode, max_steps, grid_size):
+        state = np.zeros((batch_size, grid_size, grid_size, 4), dtype=dtype)
+        for i in prange(batch_size):
+            state[i, red_pos[i][0], red_pos[i][1], 0] = 1
+            state[i, blue_pos[i][0], blue_pos[i][1], 1] = 1
+            if red_coin[i]:
+                state[i, coin_pos[i][0], coin_pos[i][1], 2] = 1
+            else:
+                state[i, coin_pos[i][0], coin_pos[i][1], 3] = 1
+        return state
+
+    return generate_state
+
+
+generate_state = _make_generate_state(np.float64)
+generate_uint8_state = _make_generate_state(np.uint8)
+
+
+@jit(nopython=True)
+def generate_bit_packed_state(batch_size, red_pos, blue_pos, coin_pos, red_coin,
+                              step_count_in_current_episode, max_steps, grid_size):
+    """
+    Board of shape (batch_size, grid_size, grid_size) where the bit i of each cell is the value of the plane i of
+    the one-hot observation (i.e. 1: red player, 2: blue player, 4: red coin, 8: blue coin).
+    """
+    state = np.zeros((batch_size, grid_size, grid_size), dtype=np.uint8)
     for i in prange(batch_size):
-        state[i, red_pos[i][0], red_pos[i][1], 0] = 1
-        state[i, blue_pos[i][0], blue_pos[i][1], 1] = 1
+        state[i, red_pos[i][0], red_pos[i][1]] |= 1
+        state[i, blue_pos[i][0], blue_pos[i][1]] |= 2
         if red_coin[i]:
-            state[i, coin_pos[i][0], coin_pos[i][1], 2] = 1
+            state[i, coin_pos[i][0], coin_pos[i][1]] |= 4
         else:
-            state[i, coin_pos[i][0], coin_pos[i][1], 3] = 1
+            state[i, coin_pos[i][0], coin_pos[i][1]] |= 8
     return state
 
 
-@jit(nopython=True)
-def vectorized_step_with_numba_optimization(actions, batch_size, red_pos, blue_pos, coin_pos, red_coin,
-                                            grid_size: int, asymmetric: bool, step_count_in_current_episode: int,
-                                            max_steps: int):
-    red_pos, blue_pos = move_players(batch_size, actions, red_pos, blue_pos, grid_size)
-    reward, generate, red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue = compute_reward(
-        batch_size, red_pos, blue_pos, coin_pos, red_coin, asymmetric)
-    coin_pos = generate_coin(batch_size, generate, red_coin, red_pos, blue_pos, coin_pos, grid_size)
-    state = generate_state(batch_size, red_pos, blue_pos, coin_pos, red_coin, step_count_in_current_episode,
-                           max_steps, grid_size)
-    return red_pos, blue_pos, reward, coin_pos, state, red_coin, red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue
+def unpack_bit_packed_observations(observations, dtype=np.float32):
+    """
+    Convert bit-packed observations of shape (..., grid_size, grid_size) into the one-hot observations of shape
+    (..., grid_size, grid_size, 4). To be used at the policy boundary, only when the model needs the observations.
+    """
+    planes = (observations[..., np.newaxis] >> np.arange(4, dtype=np.uint8)) & 1
+    return planes.astype(dtype)
+
+
+def _make_vectorized_step(move_players, compute_reward, generate_coin, generate_state):
+    @jit(nopython=True)
+    def vectorized_step(actions, batch_size, red_pos, blue_pos, coin_pos, red_coin,
+                        grid_size: int, asymmetric: bool, step_count_in_current_episode: int,
+                        max_steps: int, coin_rand):
+        red_pos, blue_pos = move_players(batch_size, actions, red_pos, blue_pos, grid_size)
+        reward, generate, red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue = compute_reward(
+            batch_size, red_pos, blue_pos, coin_pos, red_coin, asymmetric)
+        coin_pos = generate_coin(batch_size, generate, red_coin, red_pos, blue_pos, coin_pos, grid_size, coin_rand)
+        state = generate_state(batch_size, red_pos, blue_pos, coin_pos, red_coin, step_count_in_current_episode,
+                               max_steps, grid_size)
+        return (red_pos, blue_pos, reward, coin_pos, state, red_coin,
+                red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue)
+
+    return vectorized_step
+
+
+vectorized_step_with_numba_optimization = _make_vectorized_step(
+    move_players, compute_reward, generate_coin, generate_state)
+
+# Same kernels compiled with parallel=True, the prange loops are then distributed over the numba threads.
+parallel_move_players = jit(nopython=True, parallel=True)(move_players.py_func)
+parallel_compute_reward = jit(nopython=True, parallel=True)(compute_reward.py_func)
+parallel_generate_coin = jit(nopython=True, parallel=True)(generate_coin.py_func)
+parallel_reset_done = jit(nopython=True, parallel=True)(reset_done.py_func)
+parallel_generate_state = jit(nopython=True, parallel=True)(generate_state.py_func)
+parallel_generate_uint8_state = jit(nopython=True, parallel=True)(generate_uint8_state.py_func)
+parallel_generate_bit_packed_state = jit(nopython=True, parallel=True)(generate_bit_packed_state.py_func)
+parallel_reset_all = _make_reset_all(parallel_reset_done)
+parallel_vectorized_step_with_numba_optimization = _make_vectorized_step(
+    parallel_move_players, parallel_compute_reward, parallel_generate_coin, parallel_generate_state)
+
+OBSERVATION_MODES = ("float", "uint8", "bit_packed")
+KERNELS = {
+    False: {
+        "step": {
+            "float": vectorized_step_with_numba_optimization,
+            "uint8": _make_vectorized_step(
+                move_players, compute_reward, generate_coin, generate_uint8_state),
+            "bit_packed": _make_vectorized_step(
+                move_players, compute_reward, generate_coin, generate_bit_packed_state),
+        },
+        "generate_coin": generate_coin,
+        "reset_all": reset_all,
+        "reset_done": reset_done,
+        "generate_state": {
+            "float": generate_state,
+            "uint8": generate_uint8_state,
+            "bit_packed": generate_bit_packed_state,
+        },
+    },
+    True: {
+        "step": {
+            "float": parallel_vectorized_step_with_numba_optimization,
+            "uint8": _make_vectorized_step(
+                parallel_move_players, parallel_compute_reward, parallel_generate_coin,
+                parallel_generate_uint8_state),
+            "bit_packed": _make_vectorized_step(
+                parallel_move_players, parallel_compute_reward, parallel_generate_coin,
+                parallel_generate_bit_packed_state),
+        },
+        "generate_coin": parallel_generate_coin,
+        "reset_all": parallel_reset_all,
+        "reset_done": parallel_reset_done,
+        "generate_state": {
+            "float": parallel_generate_state,
+            "uint8": parallel_generate_uint8_state,
+            "bit_packed": parallel_generate_bit_packed_state,
+        },
+    },
+}
 
 
 class CoinGame(NotVectorizedCoinGame):
     """
     Vectorized Coin Game environment.
+
+    With numba_parallel=True, the sub-environments are stepped on several cores (numba_n_threads threads,
+    default to all the threads available to numba). The results are identical to the serial kernels.
+
+    observation_mode selects the observations produced:
+    - "float": float64 one-hot planes of shape (grid_size, grid_size, 4) (default),
+    - "uint8": the same one-hot planes as uint8 (8x smaller),
+    - "bit_packed": uint8 board of shape (grid_size, grid_size) with 4 bits per cell (32x smaller),
+        use unpack_bit_packed_observations to get back the one-hot planes.
+    The casting to float is then left to the policy (e.g. the torch models call .float() on their inputs).
+
+    Each sub-environment has its own step counter (step_count_in_sub_episodes). When vectorized, done contains
+    for each player an array with the end of the episode of each sub-environment and done["__all__"] is True when
+    all the sub-environments are done. The sub-environments which are done can be restarted with reset_done,
+    such that the batch can run continuously without a full reset.
     """
+    STATE_ATTRIBUTES = NotVectorizedCoinGame.STATE_ATTRIBUTES + ("step_count_in_sub_episodes",)
 
     def __init__(self, config={}):
 
@@ -144,31 +314,57 @@ class CoinGame(NotVectorizedCoinGame):
 
         self.batch_size = config.get("batch_size", 1)
         self.force_vectorized = config.get("force_vectorize", False)
-        assert self.grid_size == 3, "hardcoded in the generate_state function"
+        self.numba_parallel = config.get("numba_parallel", False)
+        self.numba_n_threads = config.get("numba_n_threads", None)
+        self.observation_mode = config.get("observation_mode", "float")
+        assert self.observation_mode in OBSERVATION_MODES, \
+            f"observation_mode must be one of {OBSERVATION_MODES}"
+        if self.observation_mode == "bit_packed":
+            self.OBSERVATION_SPACE = gym.spaces.Box(
+                low=0,
+                high=15,
+                shape=(self.grid_size, self.grid_size),
+                dtype='uint8'
+            )
+
+    def _call_kernel(self, name, *args):
+        kernel = KERNELS[self.numba_parallel][name]
+        if isinstance(kernel, dict):
+            kernel = kernel[self.observation_mode]
+        if not self.numba_parallel or self.numba_n_threads is None:
+            return kernel(*args)
+
+        # The number of numba threads is a global setting, restore it to not affect the rest of the process
+        previous_n_threads = numba.get_num_threads()
+        numba.set_num_threads(self.numba_n_threads)
+        try:
+            return kernel(*args)
+        finally:
+            numba.set_num_threads(previous_n_threads)
+
+    def _draw_coin_rand(self):
+        # One uniform sample per sub-environment, drawn here such that the coin positions do not depend on the
+        # numba threads
+        return np.random.random_sample(self.batch_size)
+
+    def _draw_reset_rand(self):
+        return np.random.random_sample((self.batch_size, 4))
+
+    def _generate_state(self):
+        return self._call_kernel(
+            "generate_state", self.batch_size, self.red_pos, self.blue_pos, self.coin_pos,
+            self.red_coin, self.step_count_in_current_episode,
+            self.max_steps, self.grid_size)
 
     def reset(self):
         self.step_count_in_current_episode = 0
         if self.output_additional_info:
             self._reset_info()
 
-        self.red_coin = np.random.randint(2, size=self.batch_size)
-        # Agent and coin positions
-        self.red_pos = np.random.randint(
-            self.grid_size, size=(self.batch_size, 2))
-        self.blue_pos = np.random.randint(
-            self.grid_size, size=(self.batch_size, 2))
-        self.coin_pos = np.zeros((self.batch_size, 2), dtype=np.int8)
-        for i in range(self.batch_size):
-            # Make sure players don't overlap
-            while _same_pos(self.red_pos[i], self.blue_pos[i]):
-                self.blue_pos[i] = np.random.randint(self.grid_size, size=2)
-
-        generate = np.ones(self.batch_size, dtype=bool)
-        self.coin_pos = generate_coin(
-            self.batch_size, generate, self.red_coin, self.red_pos, self.blue_pos, self.coin_pos, self.grid_size)
-        state = generate_state(self.batch_size, self.red_pos, self.blue_pos, self.coin_pos,
-                               self.red_coin, self.step_count_in_current_episode,
-                               self.max_steps, self.grid_size)
+        (self.red_pos, self.blue_pos, self.coin_pos, self.red_coin,
+         self.step_count_in_sub_episodes) = self._call_kernel(
+            "reset_all", self.batch_size, self.grid_size, self._draw_reset_rand())
+        state = self._generate_state()
 
         # Unvectorize if batch_size == 1 (do not return batch of states)
         if self.batch_size == 1 and not self.force_vectorized:
@@ -179,6 +375,31 @@ class CoinGame(NotVectorizedCoinGame):
             self.player_blue_id: state
         }
 
+    def reset_done(self, done_mask):
+        """
+        Reset in place only the sub-environments selected by done_mask (boolean array of size batch_size), the
+        other sub-environments keep their current state. Allows to start new episodes in some sub-environments
+        without resetting the full batch. The step counters of the reset sub-environments restart from 0.
+        step_count_in_current_episode (steps since the last full reset) and the info accumulated over the batch
+        are not modified.
+        :return: observations of the full batch
+        """
+        done_mask = np.asarray(done_mask, dtype=np.bool_)
+        (self.red_pos, self.blue_pos, self.coin_pos, self.red_coin,
+         self.step_count_in_sub_episodes) = self._call_kernel(
+            "reset_done", self.batch_size, done_mask, self.red_pos, self.blue_pos, self.coin_pos, self.red_coin,
+            self.step_count_in_sub_episodes, self.grid_size, self._draw_reset_rand())
+        observations = self._produce_observations_invariant_to_the_player_trained(self._generate_state())
+
+        # Unvectorize if batch_size == 1 (do not return batch of states)
+        if self.batch_size == 1 and not self.force_vectorized:
+            observations = [obs[0, ...] for obs in observations]
+
+        return {
+            self.player_red_id: observations[0],
+            self.player_blue_id: observations[1]
+        }
+
     def step(self, actions: Iterable):
         """
         :param actions: Dict containing both actions for player_1 and player_2
@@ -186,11 +407,13 @@ class CoinGame(NotVectorizedCoinGame):
         """
         actions = self._from_RLLib_API_to_list(actions)
         self.step_count_in_current_episode += 1
+        self.step_count_in_sub_episodes += 1
 
         (self.red_pos, self.blue_pos, rewards, self.coin_pos, observation, self.red_coin,
-         red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue) = vectorized_step_with_numba_optimization(
-            actions, self.batch_size, self.red_pos, self.blue_pos, self.coin_pos, self.red_coin,
-            self.grid_size, self.asymmetric, self.step_count_in_current_episode, self.max_steps)
+         red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue) = self._call_kernel(
+            "step", actions, self.batch_size, self.red_pos, self.blue_pos, self.coin_pos, self.red_coin,
+            self.grid_size, self.asymmetric, self.step_count_in_current_episode, self.max_steps,
+            self._draw_coin_rand())
 
         if self.output_additional_info:
             self._accumulate_info(red_pick_any, red_pick_red, blue_pick_any, blue_pick_blue)
@@ -204,6 +427,52 @@ class CoinGame(NotVectorizedCoinGame):
 
         return self._to_RLLib_API(observations, rewards)
 
+    def _to_RLLib_API(self, observations, rewards):
+        state = {
+            self.player_red_id: observations[0],
+            self.player_blue_id: observations[1],
+        }
+        rewards = {
+            self.player_red_id: rewards[0],
+            self.player_blue_id: rewards[1],
+        }
+
+        sub_epi_is_done = self.step_count_in_sub_episodes == self.max_steps
+        if self.batch_size == 1 and not self.force_vectorized:
+            players_done = bool(sub_epi_is_done[0])
+        else:
+            players_done = sub_epi_is_done
+        done = {
+            self.player_red_id: players_done,
+            self.player_blue_id: players_done,
+            "__all__": bool(sub_epi_is_done.all()),
+        }
+
+        if sub_epi_is_done.any() and self.output_additional_info:
+            player_red_info, player_blue_info = self._get_episode_info()
+            info = {
+                self.player_red_id: player_red_info,
+                self.player_blue_id: player_blue_info,
+            }
+        else:
+            info = {}
+
+        return state, rewards, done, info
+
+    def _produce_observations_invariant_to_the_player_trained(self, observation):
+        """
+        We want to be able to use a policy trained as player 1 for evaluation as player 2 and vice versa.
+        """
+        # player_red_observation contains [Red pos, Blue pos, Red coin pos, Blue coin pos]
+        player_red_observation = observation
+        # player_blue_observation contains [Blue pos, Red pos, Blue coin pos, Red coin pos]
+        if self.observation_mode == "bit_packed":
+            player_blue_observation = ((observation & 0b0101) << 1) | ((observation & 0b1010) >> 1)
+        else:
+            player_blue_observation = observation[..., [1, 0, 3, 2]]
+
+        return [player_red_observation, player_blue_observation]
+
     def _from_RLLib_API_to_list(self, actions):
         """
         Format actions from dict of players to list of lists
@@ -216,23 +485,11 @@ class CoinGame(NotVectorizedCoinGame):
         return actions
 
     def _save_env(self):
-        env_save_state = {
-            "red_pos": self.red_pos, "blue_pos": self.blue_pos,
-            "coin_pos": self.coin_pos, "red_coin": self.red_coin,
-            "grid_size": self.grid_size, "asymmetric": self.asymmetric,
-            "batch_size": self.batch_size,
-            "step_count_in_current_episode": self.step_count_in_current_episode,
-            "max_steps": self.max_steps,
-            "red_pick": self.red_pick,
-            "red_pick_own": self.red_pick_own,
-            "blue_pick": self.blue_pick,
-            "blue_pick_own": self.blue_pick_own,
-        }
-        return copy.deepcopy(env_save_state)
+        # The RNG state is not needed: the coins are placed with the global numpy RNG
+        return self.get_state(with_rng_state=False)
 
     def _load_env(self, env_state):
-        for k, v in env_state.items():
-            self.__setattr__(k, v)
+        self.set_state(env_state)
 
 
 class AsymCoinGame(CoinGame):
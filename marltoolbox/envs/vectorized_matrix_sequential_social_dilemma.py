@@ -0,0 +1,107 @@
+from abc import ABC
+
+import numpy as np
+
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma, IteratedAsymBoS, \
+    IteratedChicken, IteratedBoS, IteratedAsymChicken, IteratedBoSAndPD, IteratedStagHunt, \
+    IteratedAsymPrisonersDilemma, IteratedMatchingPennies, define_greed_fear_matrix_game
+from marltoolbox.envs.utils.mixins import TwoPlayersTwoActionsInfoMixin
+
+
+class VectorizedMatrixSequentialSocialDilemmaMixin(ABC):
+    """
+    Mixin to step batch_size independent games at once. Must be placed before the MatrixSequentialSocialDilemma
+    subclass in the bases (use add_vectorization).
+
+    The rewards are read with one gather into PAYOUT_MATRIX and the information about the episode is
+    accumulated in a count matrix of the action profiles instead of one list append per step.
+    """
+    INFO_ATTRIBUTES = ("action_profiles_count",)
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        self.batch_size = config.get("batch_size", 1)
+        self.force_vectorized = config.get("force_vectorize", False)
+
+    def reset(self):
+        observations = super().reset()
+        return self._unvectorize_if_needed({
+            player_id: np.full(self.batch_size, player_obs) for player_id, player_obs in observations.items()
+        })
+
+    def step(self, actions: dict):
+        """
+        :param actions: Dict containing the batch of actions of player_1 and the batch of actions of player_2
+        :return: observations, rewards, done, info
+        """
+        actions = {player_id: np.reshape(player_actions, self.batch_size)
+                   for player_id, player_actions in actions.items()}
+        observations, rewards, done, info = super().step(actions)
+        return self._unvectorize_if_needed(observations), self._unvectorize_if_needed(rewards), done, info
+
+    def _unvectorize_if_needed(self, values_per_player: dict):
+        # Unvectorize if batch_size == 1 (do not return batch of states and rewards)
+        if self.batch_size == 1 and not self.force_vectorized:
+            values_per_player = {player_id: values[0] for player_id, values in values_per_player.items()}
+        return values_per_player
+
+    def _get_players_rewards(self, action_player_0: np.ndarray, action_player_1: np.ndarray):
+        rewards = self.PAYOUT_MATRIX[action_player_0, action_player_1]
+        return [rewards[..., 0], rewards[..., 1]]
+
+    def _init_info(self):
+        self.action_profiles_count = np.zeros((self.NUM_ACTIONS, self.NUM_ACTIONS), dtype=np.int64)
+
+    def _reset_info(self):
+        self.action_profiles_count.fill(0)
+
+    def _accumulate_info(self, ac0, ac1):
+        self.action_profiles_count += np.bincount(
+            ac0 * self.NUM_ACTIONS + ac1, minlength=self.NUM_ACTIONS ** 2).reshape(self.NUM_ACTIONS,
+                                                                                  self.NUM_ACTIONS)
+
+    def _get_episode_info(self):
+        """
+        Same information as the one produced by the info mixin of the non-vectorized environment but aggregated
+        over all the games in the batch.
+        """
+        n_steps_accumulated = self.action_profiles_count.sum()
+        frequencies = self.action_profiles_count / n_steps_accumulated
+        if isinstance(self, TwoPlayersTwoActionsInfoMixin):
+            return {
+                "CC": frequencies[0, 0],
+                "DD": frequencies[1, 1],
+                "CD": frequencies[0, 1],
+                "DC": frequencies[1, 0],
+            }
+        return {f"{ac0}_{ac1}": frequencies[ac0, ac1]
+                for ac0, ac1 in zip(*np.nonzero(self.action_profiles_count))}
+
+
+def add_vectorization(EnvClass):
+    """
+    Create the vectorized version of a MatrixSequentialSocialDilemma subclass (e.g. a game returned by
+    define_greed_fear_matrix_game).
+    """
+
+    class VectorizedEnvClass(VectorizedMatrixSequentialSocialDilemmaMixin, EnvClass):
+        pass
+
+    VectorizedEnvClass.__name__ = f"Vectorized{EnvClass.__name__}"
+    VectorizedEnvClass.__qualname__ = VectorizedEnvClass.__name__
+    return VectorizedEnvClass
+
+
+def define_vectorized_greed_fear_matrix_game(greed, fear):
+    return add_vectorization(define_greed_fear_matrix_game(greed, fear))
+
+
+VectorizedIteratedMatchingPennies = add_vectorization(IteratedMatchingPennies)
+VectorizedIteratedPrisonersDilemma = add_vectorization(IteratedPrisonersDilemma)
+VectorizedIteratedAsymPrisonersDilemma = add_vectorization(IteratedAsymPrisonersDilemma)
+VectorizedIteratedStagHunt = add_vectorization(IteratedStagHunt)
+VectorizedIteratedChicken = add_vectorization(IteratedChicken)
+VectorizedIteratedAsymChicken = add_vectorization(IteratedAsymChicken)
+VectorizedIteratedBoS = add_vectorization(IteratedBoS)
+VectorizedIteratedAsymBoS = add_vectorization(IteratedAsymBoS)
+VectorizedIteratedBoSAndPD = add_vectorization(IteratedBoSAndPD)
@@ -197,6 +197,8 @@ def main(debug):
         "use_baseline": False,
         "use_dice": True,
         "use_opp_modeling": False,
+        # Roll out the lookahead steps of all the agents at the same time
+        "batch_rollouts": False,
 
         "seed": tune.grid_search(seeds),
         "metric": "ag_0_returns_player_1",
@@ -87,10 +87,28 @@ def internal_rollout(worker,
     if saver is None:
         saver = RolloutManager()
 
-    env = copy.deepcopy(worker.env)
+    # Use the environment of the worker and restore its state after the rollouts if it supports snapshots
+    # (much cheaper than a deepcopy of the environment), else use a copy of the environment
+    if hasattr(worker.env, "get_state") and hasattr(worker.env, "set_state"):
+        env = worker.env
+        env_state_before_rollout = env.get_state()
+    else:
+        env = copy.deepcopy(worker.env)
+        env_state_before_rollout = None
     if hasattr(env, "seed") and callable(env.seed):
         env.seed(seed)
 
+    try:
+        return _internal_rollout(worker, env, num_steps, policy_map, policy_agent_mapping, reset_env_before,
+                                 num_episodes, last_obs, saver, no_render, video_dir)
+    finally:
+        if env_state_before_rollout is not None:
+            env.set_state(env_state_before_rollout)
+
+
+def _internal_rollout(worker, env, num_steps, policy_map, policy_agent_mapping, reset_env_before, num_episodes,
+                      last_obs, saver, no_render, video_dir):
+
     multiagent = isinstance(env, MultiAgentEnv)
 
     if policy_agent_mapping is None:
@@ -0,0 +1,76 @@
+# Run this directly with
+# python file_path.py
+
+import copy
+import time
+
+import tensorflow as tf
+
+from marltoolbox.algos.adaptive_mechanism_design.amd import AdaptiveMechanismDesign
+from marltoolbox.examples.tune_class_api.amd import add_env_hp
+
+
+def get_config(env, report_every_n, **kwargs):
+    hyperparameters = {
+        "exp_name": "benchmark_amd",
+        "seed": 0,
+        "debug": True,
+        "fear": 1,
+        "greed": 1,
+        "with_redistribution": False,
+        "n_planning_eps": float("inf"),
+        "value_fn_variant": 'exact',
+        "action_flip_prob": 0,
+        "n_players": 2,
+        "with_planner": True,
+        "env": env,
+        "normalize_against_vp": False,
+        "normalize_against_v": False,
+        "normalize_vp_separated": False,
+        "use_rllib_polcy": False,
+    }
+    hyperparameters = add_env_hp(hyperparameters)
+    hyperparameters["report_every_n"] = report_every_n
+    hyperparameters["env_config"] = {
+        "players_ids": ["player_red", "player_blue"] if env == "CoinGame" else ["player_row", "player_col"],
+        "max_steps": hyperparameters["n_steps_per_epi"],
+        "get_additional_info": True,
+    }
+    hyperparameters.update(kwargs)
+    return hyperparameters
+
+
+def time_per_report(config, n_reports=5):
+    """Wall time of AdaptiveMechanismDesign.step(), which plays report_every_n episodes"""
+    tf.reset_default_graph()
+    trainer = AdaptiveMechanismDesign(config=copy.deepcopy(config))
+    trainer.step()
+    start = time.perf_counter()
+    for _ in range(n_reports):
+        trainer.step()
+    elapsed = (time.perf_counter() - start) / n_reports
+    trainer.stop()
+    return elapsed
+
+
+def measure_parallel_envs(env, report_every_n, n_parallel_envs_list=(1, 8, 64, 512)):
+    """Number of episodes played per second with env_config["batch_size"] games played in parallel"""
+    for n_parallel_envs in n_parallel_envs_list:
+        config = get_config(env, report_every_n)
+        config["env_config"]["batch_size"] = n_parallel_envs
+        elapsed = time_per_report(config)
+        print(f"{env} with {n_parallel_envs} parallel games: "
+              f"{n_parallel_envs * report_every_n / elapsed:.1f} episodes/s")
+
+
+def main(report_every_n=10):
+    for env in ["FearGreedMatrix", "CoinGame"]:
+        per_agent_sessions = time_per_report(get_config(env, report_every_n))
+        fused = time_per_report(get_config(env, report_every_n, fused_population_step=True))
+        print(f"{env}: {per_agent_sessions:.3f}s per {report_every_n} episodes with per-agent sessions, "
+              f"{fused:.3f}s with the fused population step (x{per_agent_sessions / fused:.1f})")
+        measure_parallel_envs(env, report_every_n)
+
+
+if __name__ == "__main__":
+    main()
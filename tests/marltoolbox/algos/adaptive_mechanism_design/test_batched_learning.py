@@ -0,0 +1,78 @@
+import numpy as np
+import tensorflow as tf
+
+from marltoolbox.algos.adaptive_mechanism_design.agent import convert_from_rllib_env_format
+from marltoolbox.algos.adaptive_mechanism_design.amd import create_population
+from marltoolbox.algos.adaptive_mechanism_design.planning_agent import Planning_Agent
+from marltoolbox.envs.vectorized_coin_game import CoinGame
+from test_fused_step import init_population, play_one_step, sequential_step, get_weights, get_planner_weights, \
+    assert_all_close
+
+
+def batched_step(agents, planning_agent, s, actions, env_rewards, s_):
+    """Same updates as in AdaptiveMechanismDesign._step_with_parallel_envs() for a batch of games"""
+    planning_rs = planning_agent.choose_action(s, actions)
+    rewards = env_rewards + planning_rs
+    planning_agent.learn(s, actions, env_rewards=env_rewards)
+    agents_losses = [agent.learn(s, actions[:, idx], rewards[:, idx], s_) for idx, agent in enumerate(agents)]
+    return agents_losses, planning_rs
+
+
+def test_batch_of_one_identical_to_single_env_step():
+    actions = [0, 1]
+
+    env, agents, planning_agent, _, sess = init_population(with_planner=True, fused=False)
+    s, env_rewards, s_ = play_one_step(env, actions)
+    single_losses, single_planning_rs = sequential_step(agents, planning_agent, s, actions, env_rewards, s_,
+                                                        agents_order=[0, 1])
+    single_weights = [get_weights(sess, agent) for agent in agents]
+    single_planner_weights = get_planner_weights(sess)
+
+    env, agents, planning_agent, _, sess = init_population(with_planner=True, fused=False)
+    s, env_rewards, s_ = play_one_step(env, actions)
+    batched_losses, batched_planning_rs = batched_step(
+        agents, planning_agent, s[np.newaxis, :], np.array([actions]), env_rewards[np.newaxis, :],
+        s_[np.newaxis, :])
+
+    assert_all_close(batched_planning_rs[0], single_planning_rs)
+    assert_all_close(get_planner_weights(sess), single_planner_weights)
+    for idx, agent in enumerate(agents):
+        assert_all_close(batched_losses[idx], single_losses[idx])
+        assert_all_close(get_weights(sess, agent), single_weights[idx])
+
+
+def test_coin_game_planner_uses_the_value_of_each_game():
+    batch_size = 2
+    with tf.Graph().as_default():
+        tf.set_random_seed(0)
+        env = CoinGame({"batch_size": batch_size, "max_steps": 10, "grid_size": 3})
+        sess = tf.Session()
+        agents = create_population(env, n_agents=2, n_units=10, sess=sess)
+        planning_agent = Planning_Agent(env, agents, max_reward_strength=3, value_fn_variant='exact', n_units=10,
+                                        convert_a_to_one_hot=True, sess=sess)
+        sess.run(tf.global_variables_initializer())
+
+    s = convert_from_rllib_env_format(env.reset(), env.players_ids, state=True, n_states=env.n_features,
+                                      coin_game=True, batched=True)
+    actions = np.array([[0, 1], [2, 3]])
+    # The values of the two games are different: 1.0 and -1.0
+    env_rewards = np.array([[1.0, 0.0], [-2.0, 1.0]])
+    feed_dict, _ = planning_agent.get_learn_feed_dict(s, actions, coin_game=True, env_rewards=env_rewards)
+    g_V, g_p, v = sess.run([planning_agent.g_V, planning_agent.g_p, planning_agent.v], feed_dict)
+
+    np.testing.assert_allclose(v, env_rewards.sum(axis=1))
+    assert g_V.shape == (batch_size,)
+    np.testing.assert_allclose(g_V, g_p * v, rtol=1e-6)
+
+
+def test_conditional_planning_actions_identical_to_one_joint_action_at_a_time():
+    env, agents, planning_agent, _, sess = init_population(with_planner=True, fused=False)
+    s, _, _ = play_one_step(env, [0, 1])
+
+    conditional_planning_actions = planning_agent.calc_conditional_planning_actions(s)
+
+    assert conditional_planning_actions.shape == (2, 2)
+    for action_0 in range(2):
+        for action_1 in range(2):
+            planning_rs = planning_agent.choose_action(s, [action_0, action_1])
+            np.testing.assert_allclose(conditional_planning_actions[action_0, action_1], planning_rs[0], rtol=1e-6)
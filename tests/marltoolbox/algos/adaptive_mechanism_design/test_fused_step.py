@@ -0,0 +1,148 @@
+import numpy as np
+import tensorflow as tf
+
+from marltoolbox.algos.adaptive_mechanism_design.agent import convert_from_rllib_env_format, \
+    convert_to_rllib_env_format
+from marltoolbox.algos.adaptive_mechanism_design.amd import create_population
+from marltoolbox.algos.adaptive_mechanism_design.fused_step import Fused_Population_Step
+from marltoolbox.algos.adaptive_mechanism_design.planning_agent import Planning_Agent
+from marltoolbox.envs.matrix_sequential_social_dilemma import define_greed_fear_matrix_game
+
+
+def init_population(with_planner, fused, seed=0):
+    """
+    Build the agents (and the planner) in a new graph with one shared session. With the same seed, the
+    initial weights are the same with and without the fused step (its ops are created after the agents).
+    """
+    graph = tf.Graph()
+    with graph.as_default():
+        tf.set_random_seed(seed)
+        env = define_greed_fear_matrix_game(fear=1, greed=1)({"max_steps": 5})
+        sess = tf.Session()
+        agents = create_population(env, n_agents=2, n_units=10, lr=0.01, gamma=0.9, mean_theta=0.0,
+                                   std_theta=0.1, entropy_coeff=0.001, use_adam_optimizer=False, sess=sess)
+        if with_planner:
+            planning_agent = Planning_Agent(env, agents, learning_rate=0.01, max_reward_strength=3,
+                                            value_fn_variant='exact', n_units=10, convert_a_to_one_hot=True,
+                                            normalize_planner=True, planner_clip_norm=None,
+                                            use_adam_optimizer=False, sess=sess)
+        else:
+            planning_agent = None
+        fused_step = Fused_Population_Step(agents, planning_agent) if fused else None
+        sess.run(tf.global_variables_initializer())
+    return env, agents, planning_agent, fused_step, sess
+
+
+def play_one_step(env, actions):
+    s = convert_from_rllib_env_format(env.reset(), env.players_ids, state=True, n_states=env.n_features)
+    s_rllib_format, rewards_rllib_format, _, _ = env.step(convert_to_rllib_env_format(actions, env.players_ids))
+    s_ = convert_from_rllib_env_format(s_rllib_format, env.players_ids, state=True, n_states=env.n_features)
+    env_rewards = convert_from_rllib_env_format(rewards_rllib_format, env.players_ids)
+    return s, env_rewards, s_
+
+
+def sequential_step(agents, planning_agent, s, actions, env_rewards, s_, agents_order):
+    """Same updates as in AdaptiveMechanismDesign.step() (one sess.run per operation), in agents_order"""
+    rewards, planning_rs = env_rewards, None
+    if planning_agent is not None:
+        planning_rs = planning_agent.choose_action(s, actions)
+        rewards = env_rewards + planning_rs
+        planning_agent.learn(s, actions, env_rewards=env_rewards)
+    agents_losses = {}
+    for idx in agents_order:
+        agents_losses[idx] = agents[idx].learn(s, actions[idx], rewards[idx], s_)
+    return agents_losses, planning_rs
+
+
+def get_weights(sess, agent):
+    return sess.run(agent.actor.var_list + agent.critic.var_list)
+
+
+def get_planner_weights(sess):
+    with sess.graph.as_default():
+        return sess.run(tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES, scope='Planner/Policy_p'))
+
+
+def assert_all_close(values, expected_values):
+    assert len(values) == len(expected_values)
+    for value, expected_value in zip(values, expected_values):
+        np.testing.assert_allclose(value, expected_value, rtol=1e-5, atol=1e-7)
+
+
+def test_fused_step_identical_to_sequential_updates():
+    actions = [0, 1]
+    for with_planner in [False, True]:
+        # In the fused step, all the updates use the weights from before the step. In the sequential updates, this
+        # is only the case for the first agent to learn (the centralized critics of the following agents use the
+        # action probabilities of the agents already updated). Each agent is then compared when learning first.
+        for first_idx in range(2):
+            env, agents, planning_agent, fused_step, sess = init_population(with_planner, fused=True)
+            s, env_rewards, s_ = play_one_step(env, actions)
+            actions_probs = fused_step.calc_actions_probs(s)
+            _, fused_losses, fused_planning_rs, _ = fused_step.step(
+                s, actions, env_rewards, s_, actions_probs, with_planner, perturbed_actions=actions)
+            fused_weights = get_weights(sess, agents[first_idx])
+            if with_planner:
+                fused_planner_weights = get_planner_weights(sess)
+
+            env, agents, planning_agent, _, sess = init_population(with_planner, fused=False)
+            s, env_rewards, s_ = play_one_step(env, actions)
+            sequential_losses, sequential_planning_rs = sequential_step(
+                agents, planning_agent, s, actions, env_rewards, s_, agents_order=[first_idx, 1 - first_idx])
+
+            assert_all_close(fused_losses[first_idx], sequential_losses[first_idx])
+            assert_all_close(fused_weights, get_weights(sess, agents[first_idx]))
+            if with_planner:
+                assert_all_close(fused_planning_rs, sequential_planning_rs)
+                assert_all_close(fused_planner_weights, get_planner_weights(sess))
+            else:
+                assert fused_planning_rs is None
+
+
+def test_fused_step_runs_with_and_without_planner():
+    n_steps = 5
+    for planner_built, with_planner in [(False, False), (True, False), (True, True)]:
+        env, agents, planning_agent, fused_step, sess = init_population(planner_built, fused=True)
+        s = convert_from_rllib_env_format(env.reset(), env.players_ids, state=True, n_states=env.n_features)
+        actions_probs = fused_step.calc_actions_probs(s)
+        for _ in range(n_steps):
+            actions = [agent.sample_action(agent_actions_probs)
+                       for agent, agent_actions_probs in zip(agents, actions_probs)]
+            s_rllib_format, rewards_rllib_format, _, _ = env.step(
+                convert_to_rllib_env_format(actions, env.players_ids))
+            s_ = convert_from_rllib_env_format(s_rllib_format, env.players_ids, state=True, n_states=env.n_features)
+            env_rewards = convert_from_rllib_env_format(rewards_rllib_format, env.players_ids)
+
+            actions_probs, agents_losses, planning_rs, planner_results = fused_step.step(
+                s, actions, env_rewards, s_, actions_probs, with_planner, perturbed_actions=actions)
+
+            assert len(actions_probs) == len(agents)
+            for agent_actions_probs in actions_probs:
+                assert agent_actions_probs.shape == (1, env.NUM_ACTIONS)
+                np.testing.assert_allclose(agent_actions_probs.sum(), 1.0, rtol=1e-5)
+            for critic_loss, advantage in agents_losses:
+                assert np.isfinite(critic_loss).all() and np.isfinite(advantage)
+            if with_planner:
+                assert len(planning_rs) == len(agents)
+                assert planner_results is not None
+            else:
+                assert planning_rs is None and planner_results is None
+            s = s_
+
+
+def test_fused_step_reads_the_weights_from_before_the_updates():
+    actions = [0, 1]
+    for _ in range(5):
+        env, agents, planning_agent, fused_step, sess = init_population(with_planner=True, fused=True)
+        s, env_rewards, s_ = play_one_step(env, actions)
+        actions_probs = fused_step.calc_actions_probs(s)
+        expected_next_actions_probs = fused_step.calc_actions_probs(s_)
+        expected_planning_rs = planning_agent.choose_action(s, actions)
+
+        next_actions_probs, _, planning_rs, _ = fused_step.step(
+            s, actions, env_rewards, s_, actions_probs, with_planner=True, perturbed_actions=actions)
+
+        assert_all_close(next_actions_probs, expected_next_actions_probs)
+        assert_all_close(planning_rs, expected_planning_rs)
+        # The weights were updated
+        assert not np.array_equal(fused_step.calc_actions_probs(s_)[0], expected_next_actions_probs[0])
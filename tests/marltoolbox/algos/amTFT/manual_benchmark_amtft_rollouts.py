@@ -0,0 +1,75 @@
+# Run this directly with
+# python file_path.py
+
+import time
+
+import numpy as np
+
+from marltoolbox.algos import amTFT
+from marltoolbox.algos.amTFT import base_policy
+from marltoolbox.envs.coin_game import CoinGame
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from test_amTFTRolloutsTorchPolicy import WorkerForInternalRollouts
+from test_base_policy import init_amTFT
+
+
+def init_amTFT_in_eval(EnvClass, env_config, batch_rollouts, n_rollout_replicas, **policy_config_update):
+    env = EnvClass(env_config)
+    policy_config_update = dict({
+        "working_state": base_policy.WORKING_STATES[2],
+        "own_policy_id": env.players_ids[0],
+        "opp_policy_id": env.players_ids[1],
+        "batch_rollouts": batch_rollouts,
+        "n_rollout_replicas": n_rollout_replicas,
+        "rollout_length": env_config["max_steps"],
+        "verbose": 0,
+    }, **policy_config_update)
+    if EnvClass is CoinGame:
+        policy_config_update["model"] = {
+            "dim": env.grid_size,
+            "conv_filters": [[16, [3, 3], 1], [32, [3, 3], 1]],
+        }
+    am_tft_policy, _ = init_amTFT(policy_config_update, policy_class=amTFT.amTFTRolloutsTorchPolicy)
+    worker = WorkerForInternalRollouts(env, {player_id: am_tft_policy for player_id in env.players_ids})
+    return am_tft_policy, env, worker
+
+
+def measure_step_latency(EnvClass, env_config, batch_rollouts, n_rollout_replicas=20, n_episodes=2, seed=0):
+    """
+    Mean time of one step of amTFT (computing its action and updating its debit/punishment with the rollouts)
+    playing against a random opponent (which defects often, such that the rollouts are performed).
+    """
+    np.random.seed(seed)
+    am_tft_policy, env, worker = init_amTFT_in_eval(EnvClass, env_config, batch_rollouts, n_rollout_replicas)
+    own_id, opp_id = env.players_ids
+    preprocessor = worker.preprocessors[own_id]
+
+    n_steps, total_time = 0, 0.0
+    for _ in range(n_episodes):
+        obs = env.reset()
+        done = False
+        while not done:
+            start = time.perf_counter()
+            own_action = am_tft_policy.compute_actions([preprocessor.transform(obs[own_id])])[0][0]
+            total_time += time.perf_counter() - start
+
+            opp_action = np.random.randint(env.NUM_ACTIONS)
+            obs, _, done, _ = env.step({own_id: own_action, opp_id: opp_action})
+            done = done["__all__"]
+
+            start = time.perf_counter()
+            am_tft_policy.on_episode_step(preprocessor.transform(obs[opp_id]), obs, opp_action, worker,
+                                          None, None, None)
+            total_time += time.perf_counter() - start
+            n_steps += 1
+        am_tft_policy.on_episode_end()
+    return total_time / n_steps
+
+
+if __name__ == "__main__":
+    for EnvClass, env_config in [(IteratedPrisonersDilemma, {"max_steps": 20}),
+                                 (CoinGame, {"max_steps": 20, "grid_size": 3})]:
+        latencies = {batch_rollouts: measure_step_latency(EnvClass, env_config, batch_rollouts)
+                     for batch_rollouts in [False, True]}
+        print(f"{EnvClass.__name__}: amTFT step latency sequential rollouts {latencies[False] * 1e3:.1f} ms, "
+              f"batched rollouts {latencies[True] * 1e3:.1f} ms, speedup x{latencies[False] / latencies[True]:.1f}")
@@ -0,0 +1,50 @@
+# Run this directly with
+# python file_path.py
+
+import numpy as np
+
+from marltoolbox.envs.coin_game import CoinGame
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from manual_benchmark_amtft_rollouts import init_amTFT_in_eval
+
+
+def count_rollouts_per_episode(EnvClass, env_config, k_search, k_opp_loss_cache_size, n_episodes=5,
+                               defection_prob=0.3, seed=0):
+    """
+    Mean number of rollouts performed by amTFT during one episode against an opponent cooperating with the
+    cooperative policy of amTFT but defecting (playing a random action) with probability defection_prob.
+    """
+    np.random.seed(seed)
+    am_tft_policy, env, worker = init_amTFT_in_eval(EnvClass, env_config, batch_rollouts=True,
+                                                    n_rollout_replicas=20, k_search=k_search,
+                                                    k_opp_loss_cache_size=k_opp_loss_cache_size)
+    own_id, opp_id = env.players_ids
+    preprocessor = worker.preprocessors[own_id]
+
+    for _ in range(n_episodes):
+        obs = env.reset()
+        done = False
+        while not done:
+            own_action = am_tft_policy.compute_actions([preprocessor.transform(obs[own_id])])[0][0]
+            if np.random.random() < defection_prob:
+                opp_action = np.random.randint(env.NUM_ACTIONS)
+            else:
+                opp_action = am_tft_policy._simulate_action_from_cooperative_opponent(
+                    preprocessor.transform(obs[opp_id]))
+            obs, _, done, _ = env.step({own_id: own_action, opp_id: opp_action})
+            done = done["__all__"]
+            am_tft_policy.on_episode_step(preprocessor.transform(obs[opp_id]), obs, opp_action, worker,
+                                          None, None, None)
+        am_tft_policy.on_episode_end()
+    return am_tft_policy.n_rollouts_performed / n_episodes
+
+
+if __name__ == "__main__":
+    for EnvClass, env_config in [(IteratedPrisonersDilemma, {"max_steps": 20}),
+                                 (CoinGame, {"max_steps": 20, "grid_size": 3})]:
+        reference = count_rollouts_per_episode(EnvClass, env_config, "linear", k_opp_loss_cache_size=0)
+        print(f"{EnvClass.__name__}: linear search without cache {reference:.0f} rollouts per episode")
+        for k_search, k_opp_loss_cache_size in [("galloping", 0), ("linear", 1000), ("galloping", 1000)]:
+            n_rollouts = count_rollouts_per_episode(EnvClass, env_config, k_search, k_opp_loss_cache_size)
+            print(f"{EnvClass.__name__}: {k_search} search with cache size {k_opp_loss_cache_size} "
+                  f"{n_rollouts:.0f} rollouts per episode ({reference - n_rollouts:.0f} saved)")
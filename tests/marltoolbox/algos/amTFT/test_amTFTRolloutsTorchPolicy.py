@@ -1,8 +1,48 @@
+import numpy as np
+import pytest
+from ray.rllib.models import ModelCatalog
+from ray.rllib.utils.filter import NoFilter
+
 from marltoolbox.algos import amTFT
 from marltoolbox.algos.amTFT import base_policy
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
 from test_base_policy import init_amTFT, generate_fake_discrete_actions
 
 
+class WorkerForInternalRollouts:
+    """The attributes of a RolloutWorker used to perform internal rollouts from a policy"""
+
+    def __init__(self, env, policy_map):
+        self.env = env
+        self.policy_map = policy_map
+        self.multiagent = True
+        self.policy_config = {"clip_actions": False,
+                              "multiagent": {"policy_mapping_fn": lambda agent_id: agent_id}}
+        self.preprocessors = {policy_id: ModelCatalog.get_preprocessor_for_space(policy.observation_space)
+                              for policy_id, policy in policy_map.items()}
+        self.filters = {policy_id: NoFilter() for policy_id in policy_map.keys()}
+
+    def get_policy(self, policy_id):
+        return self.policy_map[policy_id]
+
+
+def init_amTFT_in_eval_with_worker(policy_config_update={}):
+    env = IteratedPrisonersDilemma({})
+    policy_config_update = dict({
+        "working_state": base_policy.WORKING_STATES[2],
+        "own_policy_id": env.players_ids[0],
+        "opp_policy_id": env.players_ids[1],
+        # Deterministic rollouts, to compare the sequential and batched rollouts
+        "explore": False,
+        "n_rollout_replicas": 4,
+        "rollout_length": 5,
+        "verbose": 0,
+    }, **policy_config_update)
+    am_tft_policy, env = init_amTFT(policy_config_update, policy_class=amTFT.amTFTRolloutsTorchPolicy)
+    worker = WorkerForInternalRollouts(env, {player_id: am_tft_policy for player_id in env.players_ids})
+    return am_tft_policy, env, worker
+
+
 def test_compute_actions_overwrite():
     am_tft_policy, env = init_amTFT(policy_class=amTFT.amTFTRolloutsTorchPolicy)
 
@@ -48,3 +88,101 @@ def test__select_algo_to_use_in_eval():
     am_tft_policy.performing_rollouts = True
     am_tft_policy.n_steps_to_punish_opponent = 1
     assert_(working_state_idx=2, active_algo_idx=base_policy.OPP_SELFISH_POLICY_IDX)
+
+
+def test_batched_rollouts_identical_to_sequential_rollouts():
+    am_tft_policy, env, worker = init_amTFT_in_eval_with_worker()
+    env.reset()
+    last_obs, _, _, _ = env.step(generate_fake_discrete_actions(env))
+    env_state = env.get_state(with_rng_state=False)
+
+    results = {}
+    for batch_rollouts in [False, True]:
+        am_tft_policy.batch_rollouts = batch_rollouts
+        debits = [am_tft_policy._compute_debit_using_rollouts(last_obs, opp_action, worker)
+                  for opp_action in range(env.NUM_ACTIONS)]
+        n_steps_to_punish, policy_map, policy_agent_mapping = \
+            am_tft_policy._prepare_to_perform_virtual_rollouts_in_env(worker)
+        losses = [am_tft_policy._compute_opp_total_reward_loss(k, worker, policy_map, policy_agent_mapping, last_obs)
+                  for k in range(1, am_tft_policy.rollout_length + 1)]
+        am_tft_policy._stop_performing_virtual_rollouts_in_env(n_steps_to_punish)
+        results[batch_rollouts] = debits, losses
+
+        assert env.get_state(with_rng_state=False) == env_state
+        assert am_tft_policy.n_steps_to_punish == 0
+        assert am_tft_policy.n_steps_to_punish_opponent == 0
+
+    assert results[True][0] == pytest.approx(results[False][0])
+    for (loss, n_steps_played), (batched_loss, batched_n_steps_played) in zip(results[False][1], results[True][1]):
+        assert batched_loss == pytest.approx(loss)
+        assert batched_n_steps_played == n_steps_played
+
+
+def test_galloping_k_search_finds_the_smallest_k_reaching_the_threshold():
+    am_tft_policy, env, worker = init_amTFT_in_eval_with_worker({"rollout_length": 20, "k_opp_loss_cache_size": 0,
+                                                                "k_search": "galloping"})
+    env.reset()
+    last_obs, _, _, _ = env.step(generate_fake_discrete_actions(env))
+    n_steps_played = 10
+    losses = 1.5 * np.minimum(np.arange(am_tft_policy.rollout_length + 1), n_steps_played)
+    am_tft_policy._compute_opp_total_reward_loss = \
+        lambda k_to_explore, *args, **kwargs: (losses[k_to_explore], n_steps_played)
+
+    for total_debit in [0.1, 1.0, 2.0, 100.0]:
+        threshold = total_debit * am_tft_policy.punishment_multiplier
+        reaching_threshold = np.flatnonzero(losses[1:] >= threshold) + 1
+        expected_k = reaching_threshold[0] if len(reaching_threshold) > 0 else n_steps_played
+        for last_k in range(1, am_tft_policy.rollout_length + 1):
+            am_tft_policy.last_k = last_k
+            am_tft_policy.total_debit = total_debit
+            assert am_tft_policy._compute_punishment_duration_from_rollouts(worker, last_obs) == expected_k
+
+
+def test_k_opp_loss_cache_cleared_when_setting_weights():
+    am_tft_policy, env, worker = init_amTFT_in_eval_with_worker()
+    env.reset()
+    last_obs, _, _, _ = env.step(generate_fake_discrete_actions(env))
+    k_explored = []
+
+    def fake_opp_total_reward_loss(k_to_explore, *args, **kwargs):
+        k_explored.append(k_to_explore)
+        return 2.0 * k_to_explore, am_tft_policy.rollout_length
+
+    am_tft_policy._compute_opp_total_reward_loss = fake_opp_total_reward_loss
+
+    def search_k():
+        am_tft_policy.last_k = 1
+        am_tft_policy.total_debit = 1.0
+        return am_tft_policy._compute_punishment_duration_from_rollouts(worker, last_obs)
+
+    k_found = search_k()
+    n_k_explored = len(k_explored)
+    assert n_k_explored > 0
+    assert search_k() == k_found
+    assert len(k_explored) == n_k_explored
+
+    am_tft_policy.set_weights(am_tft_policy.get_weights())
+    assert search_k() == k_found
+    assert len(k_explored) == 2 * n_k_explored
+
+
+def test_k_opp_loss_cache_does_not_change_the_k_found():
+    for k_search in ["linear", "galloping"]:
+        k_found = {}
+        for k_opp_loss_cache_size in [0, 1000]:
+            am_tft_policy, env, worker = init_amTFT_in_eval_with_worker({
+                "rollout_length": 10, "k_search": k_search, "k_opp_loss_cache_size": k_opp_loss_cache_size})
+            env.reset()
+            last_obs, _, _, _ = env.step(generate_fake_discrete_actions(env))
+            am_tft_policy._compute_opp_total_reward_loss = \
+                lambda k_to_explore, *args, **kwargs: (float(k_to_explore), am_tft_policy.rollout_length)
+
+            # Two searches from the same state, with different last k and debits
+            k_found[k_opp_loss_cache_size] = []
+            for last_k, total_debit in [(1, 0.5 / am_tft_policy.punishment_multiplier),
+                                        (5, 2.0 / am_tft_policy.punishment_multiplier)]:
+                am_tft_policy.last_k = last_k
+                am_tft_policy.total_debit = total_debit
+                k_found[k_opp_loss_cache_size].append(
+                    am_tft_policy._compute_punishment_duration_from_rollouts(worker, last_obs))
+        assert k_found[1000] == k_found[0]
@@ -121,3 +121,20 @@ def test_on_episode_end():
     am_tft_policy.on_episode_end()
     assert am_tft_policy.total_debit == 0
     assert am_tft_policy.n_steps_to_punish == 0
+
+
+def test_attribute_fallback_to_the_active_nested_policy():
+    am_tft_policy, env = init_amTFT()
+
+    for algo_idx, algo in enumerate(am_tft_policy.algorithms):
+        am_tft_policy.active_algo_idx = algo_idx
+        assert am_tft_policy.exploration is algo.exploration
+        assert am_tft_policy.model is algo.model
+    # Own attributes are not looked for in the nested policies
+    assert am_tft_policy.working_state == base_policy.WORKING_STATES[0]
+
+    try:
+        am_tft_policy.attribute_not_existing
+        assert False, "AttributeError not raised"
+    except AttributeError as error:
+        assert "attribute_not_existing" in str(error)
@@ -0,0 +1,34 @@
+# Run this directly with
+# python file_path.py
+
+import timeit
+
+import numpy as np
+
+from marltoolbox.algos.lola.networks import ExperienceBuffer, ArrayExperienceBuffer
+
+
+def fill_buffer(BufferClass, n_episodes, episode_length, state_size):
+    buffer = BufferClass(n_episodes)
+    states = np.random.rand(episode_length + 1, state_size)
+    episode = np.array([[states[t], 0, 0.0, states[t + 1], False, 0] for t in range(episode_length)],
+                       dtype=object)
+    for _ in range(n_episodes):
+        buffer.add(episode)
+    return buffer
+
+
+def measure_sampling_latency(n_episodes, episode_length=20, trace_length=20, state_size=5, number=3):
+    print(f"Sampling one trace of length {trace_length} from each of {n_episodes} stored episodes")
+    latencies = {}
+    for BufferClass in [ExperienceBuffer, ArrayExperienceBuffer]:
+        buffer = fill_buffer(BufferClass, n_episodes, episode_length, state_size)
+        latencies[BufferClass] = timeit.timeit(lambda: buffer.sample(n_episodes, trace_length),
+                                               number=number) / number
+        print(f"{BufferClass.__name__}: {latencies[BufferClass] * 1000:.1f} ms")
+    print(f"speedup: x{latencies[ExperienceBuffer] / latencies[ArrayExperienceBuffer]:.1f}")
+
+
+if __name__ == "__main__":
+    for n_episodes in [10000, 100000]:
+        measure_sampling_latency(n_episodes)
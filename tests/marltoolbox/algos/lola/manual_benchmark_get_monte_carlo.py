@@ -0,0 +1,40 @@
+# Run this directly with
+# python file_path.py
+
+import timeit
+
+import numpy as np
+
+from marltoolbox.algos.lola.utils import get_monte_carlo
+
+
+def get_monte_carlo_quadratic(reward, y, trace_length, batch_size):
+    """Previous implementation of get_monte_carlo, quadratic in trace_length"""
+    reward = np.reshape(reward, ((batch_size, trace_length)))
+    reward_buffer = np.zeros(((batch_size, trace_length + 1)))
+    reward_buffer[:, :trace_length] = reward
+    discounted_reward = np.zeros(((batch_size, trace_length)))
+
+    for t in range(trace_length - 1, -1, -1):
+        reward_buffer[:, t + 1:] *= y
+        discounted_reward[:, t] = np.sum(reward_buffer[:, t:], 1)
+
+    return np.reshape(discounted_reward, (batch_size * trace_length))
+
+
+def main(batch_size=512, y=0.96, n_repeats=20):
+    # Compile
+    get_monte_carlo(np.zeros(2), y, 2, 1)
+    for trace_length in [20, 150, 1000]:
+        reward = np.random.randn(batch_size * trace_length)
+        timings = {}
+        for name, fn in [("quadratic", get_monte_carlo_quadratic), ("reverse scan", get_monte_carlo)]:
+            timings[name] = timeit.timeit(lambda: fn(reward, y, trace_length, batch_size),
+                                          number=n_repeats) / n_repeats
+        print(f"trace_length {trace_length}, batch_size {batch_size}: "
+              + ", ".join(f"{name} {elapsed * 1000:.2f}ms" for name, elapsed in timings.items())
+              + f" (x{timings['quadratic'] / timings['reverse scan']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
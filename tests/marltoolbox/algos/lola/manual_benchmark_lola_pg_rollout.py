@@ -0,0 +1,91 @@
+# Run this directly with
+# python file_path.py
+
+import time
+
+import numpy as np
+
+from marltoolbox.algos.lola.train_cg_tune_class_API import LOLAPGCG
+from marltoolbox.envs.vectorized_coin_game import CoinGame
+
+
+def get_config(batch_size, trace_length):
+    return {
+        "env": CoinGame,
+        "seed": 0,
+        "num_episodes": 1,
+        "trace_length": trace_length,
+        "batch_size": batch_size,
+        "lola_update": True,
+        "opp_model": False,
+        "grid_size": 3,
+        "gamma": 0.96,
+        "hidden": 32,
+        "bs_mul": 1 / 10,
+        "lr": 0.005,
+    }
+
+
+def rollout(trainer, fused):
+    """Collect one batch of episodes without training, as done in LOLAPGCG.step()"""
+    these_agents = range(trainer.total_n_agents)
+    obs = trainer.env.reset()
+    s = obs["player_red"]
+    rAll = np.zeros((8))
+    aAll = np.zeros((trainer.env.NUM_ACTIONS * trainer.total_n_agents))
+    lstm_state = [np.zeros((trainer.batch_size, trainer.h_size[agent] * 2)) for agent in these_agents]
+    for _ in range(trainer.trace_length):
+        if fused:
+            a_all, lstm_state = trainer._compute_actions_and_lstm_states(s, lstm_state, these_agents)
+        else:
+            # One sess.run per agent
+            results = [trainer.sess.run(
+                [trainer.mainPN_step[agent].predict, trainer.mainPN_step[agent].lstm_state_output],
+                feed_dict={
+                    trainer.mainPN_step[agent].state_input: s,
+                    trainer.mainPN_step[agent].lstm_state: lstm_state[agent],
+                    trainer.mainPN_step[agent].is_training: True,
+                }) for agent in these_agents]
+            a_all = [a for a, _ in results]
+            lstm_state = [lstm_s for _, lstm_s in results]
+
+        obs, r, d, info = trainer.env.step({"player_red": a_all[0], "player_blue": a_all[1]})
+        r = [r['player_red'], r['player_blue']]
+        a_all = np.transpose(np.vstack(a_all))
+        if fused:
+            trainer._accumulate_step_stats(rAll, aAll, r, a_all)
+        else:
+            # Loop over the batch
+            for index in range(trainer.batch_size):
+                rAll[0] += r[0][index]
+                rAll[1] += r[1][index]
+                rAll[6] += r[0][index] + r[1][index]
+                rAll[7] += 1
+                for agent_n in range(a_all.shape[1]):
+                    aAll[int(a_all[index, agent_n] + 4 * agent_n)] += 1
+        s = obs["player_red"]
+
+
+def measure_steps_per_sec(batch_size, trace_length=20, n_rollouts=5):
+    trainer = LOLAPGCG(config=get_config(batch_size, trace_length))
+    steps_per_sec = {}
+    for fused in [False, True]:
+        rollout(trainer, fused)
+        start = time.perf_counter()
+        for _ in range(n_rollouts):
+            rollout(trainer, fused)
+        elapsed = time.perf_counter() - start
+        steps_per_sec[fused] = n_rollouts * trace_length * batch_size / elapsed
+    trainer.stop()
+    return steps_per_sec
+
+
+def main():
+    for batch_size in [32, 128, 512, 2048]:
+        steps_per_sec = measure_steps_per_sec(batch_size)
+        print(f"batch_size {batch_size}: {steps_per_sec[False]:.0f} steps/s with one sess.run per agent, "
+              f"{steps_per_sec[True]:.0f} steps/s fused (x{steps_per_sec[True] / steps_per_sec[False]:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import numpy as np
+import tensorflow as tf
+
+from marltoolbox.algos.lola.corrections import corrections_func
+from marltoolbox.algos.lola.networks import Pnetwork
+from marltoolbox.algos.lola.utils import make_cube
+from marltoolbox.envs.vectorized_coin_game import CoinGame
+
+
+def init_networks(batch_size, trace_length, grid_size, h_size=8):
+    env = CoinGame(config={
+        "batch_size": batch_size,
+        "max_steps": trace_length,
+        "grid_size": grid_size,
+    })
+    sess = tf.Session()
+    main_pn = [Pnetwork(f'main{agent}', h_size, agent, env, trace_length=trace_length, batch_size=batch_size,
+                        sess=sess)
+               for agent in range(2)]
+    return env, sess, main_pn
+
+
+def play_random_batch(env, batch_size, trace_length):
+    obs = env.reset()
+    states, actions, rewards = [[], []], [[], []], [[], []]
+    for _ in range(trace_length):
+        step_actions = np.random.randint(env.NUM_ACTIONS, size=(2, batch_size))
+        for agent_idx, player_id in enumerate(env.players_ids):
+            states[agent_idx].append(obs[player_id])
+            actions[agent_idx].append(step_actions[agent_idx])
+        obs, step_rewards, _, _ = env.step({player_id: step_actions[agent_idx]
+                                            for agent_idx, player_id in enumerate(env.players_ids)})
+        for agent_idx, player_id in enumerate(env.players_ids):
+            rewards[agent_idx].append(step_rewards[player_id])
+
+    # From [trace_length, batch_size, ...] to [batch_size, trace_length, ...]
+    states = [np.swapaxes(np.array(agent_states), 0, 1) for agent_states in states]
+    actions = [np.swapaxes(np.array(agent_actions), 0, 1) for agent_actions in actions]
+    rewards = [np.swapaxes(np.array(agent_rewards), 0, 1) for agent_rewards in rewards]
+    return states, actions, rewards
+
+
+def get_feed_dict(main_pn, env, batch_size, trace_length, gamma=0.96):
+    states, actions, rewards = play_random_batch(env, batch_size, trace_length)
+    gamma_array = np.power(gamma, np.arange(trace_length))[np.newaxis, :]
+    feed_dict = {}
+    for agent_idx, policy_network in enumerate(main_pn):
+        feed_dict.update({
+            policy_network.state_input: np.reshape(states[agent_idx], [batch_size * trace_length] +
+                                                   list(env.OBSERVATION_SPACE.shape)),
+            policy_network.actions: np.reshape(actions[agent_idx], [-1]),
+            policy_network.sample_reward: rewards[agent_idx],
+            policy_network.sample_return: rewards[agent_idx] * gamma_array,
+            policy_network.next_value: np.zeros((batch_size, 1)),
+            policy_network.gamma_array: gamma_array,
+            policy_network.gamma_array_inverse: gamma_array[:, ::-1],
+        })
+    return feed_dict
+
+
+def test_cumsum_corrections_identical_to_cube_and_unrolled_loop():
+    batch_size, trace_length, grid_size = 4, 6, 3
+    tf.reset_default_graph()
+    np.random.seed(0)
+    tf.set_random_seed(0)
+    env, sess, main_pn = init_networks(batch_size, trace_length, grid_size)
+    cube, cube_ops = make_cube(trace_length)
+
+    fetches = {}
+    for variant, kwargs in [("cube", {"cube": cube}),
+                            ("unrolled_loop", {"cube": None}),
+                            ("cumsum", {"cube": None, "use_cumsum": True})]:
+        with tf.variable_scope(variant):
+            corrections_func(main_pn, batch_size, trace_length, corrections=True, **kwargs)
+        fetches[variant] = {
+            "v_0": main_pn[0].value_used_for_correction,
+            "v_1": main_pn[1].value_used_for_correction,
+            "delta_0": main_pn[0].delta,
+            "delta_1": main_pn[1].delta,
+        }
+
+    sess.run(tf.global_variables_initializer())
+    sess.run(cube_ops)
+    results = sess.run(fetches, get_feed_dict(main_pn, env, batch_size, trace_length))
+
+    for variant in ["cube", "unrolled_loop"]:
+        for key, value in results["cumsum"].items():
+            np.testing.assert_allclose(value, results[variant][key], rtol=1e-4, atol=1e-6)
+    sess.close()
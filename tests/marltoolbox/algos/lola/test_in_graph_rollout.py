@@ -0,0 +1,91 @@
+import numpy as np
+import tensorflow as tf
+
+from marltoolbox.algos.lola.in_graph_rollout import CoinGameInGraphRollout, coin_game_step, generate_state
+from marltoolbox.envs.vectorized_coin_game import CoinGame, AsymCoinGame
+
+
+def init_env(EnvClass, batch_size, max_steps, grid_size):
+    return EnvClass(config={
+        "batch_size": batch_size,
+        "max_steps": max_steps,
+        "grid_size": grid_size,
+        "get_additional_info": True,
+    })
+
+
+def uniform_policy_fn(batch_size, n_actions):
+    def policy_fn(state_input, lstm_state):
+        return tf.zeros((batch_size, n_actions)), lstm_state
+
+    return policy_fn
+
+
+def test_coin_game_step_identical_to_vectorized_coin_game():
+    batch_size, n_steps = 64, 30
+    for EnvClass, asymmetric in [(CoinGame, False), (AsymCoinGame, True)]:
+        for grid_size in [3, 5]:
+            tf.reset_default_graph()
+            np.random.seed(0)
+            env = init_env(EnvClass, batch_size, n_steps, grid_size)
+
+            red_pos = tf.placeholder(tf.int32, [batch_size, 2])
+            blue_pos = tf.placeholder(tf.int32, [batch_size, 2])
+            coin_pos = tf.placeholder(tf.int32, [batch_size, 2])
+            red_coin = tf.placeholder(tf.int32, [batch_size])
+            actions = tf.placeholder(tf.int32, [2, batch_size])
+            coin_rand = tf.placeholder(tf.float64, [batch_size])
+            step_outputs = coin_game_step(red_pos, blue_pos, coin_pos, red_coin, actions[0], actions[1],
+                                          coin_rand, grid_size, asymmetric)
+            state = generate_state(*step_outputs[:4], grid_size)
+
+            with tf.Session() as sess:
+                env.reset()
+                for _ in range(n_steps):
+                    step_actions = np.random.randint(env.NUM_ACTIONS, size=(2, batch_size))
+                    feed_dict = {red_pos: env.red_pos, blue_pos: env.blue_pos, coin_pos: env.coin_pos,
+                                 red_coin: env.red_coin, actions: step_actions}
+
+                    # Draw the same uniform samples as the environment
+                    rng_state = np.random.get_state()
+                    feed_dict[coin_rand] = env._draw_coin_rand()
+                    np.random.set_state(rng_state)
+
+                    (tf_red_pos, tf_blue_pos, tf_coin_pos, tf_red_coin, reward_red, reward_blue,
+                     *_), tf_state = sess.run([step_outputs, state], feed_dict)
+                    obs, rewards, _, _ = env.step({"player_red": step_actions[0], "player_blue": step_actions[1]})
+
+                    np.testing.assert_array_equal(tf_red_pos, env.red_pos)
+                    np.testing.assert_array_equal(tf_blue_pos, env.blue_pos)
+                    np.testing.assert_array_equal(tf_coin_pos, env.coin_pos)
+                    np.testing.assert_array_equal(tf_red_coin, env.red_coin)
+                    np.testing.assert_array_equal(reward_red, rewards["player_red"])
+                    np.testing.assert_array_equal(reward_blue, rewards["player_blue"])
+                    np.testing.assert_array_equal(tf_state, obs["player_red"])
+
+
+def test_rollout_identical_to_vectorized_coin_game():
+    batch_size, trace_length, grid_size, seed = 32, 20, 3, 0
+    tf.reset_default_graph()
+    env = init_env(CoinGame, batch_size, trace_length, grid_size)
+    in_graph_rollout = CoinGameInGraphRollout(
+        [uniform_policy_fn(batch_size, env.NUM_ACTIONS) for _ in range(2)], h_sizes=[4, 4],
+        batch_size=batch_size, trace_length=trace_length, grid_size=grid_size)
+
+    np.random.seed(seed)
+    with tf.Session() as sess:
+        results = in_graph_rollout.rollout(sess, env)
+
+    # Replay the same actions in the environment with the same seed
+    np.random.seed(seed)
+    env = init_env(CoinGame, batch_size, trace_length, grid_size)
+    obs = env.reset()
+    for t in range(trace_length):
+        np.testing.assert_array_equal(results["states"][t], obs["player_red"])
+        obs, rewards, done, info = env.step({"player_red": results["actions"][0][t],
+                                             "player_blue": results["actions"][1][t]})
+        np.testing.assert_array_equal(results["rewards"][0][t], rewards["player_red"])
+        np.testing.assert_array_equal(results["rewards"][1][t], rewards["player_blue"])
+    assert done["__all__"]
+    np.testing.assert_array_equal(results["last_state"], obs["player_red"])
+    assert results["info"] == info
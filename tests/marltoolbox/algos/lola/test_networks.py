@@ -0,0 +1,39 @@
+import numpy as np
+
+from marltoolbox.algos.lola.networks import ExperienceBuffer, ArrayExperienceBuffer
+
+
+def make_episode(episode_idx, episode_length, state_size=5):
+    states = np.random.rand(episode_length + 1, state_size)
+    return np.array([[states[t], np.random.randint(2), float(episode_idx * 100 + t), states[t + 1], False, 0]
+                     for t in range(episode_length)], dtype=object)
+
+
+def test_array_experience_buffer_same_traces_as_experience_buffer():
+    buffer_size, episode_length = 4, 6
+    list_buffer, array_buffer = ExperienceBuffer(buffer_size), ArrayExperienceBuffer(buffer_size)
+    # Also overwrite the oldest episodes
+    for episode_idx in range(buffer_size + 3):
+        episode = make_episode(episode_idx, episode_length)
+        list_buffer.add(episode)
+        array_buffer.add(episode)
+    assert len(array_buffer) == len(list_buffer.buffer)
+
+    # With traces covering the whole episodes the samples are deterministic
+    expected = list_buffer.sample(buffer_size, episode_length)
+    traces = array_buffer.sample(buffer_size, episode_length)
+    for field_idx in range(ArrayExperienceBuffer.N_FIELDS):
+        np.testing.assert_array_equal(np.stack(expected[:, field_idx]), traces[:, field_idx])
+
+
+def test_array_experience_buffer_samples_contiguous_traces():
+    buffer_size, episode_length, trace_length = 8, 20, 5
+    buffer = ArrayExperienceBuffer(buffer_size)
+    for episode_idx in range(buffer_size):
+        buffer.add(make_episode(episode_idx, episode_length))
+
+    rewards = np.reshape(buffer.sample(buffer_size, trace_length)[:, 2], (buffer_size, trace_length))
+    episode_idx, step = np.divmod(rewards, 100)
+    np.testing.assert_array_equal(episode_idx, np.repeat(np.arange(buffer_size)[:, np.newaxis], trace_length, 1))
+    np.testing.assert_array_equal(np.diff(step, axis=1), 1)
+    assert np.all(step[:, -1] < episode_length)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from marltoolbox.algos.lola.utils import get_monte_carlo
+
+
+def get_monte_carlo_reference(reward, y, trace_length, batch_size):
+    reward = np.reshape(reward, (batch_size, trace_length))
+    discounted_reward = np.zeros((batch_size, trace_length))
+    for t in range(trace_length):
+        discount = np.power(y, np.arange(trace_length - t))
+        discounted_reward[:, t] = np.sum(reward[:, t:] * discount, axis=1)
+    return np.reshape(discounted_reward, (batch_size * trace_length))
+
+
+def test_get_monte_carlo():
+    batch_size = 8
+    for trace_length in [1, 2, 20, 150]:
+        for y in [0.0, 0.5, 0.96, 1.0]:
+            reward = np.random.randn(batch_size * trace_length)
+            np.testing.assert_allclose(get_monte_carlo(reward, y, trace_length, batch_size),
+                                       get_monte_carlo_reference(reward, y, trace_length, batch_size),
+                                       rtol=1e-10, atol=1e-10)
@@ -0,0 +1,45 @@
+# Run this directly with
+# python file_path.py
+
+import functools
+import timeit
+
+import tensorflow as tf
+
+from marltoolbox.algos.lola_dice import envs as lola_dice_envs
+from marltoolbox.algos.lola_dice.policy import SimplePolicy, MLPPolicy, RecurrentPolicy, ConvPolicy, act_all
+from marltoolbox.algos.lola_dice.rpg import build_rollout_policies
+
+
+def make_policy(PolicyClass, ob_size, num_actions, prev=None, batch_size=64):
+    if PolicyClass is SimplePolicy:
+        return SimplePolicy(ob_size, num_actions, prev=prev)
+    return PolicyClass(ob_size, num_actions, prev=prev, batch_size=batch_size)
+
+
+def measure_act_all(PolicyClass, batch_size=64, n_agents=2, number=200):
+    tf.reset_default_graph()
+    if PolicyClass is ConvPolicy:
+        env = lola_dice_envs.CG(max_steps=150, batch_size=batch_size, grid_size=3)
+        env.seed(0)
+    else:
+        env = lola_dice_envs.IPD(max_steps=150, batch_size=batch_size)
+    policies = build_rollout_policies(env, functools.partial(make_policy, PolicyClass), "rollout",
+                                      n_agents=n_agents)
+    obs, info = env.reset()
+    info = info["available_actions"]
+
+    with tf.Session() as sess:
+        sess.run(tf.global_variables_initializer())
+        per_policy_time = timeit.timeit(
+            lambda: [pi.act(o, i, sess) for pi, o, i in zip(policies, obs, info)], number=number) / number
+        act_all_time = timeit.timeit(lambda: act_all(policies, obs, info, sess), number=number) / number
+    print(f"{PolicyClass.__name__}, batch_size {batch_size}: "
+          f"per-policy act {per_policy_time * 1000:.2f} ms, act_all {act_all_time * 1000:.2f} ms, "
+          f"speedup x{per_policy_time / act_all_time:.1f}")
+
+
+if __name__ == "__main__":
+    for PolicyClass in [SimplePolicy, MLPPolicy, RecurrentPolicy, ConvPolicy]:
+        for batch_size in [64, 1024]:
+            measure_act_all(PolicyClass, batch_size)
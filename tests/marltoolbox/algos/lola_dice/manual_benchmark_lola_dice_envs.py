@@ -0,0 +1,67 @@
+# Run this directly with
+# python file_path.py
+
+import timeit
+
+import numpy as np
+
+from marltoolbox.algos.lola_dice import envs as lola_dice_envs
+from marltoolbox.algos.lola_dice.train_tune_class_API import LOLADICE
+from marltoolbox.examples.tune_class_api import lola_dice_official
+
+BATCH_SIZES = [64, 128, 256, 512, 1024]
+
+
+def init_env(env_name, batch_size, max_steps, grid_size=3):
+    if env_name == "IPD":
+        return lola_dice_envs.IPD(max_steps=max_steps, batch_size=batch_size)
+    env = getattr(lola_dice_envs, env_name)(max_steps, batch_size, grid_size)
+    env.seed(0)
+    return env
+
+
+def play_random_rollout(env):
+    env.reset()
+    done = False
+    while not done:
+        actions = [np.random.randint(env.NUM_ACTIONS, size=env.batch_size) for _ in range(env.NUM_AGENTS)]
+        _, _, done, _ = env.step(actions)
+
+
+def measure_env_rollout(env_name, max_steps=150, number=5):
+    for batch_size in BATCH_SIZES:
+        env = init_env(env_name, batch_size, max_steps)
+        play_random_rollout(env)
+        duration = timeit.timeit(lambda: play_random_rollout(env), number=number) / number
+        print(f"{env_name} rollout of {max_steps} steps, batch_size {batch_size}: {duration * 1000:.1f} ms")
+
+
+def measure_lola_dice_step(env_name, trace_length=150, number=3):
+    phases = ["value_fit", "inner_rollouts", "outer_rollouts", "policy_updates"]
+    for batch_size in BATCH_SIZES:
+        for batch_rollouts in [False, True]:
+            hp = {
+                "env": env_name, "gamma": None, "trace_length": trace_length, "epochs": number + 1,
+                "lr_inner": .1, "lr_outer": .2, "lr_value": .1, "lr_om": .1, "inner_asymm": True, "n_agents": 2,
+                "n_inner_steps": 2, "batch_size": batch_size, "value_batch_size": 16, "value_epochs": 0,
+                "om_batch_size": 16, "om_epochs": 0, "grid_size": 3, "use_baseline": False, "use_dice": True,
+                "use_opp_modeling": False, "seed": 0, "batch_rollouts": batch_rollouts,
+            }
+            tune_config, _, _ = lola_dice_official.get_tune_config(hp)
+            trainer = LOLADICE(config=tune_config)
+            trainer.train()
+            phase_times = np.zeros(len(phases))
+            for _ in range(number):
+                results = trainer.train()
+                phase_times += [results[f"time_{phase}"] for phase in phases]
+            phase_times /= number
+            print(f"{env_name} LOLADICE.step(), batch_size {batch_size}, batch_rollouts {batch_rollouts}: "
+                  + ", ".join(f"{phase} {phase_time:.2f} s" for phase, phase_time in zip(phases, phase_times)))
+            trainer.stop()
+
+
+if __name__ == "__main__":
+    for env_name in ["IPD", "CG", "AsymCG"]:
+        measure_env_rollout(env_name)
+    for env_name in ["IPD", "CoinGame"]:
+        measure_lola_dice_step(env_name)
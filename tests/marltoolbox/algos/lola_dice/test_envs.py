@@ -0,0 +1,73 @@
+import numpy as np
+
+from marltoolbox.algos.lola_dice import envs as lola_dice_envs
+
+
+def test_matrix_games_rewards_and_observations():
+    batch_size = 16
+    for EnvClass in [lola_dice_envs.IPD, lola_dice_envs.IMP, lola_dice_envs.AsymBoS]:
+        env = EnvClass(max_steps=3, batch_size=batch_size)
+        obs, info = env.reset()
+        assert all(np.all(ob[:, -1] == 1) for ob in obs)
+        assert len(info["available_actions"]) == 2
+        for t in range(3):
+            ac0, ac1 = np.random.randint(2, size=batch_size), np.random.randint(2, size=batch_size)
+            obs, rewards, done, info = env.step([ac0, ac1])
+            for i in range(batch_size):
+                assert obs[0][i].argmax() == ac0[i] * 2 + ac1[i]
+                assert obs[1][i].argmax() == ac1[i] * 2 + ac0[i]
+                if EnvClass is lola_dice_envs.IPD:
+                    expected = [env.payout_mat[ac1[i]][ac0[i]], env.payout_mat[ac0[i]][ac1[i]]]
+                elif EnvClass is lola_dice_envs.IMP:
+                    expected = [env.payout_mat[ac1[i]][ac0[i]], -env.payout_mat[ac1[i]][ac0[i]]]
+                else:
+                    expected = [env.payout_mat_ag_0[ac1[i]][ac0[i]], env.payout_mat_ag_1[ac1[i]][ac0[i]]]
+                assert [rewards[0][i], rewards[1][i]] == expected
+            assert done == (t == 2)
+
+
+def assert_state_matches_positions(env, state):
+    for i in range(env.batch_size):
+        assert state[i, 0, env.red_pos[i][0], env.red_pos[i][1]] == 1
+        assert state[i, 1, env.blue_pos[i][0], env.blue_pos[i][1]] == 1
+        coin_channel = 2 if env.red_coin[i] else 3
+        assert state[i, coin_channel, env.coin_pos[i][0], env.coin_pos[i][1]] == 1
+        assert state[i].sum() == 3
+        assert not (env.coin_pos[i] == env.red_pos[i]).all()
+        assert not (env.coin_pos[i] == env.blue_pos[i]).all()
+
+
+def test_coin_games_rewards_and_observations():
+    batch_size, max_steps = 32, 20
+    for EnvClass, red_pick_own, red_coin_picked_by_blue in [(lola_dice_envs.CG, 1, -2),
+                                                             (lola_dice_envs.AsymCG, 2, -1)]:
+        for grid_size in [3, 4]:
+            env = EnvClass(max_steps, batch_size, grid_size)
+            env.seed(0)
+            obs, info = env.reset()
+            assert obs[0].shape == (batch_size, 4, grid_size, grid_size)
+            assert_state_matches_positions(env, obs[0])
+
+            for t in range(max_steps):
+                red_pos, blue_pos = env.red_pos.copy(), env.blue_pos.copy()
+                coin_pos, red_coin = env.coin_pos.copy(), env.red_coin.copy()
+                actions = [np.random.randint(4, size=batch_size), np.random.randint(4, size=batch_size)]
+                obs, rewards, done, info = env.step(actions)
+                assert_state_matches_positions(env, obs[0])
+                np.testing.assert_array_equal(obs[0], obs[1])
+
+                for i in range(batch_size):
+                    new_red_pos = (red_pos[i] + env.MOVES[actions[0][i]]) % grid_size
+                    new_blue_pos = (blue_pos[i] + env.MOVES[actions[1][i]]) % grid_size
+                    np.testing.assert_array_equal(env.red_pos[i], new_red_pos)
+                    np.testing.assert_array_equal(env.blue_pos[i], new_blue_pos)
+                    red_pick = (new_red_pos == coin_pos[i]).all()
+                    blue_pick = (new_blue_pos == coin_pos[i]).all()
+                    if red_coin[i]:
+                        expected = [red_pick_own * red_pick + red_coin_picked_by_blue * blue_pick, blue_pick]
+                    else:
+                        expected = [red_pick, blue_pick - 2 * red_pick]
+                    assert [rewards[0][i], rewards[1][i]] == expected
+                    assert env.red_coin[i] == (1 - red_coin[i] if red_pick or blue_pick else red_coin[i])
+                assert len(info["available_actions"]) == 2
+                assert done == (t == max_steps - 1)
@@ -0,0 +1,175 @@
+import numpy as np
+
+from marltoolbox.algos.lola_dice import rpg
+from marltoolbox.algos.lola_dice.rpg import rollout, batched_rollouts, build_batched_parent_feed_dict
+from marltoolbox.algos.lola_dice.train_tune_class_API import LOLADICE
+from marltoolbox.examples.tune_class_api import lola_dice_official
+
+
+def init_trainer(env="IPD", batch_rollouts=False):
+    hp = {
+        "env": env,
+        "gamma": None,
+        "trace_length": 5,
+        "epochs": 10,
+        "lr_inner": .1,
+        "lr_outer": .2,
+        "lr_value": .1,
+        "lr_om": .1,
+        "inner_asymm": True,
+        "n_agents": 2,
+        "n_inner_steps": 2,
+        "batch_size": 4,
+        "value_batch_size": 4,
+        "value_epochs": 1,
+        "om_batch_size": 4,
+        "om_epochs": 0,
+        "grid_size": 3,
+        "use_baseline": False,
+        "use_dice": True,
+        "use_opp_modeling": False,
+        "seed": 0,
+        "batch_rollouts": batch_rollouts,
+    }
+    tune_config, _, _ = lola_dice_official.get_tune_config(hp)
+    return LOLADICE(config=tune_config)
+
+
+def test_graph_size_constant_after_first_step():
+    for batch_rollouts in [False, True]:
+        trainer = init_trainer(batch_rollouts=batch_rollouts)
+        trainer.train()
+        n_ops = len(trainer.sess.graph.get_operations())
+        for _ in range(3):
+            trainer.train()
+            assert len(trainer.sess.graph.get_operations()) == n_ops
+        trainer.stop()
+
+
+def test_batched_rollouts_report_same_metrics():
+    for env in ["IPD", "CoinGame"]:
+        results = {}
+        for batch_rollouts in [False, True]:
+            trainer = init_trainer(env, batch_rollouts=batch_rollouts)
+            results[batch_rollouts] = trainer.train()
+            trainer.stop()
+        assert results[False].keys() == results[True].keys()
+        for phase in ["value_fit", "inner_rollouts", "outer_rollouts", "policy_updates"]:
+            assert results[True][f"time_{phase}"] >= 0.0
+
+
+def assert_same_trace_structure(traces, expected_traces):
+    assert len(traces) == len(expected_traces)
+    for policy_trace, expected_policy_trace in zip(traces, expected_traces):
+        assert len(policy_trace) == len(expected_policy_trace)
+        # obs, acs, rets, values
+        for values, expected_values in zip(policy_trace[:4], expected_policy_trace[:4]):
+            assert values.shape == expected_values.shape
+
+
+def test_batched_rollouts_same_traces_structure_as_sequential_rollouts():
+    trainer = init_trainer(batch_rollouts=True)
+    policies, gamma = trainer.policies, trainer.gamma
+
+    # Inner step (lookahead steps)
+    batched_inner_traces, _ = trainer._batched_inner_rollouts()
+    inner_traces = []
+    for k in range(trainer.n_agents):
+        parent_traces = []
+        for m in range(trainer.n_inner_steps):
+            policies_k = [policies[k].parents[m]] + [opp.parents[m] for opp in policies[k].opponents]
+            traces, _ = rollout(trainer.env, policies_k, trainer.rollout_policies, trainer.sess,
+                                gamma=gamma, parent_traces=parent_traces)
+            parent_traces.append(traces)
+        inner_traces.append(parent_traces)
+
+    assert len(batched_inner_traces) == len(inner_traces) == trainer.n_agents
+    for k in range(trainer.n_agents):
+        assert len(batched_inner_traces[k]) == len(inner_traces[k]) == trainer.n_inner_steps
+        for m in range(trainer.n_inner_steps):
+            assert_same_trace_structure(batched_inner_traces[k][m], inner_traces[k][m])
+
+    # Outer step
+    policies_list = [[policies[k]] + policies[k].opponents for k in range(trainer.n_agents)]
+    batched_outer_traces, _ = batched_rollouts(
+        trainer.batched_envs, policies_list, trainer.batched_rollout_policies, trainer.sess,
+        gamma=gamma, parent_traces_list=batched_inner_traces)
+    for k in range(trainer.n_agents):
+        traces, _ = rollout(trainer.env, policies_list[k], trainer.rollout_policies, trainer.sess,
+                            gamma=gamma, parent_traces=inner_traces[k])
+        assert_same_trace_structure(batched_outer_traces[k], traces)
+
+    # The parent placeholders of the different agents never collide in the merged feed_dict
+    parent_placeholders = [
+        set(build_batched_parent_feed_dict([policies], [parent_traces], gamma=gamma))
+        for policies, parent_traces in zip(policies_list, batched_inner_traces)]
+    feed_dict = build_batched_parent_feed_dict(policies_list, batched_inner_traces, gamma=gamma)
+    assert len(feed_dict) == sum(len(placeholders) for placeholders in parent_placeholders)
+    for k in range(trainer.n_agents):
+        for other_k in range(k + 1, trainer.n_agents):
+            assert parent_placeholders[k].isdisjoint(parent_placeholders[other_k])
+    trainer.stop()
+
+
+def act_all_greedy(policies, obs, infos, sess, parent_feed_list=[]):
+    """Same as policy.act_all, but with the most probable actions (deterministic)"""
+    feed_list = sum([
+        [(pi.obs_ph, [ob]), (pi.avail_acs_ph, [info['available_actions']])]
+        for pi, ob, info in zip(policies, obs, infos)], []) + parent_feed_list
+    log_pis = sess.run([pi.log_pi for pi in policies], feed_dict=dict(feed_list))
+    return [np.argmax(log_pi[0], axis=-1) for log_pi in log_pis]
+
+
+def get_parameters(rollout_policies, sess):
+    return sess.run(sum([pi.parameters for pi in rollout_policies], []))
+
+
+def assert_same_traces(traces, expected_traces):
+    assert len(traces) == len(expected_traces)
+    for policy_trace, expected_policy_trace in zip(traces, expected_traces):
+        # obs, acs, rets, values
+        for values, expected_values in zip(policy_trace[:4], expected_policy_trace[:4]):
+            np.testing.assert_allclose(values, expected_values)
+
+
+def assert_same_parameters(parameters, expected_parameters):
+    assert len(parameters) == len(expected_parameters)
+    for param, expected_param in zip(parameters, expected_parameters):
+        np.testing.assert_allclose(param, expected_param, rtol=1e-6)
+
+
+def test_batched_rollouts_identical_to_sequential_rollouts(monkeypatch):
+    # With greedy actions, the rollouts in the (deterministic) IPD only depend on the parameters of the policies
+    monkeypatch.setattr(rpg, "act_all", act_all_greedy)
+    trainer = init_trainer(batch_rollouts=True)
+    policies, gamma, sess = trainer.policies, trainer.gamma, trainer.sess
+
+    # The batched rollout policies hold the parameters copied for the last rollout of each agent
+    batched_inner_traces, _ = trainer._batched_inner_rollouts()
+    batched_inner_parameters = [get_parameters(rollout_policies, sess)
+                                for rollout_policies in trainer.batched_rollout_policies]
+    batched_outer_traces, _ = batched_rollouts(
+        trainer.batched_envs, [[policies[k]] + policies[k].opponents for k in range(trainer.n_agents)],
+        trainer.batched_rollout_policies, sess, gamma=gamma, parent_traces_list=batched_inner_traces)
+    batched_outer_parameters = [get_parameters(rollout_policies, sess)
+                                for rollout_policies in trainer.batched_rollout_policies]
+
+    for k in range(trainer.n_agents):
+        parent_traces = []
+        for m in range(trainer.n_inner_steps):
+            policies_k = [policies[k].parents[m]] + [opp.parents[m] for opp in policies[k].opponents]
+            traces, _ = rollout(trainer.env, policies_k, trainer.rollout_policies, sess,
+                                gamma=gamma, parent_traces=parent_traces)
+            assert_same_traces(batched_inner_traces[k][m], traces)
+            parent_traces.append(traces)
+        assert_same_parameters(batched_inner_parameters[k], get_parameters(trainer.rollout_policies, sess))
+
+        traces, _ = rollout(trainer.env, [policies[k]] + policies[k].opponents, trainer.rollout_policies, sess,
+                            gamma=gamma, parent_traces=parent_traces)
+        assert_same_traces(batched_outer_traces[k], traces)
+        assert_same_parameters(batched_outer_parameters[k], get_parameters(trainer.rollout_policies, sess))
+
+    # The parameters of the agents at the lookahead steps differ (otherwise mixing them up would not be detected)
+    assert any(not np.allclose(param, other_param) for param, other_param in
+               zip(batched_inner_parameters[0], batched_inner_parameters[1]))
+    trainer.stop()
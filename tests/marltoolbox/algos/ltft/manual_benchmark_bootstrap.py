@@ -0,0 +1,37 @@
+# Run this directly with
+# python file_path.py
+
+import timeit
+
+import numpy as np
+
+from marltoolbox.algos.ltft.ltft_torch_policy import bootstrap_replicates_sums
+
+
+def object_array_bootstrap_sums(data, n_replicates, n_steps_in_replicates):
+    """Previous implementation: replicates gathered from an object array and summed with Python objects"""
+    data_array = np.array(list(data), dtype=object)
+    bstrap_idx = np.random.randint(0, data_array.shape[0], size=(n_replicates, n_steps_in_replicates))
+    bstrap_replts_data = data_array[bstrap_idx]
+    return bstrap_replts_data[:, :, 0].sum(axis=1), bstrap_replts_data[:, :, 1].sum(axis=1)
+
+
+def measure_bootstrap(n_replicates, n_steps_in_replicates=20, length_of_history=200, number=5):
+    data = np.random.normal(size=(length_of_history, 2)).tolist()
+    rng = np.random.default_rng(seed=0)
+    object_time = timeit.timeit(
+        lambda: object_array_bootstrap_sums(data, n_replicates, n_steps_in_replicates), number=number) / number
+    vectorized_time = timeit.timeit(
+        lambda: bootstrap_replicates_sums(data, n_replicates, n_steps_in_replicates), number=number) / number
+    generator_time = timeit.timeit(
+        lambda: bootstrap_replicates_sums(data, n_replicates, n_steps_in_replicates, rng=rng),
+        number=number) / number
+    print(f"{n_replicates} replicates: object array {object_time * 1e3:.2f} ms, "
+          f"vectorized {vectorized_time * 1e3:.2f} ms (x{object_time / vectorized_time:.1f}), "
+          f"vectorized with a np.random.Generator {generator_time * 1e3:.2f} ms "
+          f"(x{object_time / generator_time:.1f})")
+
+
+if __name__ == "__main__":
+    for n_replicates in [1000, 10000, 100000]:
+        measure_bootstrap(n_replicates)
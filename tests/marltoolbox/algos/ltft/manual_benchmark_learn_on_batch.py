@@ -0,0 +1,48 @@
+# Run this directly with
+# python file_path.py
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from marltoolbox.algos.ltft.ltft_torch_policy import LTFTTorchPolicy
+from marltoolbox.envs.coin_game import CoinGame
+from test_ltft_torch_policy import init_ltft, generate_fake_training_batch
+
+
+class LTFTWithCopiedBatches(LTFTTorchPolicy):
+    """Previous behavior: each nested policy is trained on its own copy of the batch"""
+
+    def _modify_batch_for_policy(self, policy_n, samples):
+        return super()._modify_batch_for_policy(policy_n, samples.copy())
+
+
+def measure_learn_on_batch(policy_class, batch_size, number=10, seed=0):
+    """
+    :return: mean time of learn_on_batch and peak of the memory allocated (traced by tracemalloc, which includes
+        the numpy arrays but not the torch tensors) during learn_on_batch
+    """
+    np.random.seed(seed)
+    ltft_policy, env, _ = init_ltft({}, CoinGame, {"max_steps": 20, "grid_size": 3}, policy_class=policy_class)
+    samples = generate_fake_training_batch(env, batch_size)
+    ltft_policy.learn_on_batch(samples)
+
+    total_time, peak_memory = 0.0, 0
+    for _ in range(number):
+        tracemalloc.start()
+        start = time.perf_counter()
+        ltft_policy.learn_on_batch(samples)
+        total_time += time.perf_counter() - start
+        peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return total_time / number, peak_memory
+
+
+if __name__ == "__main__":
+    for batch_size in [256, 4096, 32768]:
+        copy_time, copy_peak = measure_learn_on_batch(LTFTWithCopiedBatches, batch_size)
+        view_time, view_peak = measure_learn_on_batch(LTFTTorchPolicy, batch_size)
+        print(f"Coin Game batch_size {batch_size}: learn_on_batch with copied batches {copy_time * 1e3:.1f} ms "
+              f"(peak {copy_peak / 2 ** 20:.1f} MiB), with shared read-only views {view_time * 1e3:.1f} ms "
+              f"(peak {view_peak / 2 ** 20:.1f} MiB)")
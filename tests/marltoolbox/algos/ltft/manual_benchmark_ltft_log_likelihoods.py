@@ -0,0 +1,60 @@
+# Run this directly with
+# python file_path.py
+
+import time
+
+import numpy as np
+
+from marltoolbox.envs.coin_game import CoinGame
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from test_ltft_torch_policy import init_ltft
+
+
+def measure_step_latency(EnvClass, env_config, policy_config_update, n_episodes=20, seed=0):
+    """
+    Mean time of one step of LTFT: computing its action and processing the action of the opponent (the time
+    spent at the end of the episodes is included, averaged over the steps).
+    """
+    np.random.seed(seed)
+    ltft_policy, env, preprocessor = init_ltft(policy_config_update, EnvClass, env_config)
+    own_id, opp_id = env.players_ids
+
+    n_steps, total_time = 0, 0.0
+    for _ in range(n_episodes):
+        obs = env.reset()
+        done = False
+        while not done:
+            start = time.perf_counter()
+            own_action = ltft_policy.compute_actions([preprocessor.transform(obs[own_id])])[0][0]
+            total_time += time.perf_counter() - start
+
+            opp_obs = preprocessor.transform(obs[opp_id])
+            opp_action = np.random.randint(env.NUM_ACTIONS)
+            obs, _, done, _ = env.step({own_id: own_action, opp_id: opp_action})
+            done = done["__all__"]
+
+            start = time.perf_counter()
+            ltft_policy.on_episode_step(opp_obs, opp_action, being_punished_by_LE=False)
+            total_time += time.perf_counter() - start
+            n_steps += 1
+        start = time.perf_counter()
+        ltft_policy.on_episode_end()
+        total_time += time.perf_counter() - start
+    return total_time / n_steps
+
+
+if __name__ == "__main__":
+    modes = [
+        ("one forward pass per step", {}),
+        ("batched every 10 steps", {"batch_log_likelihood_computations": True,
+                                    "log_likelihood_computation_interval": 10}),
+        ("batched at episode end", {"batch_log_likelihood_computations": True}),
+    ]
+    for EnvClass, env_config in [(IteratedPrisonersDilemma, {"max_steps": 100}),
+                                 (CoinGame, {"max_steps": 100, "grid_size": 3})]:
+        reference = None
+        for name, policy_config_update in modes:
+            latency = measure_step_latency(EnvClass, env_config, policy_config_update)
+            reference = latency if reference is None else reference
+            print(f"{EnvClass.__name__}: LTFT step latency with log-likelihoods {name} {latency * 1e6:.0f} us "
+                  f"(speedup x{reference / latency:.1f})")
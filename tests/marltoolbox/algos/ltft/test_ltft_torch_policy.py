@@ -0,0 +1,168 @@
+import copy
+
+import numpy as np
+import pytest
+from ray.rllib.agents.dqn import DQNTorchPolicy
+from ray.rllib.agents.dqn.dqn_tf_policy import PRIO_WEIGHTS
+from ray.rllib.models import ModelCatalog
+from ray.rllib.policy.sample_batch import SampleBatch
+from ray.rllib.utils import merge_dicts
+
+from marltoolbox.algos.ltft.ltft_torch_policy import LTFTTorchPolicy, LTFT_DEFAULT_CONFIG_UPDATE, \
+    bootstrap_replicates_sums
+from marltoolbox.algos.supervised_learning import SPLTorchPolicy
+from marltoolbox.envs.coin_game import CoinGame
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from marltoolbox.utils import postprocessing
+
+
+def init_ltft(policy_config_update={}, EnvClass=IteratedPrisonersDilemma, env_config={},
+              policy_class=LTFTTorchPolicy):
+    env = EnvClass(env_config)
+    policy_config = merge_dicts(
+        LTFT_DEFAULT_CONFIG_UPDATE,
+        {
+            'nested_policies': [
+                {"Policy_class": DQNTorchPolicy, "config_update": {}},
+                {"Policy_class": DQNTorchPolicy, "config_update": {}},
+                {"Policy_class": DQNTorchPolicy, "config_update": {}},
+                {"Policy_class": SPLTorchPolicy, "config_update": {"explore": False}},
+            ],
+        }
+    )
+    if EnvClass is CoinGame:
+        policy_config["model"] = {
+            "dim": env.grid_size,
+            "conv_filters": [[16, [3, 3], 1], [32, [3, 3], 1]],
+        }
+    policy_config.update(policy_config_update)
+    ltft_policy = policy_class(env.OBSERVATION_SPACE, env.ACTION_SPACE, copy.deepcopy(policy_config))
+    preprocessor = ModelCatalog.get_preprocessor_for_space(env.OBSERVATION_SPACE)
+    return ltft_policy, env, preprocessor
+
+
+def generate_opp_obs_and_actions(env, preprocessor, n_steps):
+    opp_obs, opp_actions = [], []
+    obs = env.reset()
+    opp_id = env.players_ids[1]
+    for _ in range(n_steps):
+        actions = {player_id: np.random.randint(env.NUM_ACTIONS) for player_id in env.players_ids}
+        opp_obs.append(preprocessor.transform(obs[opp_id]))
+        opp_actions.append(actions[opp_id])
+        obs, _, done, _ = env.step(actions)
+        if done["__all__"]:
+            obs = env.reset()
+    return opp_obs, opp_actions
+
+
+def generate_fake_training_batch(env, batch_size, punishing_prob=0.1):
+    obs_shape = (batch_size,) + env.OBSERVATION_SPACE.shape
+    return SampleBatch({
+        SampleBatch.CUR_OBS: np.random.randint(0, 2, size=obs_shape).astype(np.float32),
+        SampleBatch.NEXT_OBS: np.random.randint(0, 2, size=obs_shape).astype(np.float32),
+        SampleBatch.ACTIONS: np.random.randint(env.NUM_ACTIONS, size=batch_size),
+        SampleBatch.REWARDS: np.random.normal(size=batch_size).astype(np.float32),
+        SampleBatch.DONES: np.zeros(batch_size, dtype=bool),
+        PRIO_WEIGHTS: np.ones(batch_size, dtype=np.float32),
+        postprocessing.WELFARE_UTILITARIAN: np.random.normal(size=batch_size).astype(np.float32),
+        postprocessing.OPPONENT_NEGATIVE_REWARD: np.random.normal(size=batch_size).astype(np.float32),
+        postprocessing.OPPONENT_ACTIONS: np.random.randint(env.NUM_ACTIONS, size=batch_size),
+        "punishing": np.random.random(batch_size) < punishing_prob,
+        "being_punished": np.random.random(batch_size) < punishing_prob,
+    })
+
+
+@pytest.mark.parametrize("log_likelihood_computation_interval", [None, 1, 3])
+def test_batched_log_likelihoods_identical_to_per_step_log_likelihoods(log_likelihood_computation_interval):
+    np.random.seed(0)
+    ltft_policy, env, preprocessor = init_ltft()
+    batched_ltft_policy, _, _ = init_ltft({
+        "batch_log_likelihood_computations": True,
+        "log_likelihood_computation_interval": log_likelihood_computation_interval,
+    })
+    batched_ltft_policy.set_weights(ltft_policy.get_weights())
+
+    n_steps = 10
+    for opp_obs, opp_a in zip(*generate_opp_obs_and_actions(env, preprocessor, n_steps)):
+        ltft_policy.on_episode_step(opp_obs, opp_a, being_punished_by_LE=False)
+        batched_ltft_policy.on_episode_step(opp_obs, opp_a, being_punished_by_LE=False)
+    ltft_policy.on_episode_end()
+    batched_ltft_policy.on_episode_end()
+
+    assert len(batched_ltft_policy.opp_obs_actions_buffer) == 0
+    assert len(batched_ltft_policy.data_queue) == n_steps
+    np.testing.assert_allclose(np.array(batched_ltft_policy.data_queue), np.array(ltft_policy.data_queue),
+                               rtol=1e-5, atol=1e-6)
+
+
+def test_bootstrap_replicates_sums():
+    n_data_steps, n_replicates, n_steps_in_replicates = 30, 1000, 20
+    data = [[float(step), -float(step)] for step in range(n_data_steps)]
+
+    replicates_sums = bootstrap_replicates_sums(data, n_replicates, n_steps_in_replicates)
+    assert replicates_sums.shape == (2, n_replicates)
+    assert replicates_sums.dtype == np.float64
+    np.testing.assert_array_equal(replicates_sums[1], -replicates_sums[0])
+    assert replicates_sums[0].min() >= 0
+    assert replicates_sums[0].max() <= (n_data_steps - 1) * n_steps_in_replicates
+
+    # Only the last step
+    replicates_sums = bootstrap_replicates_sums(data, n_replicates, 1, last_step_is_mandatory=True)
+    np.testing.assert_array_equal(replicates_sums.T, [data[-1]] * n_replicates)
+
+    # Identical to gathering the whole replicates with the same indexes
+    bstrap_idx = np.random.default_rng(seed=0).integers(0, n_data_steps, size=(n_replicates, n_steps_in_replicates))
+    expected_sums = np.array(data)[bstrap_idx].sum(axis=1).T
+    for _ in range(2):
+        replicates_sums = bootstrap_replicates_sums(data, n_replicates, n_steps_in_replicates,
+                                                    rng=np.random.default_rng(seed=0))
+        np.testing.assert_allclose(replicates_sums, expected_sums)
+
+
+def test_compare_log_likelihood_with_seeded_bootstrap():
+    ltft_policy, _, _ = init_ltft({"bootstrap_seed": 0, "n_bootstrap_replicates": 200})
+    data = np.random.normal(size=(50, 2)).tolist()
+
+    percentile_value = ltft_policy._compare_log_likelihood_on_boostrapped_sequences(data)
+    log_lik_cooperate, log_lik_defect = bootstrap_replicates_sums(
+        data, 200, ltft_policy.n_steps_in_bootstrap_replicates, rng=np.random.default_rng(seed=0))
+    assert percentile_value == pytest.approx(np.percentile(log_lik_cooperate - log_lik_defect,
+                                                           ltft_policy.percentile_for_likelihood_test))
+
+
+def test_batches_of_nested_policies_share_the_data():
+    ltft_policy, env, _ = init_ltft()
+    samples = generate_fake_training_batch(env, batch_size=32, punishing_prob=0.0)
+    samples_before = samples.copy()
+
+    for policy_n in range(len(ltft_policy.algorithms)):
+        samples_view = ltft_policy._modify_batch_for_policy(policy_n, samples)
+        assert np.shares_memory(samples_view[SampleBatch.CUR_OBS], samples[SampleBatch.CUR_OBS])
+        assert not samples_view[SampleBatch.CUR_OBS].flags.writeable
+        with pytest.raises(ValueError):
+            samples_view[SampleBatch.CUR_OBS][0] = 0.0
+
+        if policy_n in (ltft_policy.COOP_POLICY_IDX, ltft_policy.COOP_OPP_POLICY_IDX):
+            np.testing.assert_array_equal(samples_view[SampleBatch.REWARDS],
+                                          samples[postprocessing.WELFARE_UTILITARIAN])
+        elif policy_n == ltft_policy.PUNITIVE_POLICY_IDX:
+            np.testing.assert_array_equal(samples_view[SampleBatch.REWARDS],
+                                          samples[postprocessing.OPPONENT_NEGATIVE_REWARD])
+        else:
+            np.testing.assert_array_equal(samples_view[SampleBatch.ACTIONS],
+                                          samples[postprocessing.OPPONENT_ACTIONS])
+
+    for key, value in samples_before.data.items():
+        np.testing.assert_array_equal(samples[key], value)
+
+
+def test_learn_on_batch_with_shared_data():
+    ltft_policy, env, _ = init_ltft()
+    samples = generate_fake_training_batch(env, batch_size=32)
+    samples_before = samples.copy()
+
+    learner_stats = ltft_policy.learn_on_batch(samples)
+
+    assert len(learner_stats["learner_stats"]) == len(ltft_policy.algorithms)
+    for key, value in samples_before.data.items():
+        np.testing.assert_array_equal(samples[key], value)
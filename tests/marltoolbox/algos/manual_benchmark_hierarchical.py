@@ -0,0 +1,53 @@
+# Run this directly with
+# python file_path.py
+
+import copy
+import timeit
+
+from marltoolbox.algos import amTFT
+from marltoolbox.algos.amTFT import base_policy
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from marltoolbox.utils.postprocessing import WELFARE_UTILITARIAN
+
+
+class amTFTWithFallbackOnEveryAccess(base_policy.amTFTPolicyBase):
+    """Previous behavior: __getattribute__ overridden, called on every attribute access"""
+
+    def __getattribute__(self, attr):
+        try:
+            return object.__getattribute__(self, attr)
+        except AttributeError as initial:
+            try:
+                return object.__getattribute__(self.algorithms[self.active_algo_idx], attr)
+            except AttributeError:
+                raise initial
+
+
+def init_amTFT_in_eval(policy_class):
+    policy_config = copy.deepcopy(amTFT.DEFAULT_CONFIG)
+    policy_config["welfare"] = WELFARE_UTILITARIAN
+    policy_config["working_state"] = base_policy.WORKING_STATES[2]
+    policy_config["verbose"] = 0
+    env = IteratedPrisonersDilemma({})
+    am_tft_policy = policy_class(env.OBSERVATION_SPACE, env.ACTION_SPACE, policy_config)
+    assert len(am_tft_policy.algorithms) == 4
+    return am_tft_policy, env
+
+
+def measure_compute_actions(policy_class, number=5000):
+    am_tft_policy, env = init_amTFT_in_eval(policy_class)
+    obs_batch = [env.OBSERVATION_SPACE.sample() for _ in range(1)]
+    step_time = timeit.timeit(lambda: am_tft_policy.compute_actions(obs_batch), number=number) / number
+    own_attribute_time = timeit.timeit(lambda: am_tft_policy.n_steps_to_punish, number=number * 10) / (number * 10)
+    nested_attribute_time = timeit.timeit(lambda: am_tft_policy.exploration, number=number * 10) / (number * 10)
+    return step_time, own_attribute_time, nested_attribute_time
+
+
+if __name__ == "__main__":
+    results = {name: measure_compute_actions(policy_class)
+               for name, policy_class in [("before", amTFTWithFallbackOnEveryAccess),
+                                          ("after", base_policy.amTFTPolicyBase)]}
+    for name, (step_time, own_attribute_time, nested_attribute_time) in results.items():
+        print(f"amTFT with 4 nested policies, {name}: compute_actions {1 / step_time:.0f} calls/s, "
+              f"own attribute access {own_attribute_time * 1e9:.0f} ns, "
+              f"fallback to the active nested policy {nested_attribute_time * 1e9:.0f} ns")
@@ -0,0 +1,40 @@
+# Run this directly with
+# python file_path.py
+
+import pathlib
+import tempfile
+import time
+
+import random
+
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from test_population import init_population, write_fake_checkpoints
+
+
+def measure_episode_start_latency(checkpoints, policy_id, weights_cache_max_bytes, n_episodes=500, seed=0):
+    """
+    Mean time of the switch of member done by PopulationOfIdenticalAlgoCallBacks at the start of every episode
+    (a random member is selected at each episode).
+    """
+    random.seed(seed)
+    population_policy = init_population(checkpoints, policy_id, {
+        "use_random_algo": True,
+        "use_algo_in_order": False,
+        "weights_cache_max_bytes": weights_cache_max_bytes,
+    })
+    start = time.perf_counter()
+    for _ in range(n_episodes):
+        population_policy.set_algo_to_use()
+    return (time.perf_counter() - start) / n_episodes
+
+
+if __name__ == "__main__":
+    env = IteratedPrisonersDilemma({})
+    policy_id = env.players_ids[1]
+    for n_members in [10, 100]:
+        with tempfile.TemporaryDirectory() as dir_path:
+            checkpoints = write_fake_checkpoints(pathlib.Path(dir_path), policy_id, n_members, env)
+            without_cache = measure_episode_start_latency(checkpoints, policy_id, weights_cache_max_bytes=0)
+            with_cache = measure_episode_start_latency(checkpoints, policy_id, weights_cache_max_bytes=1024 ** 3)
+        print(f"Population of {n_members} members: episode start latency without cache {without_cache * 1e3:.2f} ms, "
+              f"with cache {with_cache * 1e3:.2f} ms, speedup x{without_cache / with_cache:.1f}")
@@ -0,0 +1,95 @@
+import pickle
+
+import numpy as np
+from ray.rllib.agents.dqn import DQNTorchPolicy
+from ray.rllib.utils import merge_dicts
+
+from marltoolbox.algos import population
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+from marltoolbox.utils import restore
+
+
+def write_fake_checkpoints(dir_path, policy_id, n_checkpoints, env):
+    """Write RLLib-like checkpoints, each containing the state of a newly initialized DQNTorchPolicy"""
+    checkpoints = []
+    for i in range(n_checkpoints):
+        policy = DQNTorchPolicy(env.OBSERVATION_SPACE, env.ACTION_SPACE, {})
+        worker_state = {"state": {policy_id: policy.get_state()}, "filters": {}}
+        checkpoint_path = str(dir_path / f"checkpoint_{i}")
+        with open(checkpoint_path, "wb") as f:
+            pickle.dump({"worker": pickle.dumps(worker_state)}, f)
+        checkpoints.append(checkpoint_path)
+    return checkpoints
+
+
+def init_population(policy_checkpoints, policy_id, policy_config_update={}):
+    env = IteratedPrisonersDilemma({})
+    policy_config = merge_dicts(population.DEFAULT_CONFIG_UPDATE, {
+        "policy_checkpoints": policy_checkpoints,
+        "policy_id_to_load": policy_id,
+        "nested_policies": [{"Policy_class": DQNTorchPolicy, "config_update": {}}],
+        "use_random_algo": False,
+        "use_algo_in_order": True,
+    })
+    policy_config.update(policy_config_update)
+    return population.PopulationOfIdenticalAlgo(env.OBSERVATION_SPACE, env.ACTION_SPACE, policy_config)
+
+
+def load_checkpoint_weights(checkpoint_path, policy_id):
+    with open(checkpoint_path, "rb") as f:
+        objs = pickle.loads(pickle.load(f)["worker"])
+    state = objs["state"][policy_id]
+    return {k: v for k, v in state.items() if k != "_optimizer_variables"}
+
+
+def assert_same_weights(weights, expected_weights):
+    assert weights.keys() == expected_weights.keys()
+    for k in weights.keys():
+        np.testing.assert_array_equal(weights[k], expected_weights[k])
+
+
+def test_switching_member_reads_each_checkpoint_once(tmp_path, monkeypatch):
+    env = IteratedPrisonersDilemma({})
+    policy_id = env.players_ids[1]
+    checkpoints = write_fake_checkpoints(tmp_path, policy_id, n_checkpoints=3, env=env)
+
+    loaded_from_disk = []
+    load_one_policy_checkpoint = restore.load_one_policy_checkpoint
+
+    def load_and_count(*args, checkpoint_path, **kwargs):
+        loaded_from_disk.append(checkpoint_path)
+        return load_one_policy_checkpoint(*args, checkpoint_path=checkpoint_path, **kwargs)
+
+    monkeypatch.setattr(restore, "load_one_policy_checkpoint", load_and_count)
+    population_policy = init_population(checkpoints, policy_id)
+
+    for _ in range(3 * len(checkpoints)):
+        assert_same_weights(population_policy.get_weights(),
+                            load_checkpoint_weights(checkpoints[population_policy.active_checkpoint_idx], policy_id))
+        population_policy.set_algo_to_use()
+        population_policy.set_algo_to_use()
+    assert loaded_from_disk == checkpoints
+    assert len(population_policy.weights_cache) == len(checkpoints)
+
+
+def test_weights_cache_evicts_least_recently_used_within_memory_budget():
+    weights = {"w": np.zeros((10, 10), dtype=np.float32), "b": np.zeros(10, dtype=np.float32)}
+    n_bytes = population.weights_n_bytes(weights)
+    assert n_bytes == 440
+    assert population.weights_n_bytes({"nested": [weights, weights]}) == 2 * n_bytes
+
+    cache = population.WeightsLRUCache(max_bytes=2 * n_bytes)
+    cache.put("a", weights)
+    cache.put("b", weights)
+    assert cache.get("a") is weights
+    cache.put("c", weights)
+    assert "a" in cache and "b" not in cache and "c" in cache
+    assert cache.n_bytes == 2 * n_bytes
+
+    cache.put("c", weights)
+    assert len(cache) == 2 and cache.n_bytes == 2 * n_bytes
+
+    cache = population.WeightsLRUCache(max_bytes=n_bytes - 1)
+    cache.put("a", weights)
+    assert cache.get("a") is None
+    assert cache.n_bytes == 0
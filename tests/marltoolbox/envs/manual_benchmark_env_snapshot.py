@@ -0,0 +1,41 @@
+# Run this directly with
+# python file_path.py
+
+import copy
+import timeit
+
+import numpy as np
+
+from marltoolbox.envs import coin_game, vectorized_coin_game
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma
+
+
+def init_env(EnvClass, config, n_steps=10):
+    env = EnvClass(config)
+    env.seed(0)
+    env.reset()
+    batch_size = config.get("batch_size", None)
+    for _ in range(n_steps):
+        env.step({player_id: np.random.randint(env.NUM_ACTIONS, size=batch_size) if batch_size is not None
+                  else np.random.randint(env.NUM_ACTIONS) for player_id in env.players_ids})
+    return env
+
+
+def measure_snapshot_cost(name, env, number=2000):
+    deepcopy_time = timeit.timeit(lambda: copy.deepcopy(env), number=number) / number
+    get_state_time = timeit.timeit(env.get_state, number=number) / number
+    env_state = env.get_state()
+    set_state_time = timeit.timeit(lambda: env.set_state(env_state), number=number) / number
+    no_rng_time = timeit.timeit(lambda: env.get_state(with_rng_state=False), number=number) / number
+    print(f"{name}: deepcopy {deepcopy_time * 1e6:.1f} us, get_state {get_state_time * 1e6:.1f} us "
+          f"({no_rng_time * 1e6:.1f} us without the RNG state), set_state {set_state_time * 1e6:.1f} us, "
+          f"speedup (get_state + set_state) x{deepcopy_time / (get_state_time + set_state_time):.1f}")
+
+
+if __name__ == "__main__":
+    measure_snapshot_cost("IteratedPrisonersDilemma", init_env(IteratedPrisonersDilemma, {}))
+    measure_snapshot_cost("CoinGame", init_env(coin_game.CoinGame, {}))
+    for batch_size in [1, 64, 1024]:
+        measure_snapshot_cost(
+            f"vectorized CoinGame batch_size {batch_size}",
+            init_env(vectorized_coin_game.CoinGame, {"batch_size": batch_size, "force_vectorize": True}))
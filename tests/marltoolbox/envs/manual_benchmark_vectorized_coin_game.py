@@ -0,0 +1,69 @@
+# Run this directly with
+# python file_path.py
+
+import time
+
+import numpy as np
+
+from marltoolbox.envs.vectorized_coin_game import CoinGame, OBSERVATION_MODES, unpack_bit_packed_observations
+
+GRID_SIZES = [3, 4, 8, 16]
+BATCH_SIZES = [1, 16, 256, 4096]
+
+
+def measure_steps_per_sec(grid_size, batch_size, n_steps=200, env_config=None):
+    config = {"max_steps": n_steps, "batch_size": batch_size, "grid_size": grid_size,
+              "force_vectorize": True}
+    config.update(env_config or {})
+    env = CoinGame(config)
+    env.reset()
+    actions = {player_id: np.random.randint(env.NUM_ACTIONS, size=(n_steps + 1, batch_size))
+               for player_id in env.players_ids}
+
+    # The first step triggers the numba compilation
+    env.step({player_id: player_actions[0] for player_id, player_actions in actions.items()})
+    env.step_count_in_current_episode = 0
+
+    start = time.perf_counter()
+    for step_i in range(1, n_steps + 1):
+        env.step({player_id: player_actions[step_i] for player_id, player_actions in actions.items()})
+    elapsed = time.perf_counter() - start
+    return n_steps * batch_size / elapsed
+
+
+def measure_observation_modes(grid_size=3, batch_size=4096, n_steps=200):
+    """Size of the observations produced and rollout throughput, including the casting at the policy boundary."""
+    print(f"{'observation_mode':>17} {'obs bytes':>10} {'env steps/sec':>14}")
+    for observation_mode in OBSERVATION_MODES:
+        env = CoinGame({"max_steps": n_steps, "batch_size": batch_size, "grid_size": grid_size,
+                        "observation_mode": observation_mode})
+        obs = env.reset()
+        env.step({player_id: np.zeros(batch_size, dtype=np.int64) for player_id in env.players_ids})
+        env.step_count_in_current_episode = 0
+
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            actions = {player_id: np.random.randint(env.NUM_ACTIONS, size=batch_size)
+                       for player_id in env.players_ids}
+            obs, _, _, _ = env.step(actions)
+            for player_obs in obs.values():
+                if observation_mode == "bit_packed":
+                    player_obs = unpack_bit_packed_observations(player_obs)
+                player_obs.astype(np.float32)
+        elapsed = time.perf_counter() - start
+
+        obs_bytes = sum(player_obs.nbytes for player_obs in obs.values())
+        print(f"{observation_mode:>17} {obs_bytes:>10} {n_steps * batch_size / elapsed:>14.0f}")
+
+
+def main(env_config=None):
+    print(f"{'grid_size':>10} {'batch_size':>11} {'env steps/sec':>14}")
+    for grid_size in GRID_SIZES:
+        for batch_size in BATCH_SIZES:
+            steps_per_sec = measure_steps_per_sec(grid_size, batch_size, env_config=env_config)
+            print(f"{grid_size:>10} {batch_size:>11} {steps_per_sec:>14.0f}")
+    measure_observation_modes()
+
+
+if __name__ == "__main__":
+    main()
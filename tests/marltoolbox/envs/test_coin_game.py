@@ -451,3 +451,35 @@ def test_observations_are_invariant_to_the_player_trained():
 
             overwrite_pos(env, p_red_pos[step_i], p_blue_pos[step_i], c_red_pos[step_i],
                           c_blue_pos[step_i])
+
+
+def play_actions(env, actions_list):
+    return [env.step(actions) for actions in actions_list]
+
+
+def test_get_and_set_state():
+    max_steps, grid_size = 20, 3
+    coin_game = init_env(max_steps, CoinGame, grid_size=grid_size)
+    asymm_coin_game = init_env(max_steps, AsymCoinGame, grid_size=grid_size)
+
+    for env in [coin_game, asymm_coin_game]:
+        env.reset()
+        play_actions(env, [{policy_id: random.randint(0, env.NUM_ACTIONS - 1) for policy_id in env.players_ids}
+                           for _ in range(5)])
+        env_state = env.get_state()
+        actions_list = [{policy_id: random.randint(0, env.NUM_ACTIONS - 1) for policy_id in env.players_ids}
+                        for _ in range(max_steps - 5)]
+        results = play_actions(env, actions_list)
+        assert results[-1][2]["__all__"]
+
+        # The same snapshot can be restored several times
+        for _ in range(2):
+            env.set_state(env_state)
+            assert_logger_buffer_size(env, n_steps=5)
+            for (obs, reward, done, info), (obs_replay, reward_replay, done_replay, info_replay) in zip(
+                    results, play_actions(env, actions_list)):
+                for policy_id in env.players_ids:
+                    assert (obs[policy_id] == obs_replay[policy_id]).all()
+                assert reward == reward_replay
+                assert done == done_replay
+                assert info == info_replay
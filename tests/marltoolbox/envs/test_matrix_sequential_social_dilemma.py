@@ -253,3 +253,25 @@ def test_observations_are_invariant_to_the_player_trained():
             elif step_i == 4:
                 assert obs[env.players_ids[0]] == obs_step_3[env.players_ids[1]]
                 assert obs[env.players_ids[1]] == obs_step_3[env.players_ids[0]]
+
+
+def test_get_and_set_state():
+    max_steps = 20
+    env_class_all = [IteratedPrisonersDilemma, IteratedChicken, IteratedStagHunt, IteratedBoS]
+    env_all = [init_env(max_steps, env_class) for env_class in env_class_all]
+
+    for env in env_all:
+        env.reset()
+        for _ in range(5):
+            env.step({policy_id: random.randint(0, env.NUM_ACTIONS - 1) for policy_id in env.players_ids})
+        env_state = env.get_state()
+        actions_list = [{policy_id: random.randint(0, env.NUM_ACTIONS - 1) for policy_id in env.players_ids}
+                        for _ in range(max_steps - 5)]
+        results = [env.step(actions) for actions in actions_list]
+        assert results[-1][2]["__all__"]
+
+        # The same snapshot can be restored several times
+        for _ in range(2):
+            env.set_state(env_state)
+            assert_logger_buffer_size_two_players(env, n_steps=5)
+            assert [env.step(actions) for actions in actions_list] == results
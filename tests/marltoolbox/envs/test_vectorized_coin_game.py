@@ -1,12 +1,12 @@
 import copy
 import random
 
+import numba
 import numpy as np
 
-from marltoolbox.envs.vectorized_coin_game import CoinGame, AsymCoinGame
+from marltoolbox.envs.vectorized_coin_game import CoinGame, AsymCoinGame, unpack_bit_packed_observations
 
 
-# TODO add tests for grid_size != 3
 # TODO add tests for position in episode in 5th
 
 def init_env(max_steps, batch_size, env_class, seed=None, grid_size=3):
@@ -113,6 +113,33 @@ def test_multiple_episodes():
                 step_i = 0
 
 
+def test_multiple_episodes_with_larger_grids():
+    max_steps, batch_size = 20, 100
+    n_steps = int(max_steps * 2.25)
+
+    for grid_size in [4, 5, 8]:
+        coin_game = init_env(max_steps, batch_size, CoinGame, grid_size=grid_size)
+        asymm_coin_game = init_env(max_steps, batch_size, AsymCoinGame, grid_size=grid_size)
+
+        for env in [coin_game, asymm_coin_game]:
+            obs = env.reset()
+            check_obs(obs, batch_size, grid_size)
+
+            step_i = 0
+            for _ in range(n_steps):
+                step_i += 1
+                actions = {policy_id: [random.randint(0, env.NUM_ACTIONS - 1) for _ in range(batch_size)]
+                           for policy_id in env.players_ids}
+                obs, reward, done, info = env.step(actions)
+                check_obs(obs, batch_size, grid_size)
+                assert not (env.coin_pos == env.red_pos).all(axis=1).any()
+                assert not (env.coin_pos == env.blue_pos).all(axis=1).any()
+                if done["__all__"]:
+                    obs = env.reset()
+                    check_obs(obs, batch_size, grid_size)
+                    step_i = 0
+
+
 def overwrite_pos(batch_size, env, p_red_pos, p_blue_pos, c_red_pos, c_blue_pos):
     assert c_red_pos is None or c_blue_pos is None
     if c_red_pos is None:
@@ -471,6 +498,40 @@ def test_get_and_set_env_state():
                 step_i = 0
 
 
+def test_get_and_set_state():
+    max_steps, batch_size, grid_size = 20, 16, 3
+    coin_game = init_env(max_steps, batch_size, CoinGame, grid_size=grid_size)
+    asymm_coin_game = init_env(max_steps, batch_size, AsymCoinGame, grid_size=grid_size)
+
+    def random_actions(env):
+        return {policy_id: [random.randint(0, env.NUM_ACTIONS - 1) for _ in range(batch_size)]
+                for policy_id in env.players_ids}
+
+    for env in [coin_game, asymm_coin_game]:
+        env.reset()
+        for _ in range(5):
+            env.step(random_actions(env))
+        env_state = env.get_state()
+        # The coins are placed with the global numpy RNG
+        rng_state = np.random.get_state()
+        actions_list = [random_actions(env) for _ in range(max_steps - 5)]
+        results = [env.step(actions) for actions in actions_list]
+        assert results[-1][2]["__all__"]
+
+        # The same snapshot can be restored several times
+        for _ in range(2):
+            env.set_state(env_state)
+            np.random.set_state(rng_state)
+            assert_logger_buffer_size(env, n_steps=5)
+            for (obs, reward, done, info), actions in zip(results, actions_list):
+                obs_replay, reward_replay, done_replay, info_replay = env.step(actions)
+                for policy_id in env.players_ids:
+                    assert (obs[policy_id] == obs_replay[policy_id]).all()
+                    assert (reward[policy_id] == reward_replay[policy_id]).all()
+                assert_nested_equal(done, done_replay)
+                assert info == info_replay
+
+
 def test_observations_are_invariant_to_the_player_trained():
     p_red_pos = [[0, 0], [0, 0], [1, 1], [1, 1], [0, 0], [1, 1], [2, 0], [0, 1], [2, 2], [1, 2]]
     p_blue_pos = [[0, 0], [0, 0], [1, 1], [1, 1], [1, 1], [0, 0], [0, 1], [2, 0], [1, 2], [2, 2]]
@@ -506,3 +567,130 @@ def test_observations_are_invariant_to_the_player_trained():
 
             overwrite_pos(batch_size, env, p_red_pos[step_i], p_blue_pos[step_i], c_red_pos[step_i],
                           c_blue_pos[step_i])
+
+
+def play_with_fixed_seed(env, n_steps, seed):
+    np.random.seed(seed)
+    action_rng = np.random.RandomState(seed)
+    history = [env.reset()]
+    for _ in range(n_steps):
+        actions = {policy_id: action_rng.randint(env.NUM_ACTIONS, size=env.batch_size)
+                   for policy_id in env.players_ids}
+        obs, reward, done, info = env.step(actions)
+        history.append((obs, reward, done, info))
+        if done["__all__"]:
+            history.append(env.reset())
+    return history
+
+
+def assert_nested_equal(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for k in a.keys():
+            assert_nested_equal(a[k], b[k])
+    elif isinstance(a, (tuple, list)):
+        assert len(a) == len(b)
+        for a_i, b_i in zip(a, b):
+            assert_nested_equal(a_i, b_i)
+    else:
+        assert np.array_equal(a, b)
+
+
+def test_parallel_kernels_identical_to_serial_kernels():
+    max_steps, batch_size, grid_size = 20, 256, 3
+    n_steps = int(max_steps * 2.5)
+    n_threads = min(2, numba.config.NUMBA_NUM_THREADS)
+    n_threads_before = numba.get_num_threads()
+
+    for env_class in [CoinGame, AsymCoinGame]:
+        serial_env = init_env(max_steps, batch_size, env_class, grid_size=grid_size)
+        parallel_env = env_class({"max_steps": max_steps, "batch_size": batch_size, "grid_size": grid_size,
+                                  "numba_parallel": True, "numba_n_threads": n_threads})
+
+        serial_history = play_with_fixed_seed(serial_env, n_steps, seed=0)
+        parallel_history = play_with_fixed_seed(parallel_env, n_steps, seed=0)
+        assert_nested_equal(serial_history, parallel_history)
+        # The number of numba threads of the process is restored after each kernel call
+        assert numba.get_num_threads() == n_threads_before
+
+
+def test_compact_observations_match_float_observations():
+    max_steps, batch_size, grid_size = 20, 64, 4
+    n_steps = int(max_steps * 1.5)
+
+    for env_class in [CoinGame, AsymCoinGame]:
+        histories = {}
+        for observation_mode in ["float", "uint8", "bit_packed"]:
+            env = env_class({"max_steps": max_steps, "batch_size": batch_size, "grid_size": grid_size,
+                             "observation_mode": observation_mode})
+            histories[observation_mode] = play_with_fixed_seed(env, n_steps, seed=0)
+
+        for float_step, uint8_step, bit_packed_step in zip(
+                histories["float"], histories["uint8"], histories["bit_packed"]):
+            float_obs = float_step[0] if isinstance(float_step, tuple) else float_step
+            uint8_obs = uint8_step[0] if isinstance(uint8_step, tuple) else uint8_step
+            bit_packed_obs = bit_packed_step[0] if isinstance(bit_packed_step, tuple) else bit_packed_step
+            for player_id in env.players_ids:
+                assert uint8_obs[player_id].dtype == np.uint8
+                assert bit_packed_obs[player_id].shape == (batch_size, grid_size, grid_size)
+                assert np.array_equal(float_obs[player_id], uint8_obs[player_id])
+                assert np.array_equal(float_obs[player_id], unpack_bit_packed_observations(bit_packed_obs[player_id]))
+            if isinstance(float_step, tuple):
+                assert_nested_equal(float_step[1:], uint8_step[1:])
+                assert_nested_equal(float_step[1:], bit_packed_step[1:])
+
+
+def test_reset_done_only_resets_the_masked_sub_environments():
+    max_steps, batch_size, grid_size = 20, 100, 4
+
+    for env_class in [CoinGame, AsymCoinGame]:
+        env = init_env(max_steps, batch_size, env_class, grid_size=grid_size)
+        env.reset()
+        for _ in range(5):
+            actions = {policy_id: [random.randint(0, env.NUM_ACTIONS - 1) for _ in range(batch_size)]
+                       for policy_id in env.players_ids}
+            env.step(actions)
+        state_before = env._save_env()
+        done_mask = np.arange(batch_size) % 2 == 0
+
+        obs = env.reset_done(done_mask)
+        check_obs(obs, batch_size, grid_size)
+        assert env.step_count_in_current_episode == 5
+        assert np.array_equal(env.step_count_in_sub_episodes, np.where(done_mask, 0, 5))
+        assert_logger_buffer_size(env, n_steps=5)
+        for key in ["red_pos", "blue_pos", "coin_pos", "red_coin"]:
+            assert np.array_equal(getattr(env, key)[~done_mask], state_before[key][~done_mask])
+        # Players can only overlap during the episodes, not after a reset
+        assert not (env.red_pos == env.blue_pos).all(axis=1)[done_mask].any()
+        assert not (env.coin_pos == env.red_pos).all(axis=1).any()
+        assert not (env.coin_pos == env.blue_pos).all(axis=1).any()
+
+
+def test_sub_environments_run_continuously_with_reset_done():
+    max_steps, batch_size, grid_size = 10, 8, 3
+
+    for env_class in [CoinGame, AsymCoinGame]:
+        env = init_env(max_steps, batch_size, env_class, grid_size=grid_size)
+        env.reset()
+        episode_starts = np.zeros(batch_size, dtype=np.int64)
+        for step_i in range(3 * max_steps):
+            if step_i < batch_size:
+                # Shift the episodes such that the sub-environment i starts its first episode at the step i
+                shifted = np.arange(batch_size) == step_i
+                env.reset_done(shifted)
+                episode_starts[shifted] = step_i
+
+            actions = {policy_id: [random.randint(0, env.NUM_ACTIONS - 1) for _ in range(batch_size)]
+                       for policy_id in env.players_ids}
+            obs, reward, done, info = env.step(actions)
+            check_obs(obs, batch_size, grid_size)
+
+            expected_done = step_i + 1 - episode_starts == max_steps
+            for policy_id in env.players_ids:
+                assert np.array_equal(done[policy_id], expected_done)
+            assert done["__all__"] == expected_done.all()
+            assert (len(info) > 0) == expected_done.any()
+
+            env.reset_done(expected_done)
+            episode_starts[expected_done] = step_i + 1
+        assert not done["__all__"]
@@ -0,0 +1,86 @@
+import numpy as np
+
+from marltoolbox.envs.matrix_sequential_social_dilemma import IteratedPrisonersDilemma, IteratedAsymBoS, \
+    IteratedChicken, IteratedBoS, IteratedAsymChicken, IteratedBoSAndPD, IteratedStagHunt, \
+    IteratedAsymPrisonersDilemma, IteratedMatchingPennies, define_greed_fear_matrix_game
+from marltoolbox.envs.vectorized_matrix_sequential_social_dilemma import add_vectorization, \
+    define_vectorized_greed_fear_matrix_game, VectorizedIteratedPrisonersDilemma
+
+ENV_CLASSES = [IteratedPrisonersDilemma, IteratedAsymBoS, IteratedChicken, IteratedBoS, IteratedAsymChicken,
+               IteratedBoSAndPD, IteratedStagHunt, IteratedAsymPrisonersDilemma, IteratedMatchingPennies]
+
+
+def init_env(max_steps, batch_size, env_class, seed=None):
+    config = {
+        "max_steps": max_steps,
+        "batch_size": batch_size,
+    }
+    env = env_class(config)
+    env.seed(seed)
+    return env
+
+
+def check_obs(obs, env, batch_size):
+    assert len(obs) == 2, "two players"
+    for key, player_obs in obs.items():
+        assert player_obs.shape == (batch_size,)
+        assert (player_obs < env.NUM_STATES).all()
+
+
+def assert_same_as_not_vectorized_env(env_class, vectorized_env_class, max_steps, batch_size):
+    n_steps = int(max_steps * 2.5)
+    not_vectorized_envs = [init_env(max_steps, 1, env_class) for _ in range(batch_size)]
+    vectorized_env = init_env(max_steps, batch_size, vectorized_env_class)
+
+    obs = vectorized_env.reset()
+    check_obs(obs, vectorized_env, batch_size)
+    not_vectorized_obs = [env.reset() for env in not_vectorized_envs]
+    for step_i in range(n_steps):
+        actions = {player_id: np.random.randint(vectorized_env.NUM_ACTIONS, size=batch_size)
+                   for player_id in vectorized_env.players_ids}
+        obs, reward, done, info = vectorized_env.step(actions)
+        check_obs(obs, vectorized_env, batch_size)
+
+        not_vectorized_steps = [env.step({player_id: actions[player_id][i] for player_id in env.players_ids})
+                                for i, env in enumerate(not_vectorized_envs)]
+        for player_id in vectorized_env.players_ids:
+            assert np.array_equal(obs[player_id], [step[0][player_id] for step in not_vectorized_steps])
+            assert np.array_equal(reward[player_id], [step[1][player_id] for step in not_vectorized_steps])
+        assert done == not_vectorized_steps[0][2]
+
+        if done["__all__"]:
+            for player_id in vectorized_env.players_ids:
+                for key, value in info[player_id].items():
+                    mean_over_batch = sum(step[3][player_id].get(key, 0.0)
+                                          for step in not_vectorized_steps) / batch_size
+                    assert np.isclose(value, mean_over_batch)
+            obs = vectorized_env.reset()
+            check_obs(obs, vectorized_env, batch_size)
+            for env in not_vectorized_envs:
+                env.reset()
+
+
+def test_same_as_not_vectorized_envs():
+    max_steps, batch_size = 20, 16
+    for env_class in ENV_CLASSES:
+        assert_same_as_not_vectorized_env(env_class, add_vectorization(env_class), max_steps, batch_size)
+
+
+def test_greed_fear_game_same_as_not_vectorized_env():
+    max_steps, batch_size = 20, 16
+    assert_same_as_not_vectorized_env(define_greed_fear_matrix_game(greed=1, fear=2),
+                                      define_vectorized_greed_fear_matrix_game(greed=1, fear=2),
+                                      max_steps, batch_size)
+
+
+def test_batch_size_one_is_not_vectorized():
+    max_steps = 20
+    env = init_env(max_steps, 1, VectorizedIteratedPrisonersDilemma)
+    obs = env.reset()
+    for player_obs in obs.values():
+        assert np.ndim(player_obs) == 0
+
+    obs, reward, done, info = env.step({player_id: 0 for player_id in env.players_ids})
+    for player_id in env.players_ids:
+        assert np.ndim(obs[player_id]) == 0
+        assert reward[player_id] == IteratedPrisonersDilemma.PAYOUT_MATRIX[0, 0, 0]